@@ -0,0 +1,92 @@
+"""Vectorized amortization schedules for many loans at once.
+
+schedules() builds month-by-month payment, interest, principal and balance
+as 2-D arrays (loans x months) for fixed-rate, fully amortizing loans of any
+term. Loans shorter than the longest term in the batch are zero-padded past
+their final payment. iter_schedule_rows() works through a large portfolio
+in chunks, so exports can stream rows without holding every schedule in
+memory.
+"""
+import csv
+import io
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+import payment_math
+from serialization import dumps
+
+SCHEDULE_COLUMNS = ("loan_id", "period", "payment", "principal", "interest", "balance")
+
+
+def schedules(principals: Sequence[float], annual_rates: Sequence[float], terms: Sequence[int]) -> Dict[str, np.ndarray]:
+    principal = np.asarray(principals, dtype=np.float64)[:, None]
+    rates = np.asarray(annual_rates, dtype=np.float64)
+    term = np.asarray(terms, dtype=np.int64)
+    monthly_rate = (rates / 100 / 12)[:, None]
+    payment = principal * payment_math.annuity_factors(rates, term)[:, None]
+
+    periods = np.arange(1, int(term.max()) + 1, dtype=np.float64)[None, :]
+    active = periods <= term[:, None]
+
+    # Closed-form remaining balance after k payments: P*g^k - pmt*(g^k - 1)/r
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (1 + monthly_rate) ** periods
+        balance = np.where(
+            monthly_rate > 0,
+            principal * growth - payment * (growth - 1) / monthly_rate,
+            principal - payment * periods
+        )
+    balance = np.where(active, np.clip(balance, 0.0, None), 0.0)
+    # Pin the final balance to zero so float noise never leaves a residual
+    balance[np.arange(len(term)), term - 1] = 0.0
+
+    previous = np.concatenate([principal, balance[:, :-1]], axis=1)
+    interest = np.where(active, previous * monthly_rate, 0.0)
+    principal_paid = np.where(active, previous - balance, 0.0)
+    payments = np.where(active, interest + principal_paid, 0.0)
+    return {
+        "payment": payments,
+        "principal": principal_paid,
+        "interest": interest,
+        "balance": balance,
+        "scheduled_payment": payment[:, 0],
+        "term": term
+    }
+
+
+def iter_schedule_rows(loans: List[Dict[str, Any]], chunk_size: int = 256) -> Iterator[List[Tuple]]:
+    """Yield schedule rows (in SCHEDULE_COLUMNS order) chunk by chunk; each chunk covers up to chunk_size loans"""
+    for start in range(0, len(loans), chunk_size):
+        chunk = loans[start:start + chunk_size]
+        result = schedules(
+            [loan["principal"] for loan in chunk],
+            [loan["annual_rate"] for loan in chunk],
+            [loan["term"] for loan in chunk]
+        )
+        columns = [np.round(result[name], 2).tolist() for name in ("payment", "principal", "interest", "balance")]
+        rows = []
+        for i, loan in enumerate(chunk):
+            term = int(result["term"][i])
+            loan_id = loan.get("loan_id") or str(start + i)
+            payment, principal, interest, balance = (column[i][:term] for column in columns)
+            rows.extend(zip([loan_id] * term, range(1, term + 1), payment, principal, interest, balance))
+        yield rows
+
+
+def csv_stream(loans: List[Dict[str, Any]], chunk_size: int = 256) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SCHEDULE_COLUMNS)
+    for rows in iter_schedule_rows(loans, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_stream(loans: List[Dict[str, Any]], chunk_size: int = 256) -> Iterator[bytes]:
+    for rows in iter_schedule_rows(loans, chunk_size):
+        yield b"".join(dumps(dict(zip(SCHEDULE_COLUMNS, row))) + b"\n" for row in rows)
@@ -0,0 +1,118 @@
+"""Prompt size and latency over long chat sessions, with and without context management.
+
+Several sessions chat for --turns turns each against the stub LLM. The stub
+adds --prompt-ms-per-1k of latency per thousand prompt tokens, as upstream
+prefill does. Two variants run:
+- full_history sends the whole conversation every turn, as chat did before
+  context management;
+- context keeps a window of recent turns within --max-tokens and folds older
+  turns into an extractive summary.
+Prompt tokens are the stub's own count of what it was sent. The report gives
+them at a few turn numbers, plus the mean per turn, the total (a cost proxy)
+and latency over the last quarter of turns.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chat_context --sessions 8 --turns 60
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.common import summarize
+from benchmarks.stub_llm import start_stub
+from chat_context import ContextManager
+from llm_pool import PRIMARY_MODEL, LlmClientPool
+
+QUESTION = (
+    "Turn {turn}: we earn about ${income} a year, have ${debt} a month in car and student loan payments, "
+    "about ${down} saved for a down payment and a credit score near {score}. How would a {years}-year fixed "
+    "compare with a 7/1 ARM for a house around ${price}, and what would change if we paid two points?"
+)
+REPORT_TURNS = (1, 10, 25, 50, 100)
+
+
+def question(session: int, turn: int) -> str:
+    return QUESTION.format(
+        turn=turn, income=90000 + session * 1000, debt=600 + turn, down=40000 + turn * 500,
+        score=700 + session, years=30 if turn % 2 else 15, price=420000 + turn * 1000
+    )
+
+
+async def converse(pool: LlmClientPool, sessions: int, turns: int) -> Dict[str, Any]:
+    # tokens[t] and latencies[t] hold every session's value at turn t + 1
+    tokens: List[List[int]] = [[] for _ in range(turns)]
+    latencies: List[List[float]] = [[] for _ in range(turns)]
+
+    async def session(index: int):
+        session_id = f"bench-context-{index}"
+        for turn in range(turns):
+            start = time.perf_counter()
+            await pool.send(PRIMARY_MODEL, None, session_id, question(index, turn + 1))
+            latencies[turn].append(time.perf_counter() - start)
+            tokens[turn].append(pool.last_prompt_tokens(PRIMARY_MODEL, None, session_id))
+            # Let background compaction run between turns, as think time would
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    late = [value for values in latencies[turns - turns // 4:] for value in values]
+    all_tokens = [value for values in tokens for value in values]
+    return {
+        "prompt_tokens_at_turn": {turn: round(sum(tokens[turn - 1]) / len(tokens[turn - 1])) for turn in REPORT_TURNS if turn <= turns},
+        "prompt_tokens_mean": round(sum(all_tokens) / len(all_tokens)),
+        "prompt_tokens_max": max(all_tokens),
+        "prompt_tokens_total": sum(all_tokens),
+        "last_quarter_latency": summarize(late, elapsed),
+        "elapsed_s": round(elapsed, 3)
+    }
+
+
+async def main_async(args) -> Dict[str, Any]:
+    stub, runner, base_url = await start_stub(latency_ms=args.latency_ms, prompt_ms_per_1k=args.prompt_ms_per_1k)
+    results = {}
+    try:
+        for variant in ("full_history", "context"):
+            context: Optional[ContextManager] = None
+            if variant == "context":
+                context = ContextManager(max_tokens=args.max_tokens, window_turns=args.window_turns, summary_max_tokens=args.summary_max_tokens)
+            pool = LlmClientPool(api_key="stub", base_url=base_url, default_concurrency=args.sessions, context=context)
+            result = await converse(pool, args.sessions, args.turns)
+            result["context"] = pool.stats()["context"]
+            await pool.aclose()
+            results[variant] = result
+            late = result["last_quarter_latency"]
+            at_turn = " ".join(f"t{turn}={count}" for turn, count in result["prompt_tokens_at_turn"].items())
+            print(
+                f"{variant:>12}: prompt tokens {at_turn} mean={result['prompt_tokens_mean']} max={result['prompt_tokens_max']} "
+                f"total={result['prompt_tokens_total']} | last-quarter p50={late['p50_ms']}ms p99={late['p99_ms']}ms",
+                flush=True
+            )
+    finally:
+        await runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--prompt-ms-per-1k", type=float, default=20)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--window-turns", type=int, default=8)
+    parser.add_argument("--summary-max-tokens", type=int, default=300)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    results = asyncio.run(main_async(args))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
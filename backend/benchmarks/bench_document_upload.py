@@ -0,0 +1,118 @@
+"""Upload throughput, memory and OCR turnaround with a stub OCR engine.
+
+Run from the backend directory:
+    python -m benchmarks.bench_document_upload --files 20 --size-mb 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from starlette.datastructures import UploadFile
+
+from benchmarks.common import api_client, load_server
+from document_pipeline import LocalObjectStorage, MockOcrEngine
+
+
+def spooled_upload(size_bytes: int) -> UploadFile:
+    # Same spooled file Starlette hands to the route after multipart parsing
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    block = os.urandom(1024 * 1024)
+    written = 0
+    while written < size_bytes:
+        written += spool.write(block[:size_bytes - written])
+    spool.seek(0)
+    return UploadFile(spool, filename="statement.pdf")
+
+
+async def peak_memory(fn, upload: UploadFile) -> float:
+    # The upload is built before tracing starts so only the copy itself is measured
+    tracemalloc.start()
+    await fn(upload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+async def storage_memory(size_bytes: int, chunk_size: int, root: str):
+    storage = LocalObjectStorage(root)
+
+    async def read_whole(upload):
+        data = await upload.read()
+        with open(storage.local_path("whole.bin"), "wb") as handle:
+            handle.write(data)
+
+    async def chunked(upload):
+        await storage.save_stream("chunked/file.bin", upload, chunk_size, 0)
+
+    os.makedirs(root, exist_ok=True)
+    return (
+        await peak_memory(read_whole, spooled_upload(size_bytes)),
+        await peak_memory(chunked, spooled_upload(size_bytes))
+    )
+
+
+async def end_to_end(server, files: int, size_bytes: int, concurrency: int):
+    async with api_client(server) as client:
+        response = await client.post("/api/auth/signup", json={"email": "docs@example.com", "password": "Password123!"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        payload = os.urandom(size_bytes)
+        semaphore = asyncio.Semaphore(concurrency)
+        ids = []
+
+        async def upload(i):
+            async with semaphore:
+                response = await client.post(
+                    "/api/documents/upload?doc_type=bank_statement",
+                    files={"file": (f"statement-{i}.pdf", payload, "application/pdf")},
+                    headers=headers
+                )
+                ids.append(response.json()["id"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(i) for i in range(files)))
+        upload_elapsed = time.perf_counter() - start
+
+        while True:
+            docs = await client.get("/api/documents", headers=headers)
+            statuses = [d["ocr_status"] for d in docs.json()]
+            if all(status in ("completed", "failed") for status in statuses):
+                break
+            await asyncio.sleep(0.01)
+        return upload_elapsed, time.perf_counter() - start
+
+
+async def main_async(args):
+    size_bytes = int(args.size_mb * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as root:
+        whole_mb, chunked_mb = await storage_memory(size_bytes, args.chunk_kb * 1024, root)
+        print(f"peak Python memory per {args.size_mb}MB file: read-whole={whole_mb:.1f}MB chunked={chunked_mb:.2f}MB")
+
+        server = load_server()
+        server.document_storage = server.ocr_pool.storage = LocalObjectStorage(root)
+        server.ocr_pool.engine = MockOcrEngine(delay_seconds=args.ocr_ms / 1000)
+        server.ocr_pool.start()
+        upload_elapsed, total_elapsed = await end_to_end(server, args.files, size_bytes, args.concurrency)
+        await server.ocr_pool.stop()
+
+    total_mb = args.files * args.size_mb
+    print(f"uploads: {args.files} x {args.size_mb}MB in {upload_elapsed:.2f}s ({total_mb / upload_elapsed:.1f} MB/s, "
+          f"{args.files / upload_elapsed:.1f} files/s)")
+    print(f"all OCR completed after {total_elapsed:.2f}s with {server.ocr_pool.workers} workers "
+          f"({server.ocr_pool.completed} completed, {server.ocr_pool.failed} failed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ocr-ms", type=float, default=100)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Micro-benchmark: chained keyword scans vs the compiled intent classifier.
+
+Run from the backend directory:
+    python -m benchmarks.bench_intent --repeat 200
+"""
+import argparse
+import time
+
+from intent_classifier import INTENT_KEYWORDS, classify_intent
+
+SAMPLE_MESSAGES = [
+    "What rate can I get on a jumbo loan?",
+    "Can you calculate my monthly payment for a $750k house?",
+    "Am I eligible for an FHA loan with a 640 credit score?",
+    "I'd like to prequalify before I start looking at houses",
+    "How do I start my application?",
+    "Where do I upload my bank statements?",
+    "What documents do I need for self-employed income?",
+    "What is PMI and when can I remove it?",
+    "Help me understand the difference between APR and interest rate",
+    "Can I talk to a real person please",
+    "I want to speak with a human agent about my file",
+    "Thanks, that was really helpful!",
+    "My wife and I are first-time buyers in Austin with about 10% down",
+    "What are closing costs usually on a 400k home?",
+    "Explain points vs credits",
+    "hi",
+]
+
+
+def legacy_detect_intent(message: str):
+    # The original chained any() scans from get_ai_response
+    message_lower = message.lower()
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(word in message_lower for word in keywords):
+            return intent
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = SAMPLE_MESSAGES * args.repeat
+    mismatches = [m for m in SAMPLE_MESSAGES if legacy_detect_intent(m) != classify_intent(m).intent]
+
+    for label, fn in (("legacy scans", legacy_detect_intent), ("compiled classifier", classify_intent)):
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for message in corpus:
+                fn(message)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:>20}: {best / len(corpus) * 1e6:.2f} us/message ({len(corpus)} messages)")
+
+    print(f"intent mismatches vs legacy: {len(mismatches)}")
+    for message in SAMPLE_MESSAGES[:6]:
+        print(f"  {classify_intent(message)} <- {message!r}")
+
+
+if __name__ == "__main__":
+    main()
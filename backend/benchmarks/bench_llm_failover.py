@@ -0,0 +1,170 @@
+"""Chat availability and latency when one LLM provider misbehaves.
+
+Each provider gets its own fault-injecting stub. Signed-in senders chat with
+the primary (Claude) while the primary stub is faulted, and each scenario
+runs with several dispatcher settings:
+- direct: the timeout only, with no breaker and no failover. This is close
+  to chat before the dispatcher, which had no timeout either;
+- failover: timeouts, circuit breakers and failover to GPT;
+- hedge: failover plus a hedged second request after the p95 budget.
+Per run the report gives the success rate, the latency percentiles, the share
+of turns the secondary answered and how many calls reached the primary stub.
+The breaker keeps a dead primary from being called on every turn.
+
+The recovery scenario takes the primary down for one phase and heals it for
+the next. It shows traffic moving to the secondary and back once the breaker
+lets a probe through.
+
+Run from the backend directory:
+    python -m benchmarks.bench_llm_failover --senders 16 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from benchmarks.common import summarize
+from benchmarks.stub_llm import FAULT_FIELDS, start_stub
+from llm_dispatch import LlmDispatcher, LlmUnavailable
+from llm_pool import PRIMARY_MODEL, LlmClientPool
+
+# (scenario, primary stub faults, dispatcher variants)
+SCENARIOS = (
+    ("healthy", {}, ("direct", "failover", "hedge")),
+    ("primary_down", {"error_rate": 1.0}, ("direct", "failover")),
+    ("primary_hangs", {"hang_rate": 0.1}, ("direct", "failover", "hedge")),
+    ("primary_slow_tail", {"slow_rate": 0.1}, ("failover", "hedge"))
+)
+
+
+def dispatcher_for(variant: str, pool: LlmClientPool, args) -> LlmDispatcher:
+    return LlmDispatcher(
+        lambda: pool,
+        default_timeout=args.timeout_ms / 1000,
+        failover=variant != "direct",
+        # direct never opens its breaker
+        failure_threshold=args.breaker_failures if variant != "direct" else 10 ** 9,
+        reset_seconds=args.breaker_reset_seconds,
+        hedge=variant == "hedge",
+        hedge_default_delay=args.hedge_delay_ms / 1000
+    )
+
+
+def set_faults(stub, faults: Dict[str, float], args):
+    defaults = {"latency_ms": args.latency_ms, "error_rate": 0.0, "hang_rate": 0.0, "slow_rate": 0.0, "slow_ms": args.slow_ms, "prompt_ms_per_1k": 0.0}
+    for field in FAULT_FIELDS:
+        setattr(stub, field, faults.get(field, defaults[field]))
+
+
+async def drive(dispatcher: LlmDispatcher, seconds: float, args) -> Dict[str, Any]:
+    latencies = []
+    failures = 0
+    by_provider: Dict[str, int] = {}
+    deadline = time.perf_counter() + seconds
+
+    async def sender(index: int):
+        nonlocal failures
+        turn = 0
+        while time.perf_counter() < deadline:
+            turn += 1
+            start = time.perf_counter()
+            try:
+                _, answered_by = await dispatcher.send(PRIMARY_MODEL, None, f"sender-{index}-{turn}", "What rate can I get?")
+            except LlmUnavailable:
+                failures += 1
+                # A failed caller backs off briefly, as a client would after a 503
+                await asyncio.sleep(args.latency_ms / 1000)
+                continue
+            latencies.append(time.perf_counter() - start)
+            by_provider[answered_by.provider] = by_provider.get(answered_by.provider, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(i) for i in range(args.senders)))
+    elapsed = time.perf_counter() - start
+    answered = len(latencies)
+    return {
+        **summarize(latencies, elapsed),
+        "failed": failures,
+        "success_rate": round(answered / (answered + failures), 4) if answered + failures else 0.0,
+        "secondary_share": round(by_provider.get("openai", 0) / answered, 4) if answered else 0.0
+    }
+
+
+def report(label: str, result: Dict[str, Any]):
+    print(
+        f"{label:<34} success={result['success_rate']:<6} p50={result.get('p50_ms')}ms p99={result.get('p99_ms')}ms "
+        f"secondary={result['secondary_share']:<6} primary calls={result['primary_calls']:<5} "
+        f"breaker opened={result['breaker_opened']} hedges={result['hedges']}",
+        flush=True
+    )
+
+
+async def run_variant(variant: str, primary, base_urls: Dict[str, str], args, phases) -> Dict[str, Any]:
+    pool = LlmClientPool(api_key="stub", provider_base_urls=base_urls, default_concurrency=args.slots)
+    dispatcher = dispatcher_for(variant, pool, args)
+    results = {}
+    try:
+        for phase, faults, pause in phases:
+            set_faults(primary, faults, args)
+            # Give an open breaker time to let a probe through
+            await asyncio.sleep(pause)
+            calls_before = primary.requests
+            result = await drive(dispatcher, args.seconds, args)
+            result["primary_calls"] = primary.requests - calls_before
+            result["breaker_opened"] = dispatcher.breaker("anthropic").times_opened
+            result["hedges"] = dispatcher.events[("openai", "hedge")]
+            results[phase] = result
+    finally:
+        await pool.aclose()
+    return results
+
+
+async def main_async(args) -> Dict[str, Any]:
+    primary, primary_runner, primary_url = await start_stub(latency_ms=args.latency_ms, slow_ms=args.slow_ms)
+    secondary, secondary_runner, secondary_url = await start_stub(latency_ms=args.latency_ms, seed=11)
+    base_urls = {"anthropic": primary_url, "openai": secondary_url}
+    results: Dict[str, Any] = {}
+    try:
+        for scenario, faults, variants in SCENARIOS:
+            for variant in variants:
+                result = (await run_variant(variant, primary, base_urls, args, [(scenario, faults, 0)]))[scenario]
+                results[f"{scenario}/{variant}"] = result
+                report(f"{scenario}/{variant}", result)
+        phases = [("down", {"error_rate": 1.0}, 0), ("recovered", {}, args.breaker_reset_seconds)]
+        recovery = await run_variant("failover", primary, base_urls, args, phases)
+        for phase, result in recovery.items():
+            results[f"recovery/{phase}"] = result
+            report(f"recovery/{phase}", result)
+    finally:
+        await primary_runner.cleanup()
+        await secondary_runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--senders", type=int, default=16)
+    parser.add_argument("--slots", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--slow-ms", type=float, default=1000)
+    parser.add_argument("--timeout-ms", type=float, default=2000)
+    parser.add_argument("--hedge-delay-ms", type=float, default=200, help="hedge delay until the p95 is known")
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    parser.add_argument("--breaker-reset-seconds", type=float, default=1.0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    # Every injected fault would otherwise log a warning
+    logging.getLogger("llm_dispatch").setLevel(logging.ERROR)
+    results = asyncio.run(main_async(args))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Chat latency against a local stub LLM: per-call clients vs the shared pool.
+
+Run from the backend directory:
+    python -m benchmarks.bench_llm_pool --messages 500 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import summarize
+from benchmarks.stub_llm import start_stub
+from llm_pool import PRIMARY_MODEL, HttpChat, LlmClientPool, UserMessage
+
+
+async def per_call_clients(base_url: str, text: str, session_id: str):
+    # Mirrors the old behaviour: a brand new client (and connection) for every message
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        chat = HttpChat(http, PRIMARY_MODEL.model, PRIMARY_MODEL.system_message)
+        return await chat.send_message(UserMessage(text=text))
+
+
+async def drive(send, messages: int, concurrency: int, sessions: int) -> dict:
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(messages):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            await send(f"What rate can I get? #{i}", f"session-{i % sessions}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def main_async(args):
+    stub, runner, base_url = await start_stub(latency_ms=args.latency_ms)
+    try:
+        baseline = await drive(
+            lambda text, sid: per_call_clients(base_url, text, sid),
+            args.messages, args.concurrency, args.sessions
+        )
+        pool = LlmClientPool(api_key="stub", base_url=base_url, default_concurrency=args.concurrency)
+        pooled = await drive(
+            lambda text, sid: pool.send(PRIMARY_MODEL, None, sid, text),
+            args.messages, args.concurrency, args.sessions
+        )
+        await pool.aclose()
+    finally:
+        await runner.cleanup()
+
+    for label, result in (("per-call clients", baseline), ("pooled clients", pooled)):
+        print(f"{label:>17}: rps={result['rps']} p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms")
+    print(f"stub requests: {stub.requests}; pool sessions created={pool.created} reused={pool.reused}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Signed-in chat latency while a guest flood saturates the LLM pool.
+
+Guest senders keep every provider slot busy while signed-in users chat. The
+baseline is the old first-come first-served pool: everyone queues at one
+priority and there is no guest cap. With priority, users jump the guest
+queue and guests hold at most --guest-share of the slots. Guests past
+--guest-queue waiting are shed, which the server turns into a 503.
+
+Run from the backend directory:
+    python -m benchmarks.bench_llm_priority --slots 8 --guests 64 --users 8
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import summarize
+from benchmarks.stub_llm import start_stub
+from llm_pool import PRIMARY_MODEL, PRIORITY_GUEST, PRIORITY_USER, LlmClientPool
+from worker_pool import PoolSaturated
+
+
+async def flood(pool: LlmClientPool, user_priority: int, args) -> dict:
+    user_latencies, guest_latencies = [], []
+    shed = 0
+    deadline = time.perf_counter() + args.seconds
+
+    async def sender(name: str, priority: int, latencies: list):
+        nonlocal shed
+        turn = 0
+        while time.perf_counter() < deadline:
+            turn += 1
+            start = time.perf_counter()
+            try:
+                await pool.send(PRIMARY_MODEL, None, f"{name}-{turn}", "What rate can I get?", priority)
+            except PoolSaturated:
+                shed += 1
+                # A shed guest backs off as if it had received a 503 with Retry-After
+                await asyncio.sleep(args.latency_ms / 1000)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(sender(f"guest-{i}", PRIORITY_GUEST, guest_latencies) for i in range(args.guests)),
+        *(sender(f"user-{i}", user_priority, user_latencies) for i in range(args.users))
+    )
+    elapsed = time.perf_counter() - start
+    return {"users": summarize(user_latencies, elapsed), "guests": summarize(guest_latencies, elapsed), "guests_shed": shed}
+
+
+async def main_async(args):
+    stub, runner, base_url = await start_stub(latency_ms=args.latency_ms)
+    results = {}
+    try:
+        for label, user_priority, share, queue in (
+            ("fifo", PRIORITY_GUEST, 1.0, None),
+            ("priority", PRIORITY_USER, args.guest_share, args.guest_queue)
+        ):
+            pool = LlmClientPool(
+                api_key="stub", base_url=base_url, default_concurrency=args.slots,
+                guest_max_share=share, guest_max_queue=queue
+            )
+            results[label] = await flood(pool, user_priority, args)
+            await pool.aclose()
+    finally:
+        await runner.cleanup()
+
+    for label, result in results.items():
+        users, guests = result["users"], result["guests"]
+        print(
+            f"{label:>8}: users p50={users['p50_ms']}ms p99={users['p99_ms']}ms rps={users['rps']} | "
+            f"guests p50={guests['p50_ms']}ms p99={guests['p99_ms']}ms rps={guests['rps']} shed={result['guests_shed']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--guests", type=int, default=64)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--guest-share", type=float, default=0.5)
+    parser.add_argument("--guest-queue", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Mongo operations and latency of the signup, profile update and pre-qual paths.
+
+Each Mongo operation is delayed by a simulated network round trip (--rtt-ms)
+on top of mongomock (or MONGO_URL), so handlers that await operations one
+after another pay for each of them, while operations issued together overlap.
+The sequential versions the handlers replaced are kept here as the baseline.
+Password hashing is stubbed out so bcrypt does not drown the I/O being measured.
+
+Run from the backend directory:
+    python -m benchmarks.bench_mongo_roundtrips --rtt-ms 2 --iterations 200
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.common import load_server, summarize
+
+AWAITED_METHODS = {"find_one", "insert_one", "update_one", "delete_one", "find_one_and_update"}
+
+
+class LatencyCollection:
+    def __init__(self, collection, tracker):
+        self._collection = collection
+        self._tracker = tracker
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in AWAITED_METHODS:
+            return attr
+
+        async def delayed(*args, **kwargs):
+            self._tracker.operations += 1
+            await asyncio.sleep(self._tracker.rtt)
+            return await attr(*args, **kwargs)
+        return delayed
+
+
+class LatencyDatabase:
+    def __init__(self, db, rtt: float):
+        self._db = db
+        self.rtt = rtt
+        self.operations = 0
+
+    def __getattr__(self, name):
+        return LatencyCollection(getattr(self._db, name), self)
+
+    def __getitem__(self, name):
+        return LatencyCollection(self._db[name], self)
+
+
+# ---- Baselines: the sequential handlers before this change ----
+
+async def legacy_signup(server, user_data):
+    db = server.db
+    existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
+    if existing:
+        raise server.HTTPException(status_code=400, detail="Email already registered")
+    user = server.User(email=user_data.email, phone=user_data.phone)
+    user_dict = user.model_dump()
+    user_dict['password_hash'] = server.hash_password(user_data.password)
+    user_dict['created_at'] = user_dict['created_at'].isoformat()
+    user_dict['updated_at'] = user_dict['updated_at'].isoformat()
+    await db.users.insert_one(user_dict)
+    profile_dict = server.UserProfile(user_id=user.id).model_dump()
+    profile_dict['created_at'] = profile_dict['created_at'].isoformat()
+    profile_dict['updated_at'] = profile_dict['updated_at'].isoformat()
+    await db.user_profiles.insert_one(profile_dict)
+    return user
+
+
+async def legacy_update_profile(server, profile_update, current_user):
+    db = server.db
+    update_data = {k: v for k, v in profile_update.model_dump().items() if v is not None}
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    profile_doc = await db.user_profiles.find_one({"user_id": current_user.id})
+    if profile_doc:
+        required_fields = ['first_name', 'last_name', 'dob', 'address', 'employment_status', 'annual_income']
+        if all(profile_doc.get(field) or update_data.get(field) for field in required_fields):
+            update_data['kyc_status'] = 'pending'
+    await db.user_profiles.update_one({"user_id": current_user.id}, {"$set": update_data})
+    return await db.user_profiles.find_one({"user_id": current_user.id}, {"_id": 0})
+
+
+async def measure(tracker, iterations: int, make_call):
+    latencies = []
+    operations_before = tracker.operations
+    start = time.perf_counter()
+    for i in range(iterations):
+        call_start = time.perf_counter()
+        await make_call(i)
+        latencies.append(time.perf_counter() - call_start)
+    result = summarize(latencies, time.perf_counter() - start)
+    result["mongo_ops"] = round((tracker.operations - operations_before) / iterations, 2)
+    return result
+
+
+async def run(args):
+    server = load_server()
+    tracker = LatencyDatabase(server.db, args.rtt_ms / 1000)
+    server.db = tracker
+    # Isolate I/O from bcrypt
+    server.hash_password = lambda password: "benchmark-hash"
+    server.password_pool = server.BoundedWorkerPool("bcrypt", 0, 0)
+
+    run_id = uuid.uuid4().hex[:8]
+
+    def signup_payload(label, i):
+        return server.UserCreate(email=f"{label}-{run_id}-{i}@example.com", password="Password123!")
+
+    async def current_signup(i):
+        return (await server.signup(signup_payload("new", i))).user
+
+    user = await current_signup(-1)
+    profile_update = server.ProfileUpdate(first_name="Ada", annual_income=95000)
+    prequal = server.PreQualRequest(
+        loan_amount=320000, down_payment=60000, annual_income=95000, monthly_debts=900, employment_status="employed"
+    )
+
+    scenarios = [
+        ("signup", lambda i: legacy_signup(server, signup_payload("old", i)), current_signup),
+        (
+            "update_profile",
+            lambda i: legacy_update_profile(server, profile_update, user),
+            lambda i: server.update_profile(profile_update, user)
+        ),
+        (
+            "calculate_prequalification",
+            None,
+            lambda i: server.calculate_prequalification(prequal, user)
+        ),
+    ]
+    print(f"simulated round trip: {args.rtt_ms} ms, {args.iterations} calls each")
+    for label, legacy, current in scenarios:
+        for variant, make_call in (("sequential", legacy), ("current", current)):
+            if make_call is None:
+                continue
+            result = await measure(tracker, args.iterations, make_call)
+            print(
+                f"{label:>27} {variant:>10}: mongo ops={result['mongo_ops']} "
+                f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark scalar calculate_prequal against calculate_prequal_batch.
+
+Run from the backend directory:
+    python -m benchmarks.bench_prequal --size 5000
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+from server import PreQualRequest, calculate_prequal, calculate_prequal_batch  # noqa: E402
+
+FIELDS = ["status", "dti", "ltv", "estimated_rate", "monthly_payment", "max_loan_amount", "conditions"]
+
+
+def make_requests(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(size):
+        requests.append(PreQualRequest(
+            loan_amount=rng.uniform(50_000, 2_000_000),
+            down_payment=rng.uniform(0, 500_000),
+            annual_income=rng.choice([0, rng.uniform(20_000, 600_000)]),
+            monthly_debts=rng.uniform(0, 8_000),
+            credit_score=rng.choice([None, rng.randint(500, 850)]),
+            employment_status=rng.choice(["employed", "self-employed", "unemployed", "retired"])
+        ))
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    requests = make_requests(args.size)
+
+    scalar = [calculate_prequal(r) for r in requests]
+    batch = calculate_prequal_batch(requests)
+    mismatches = sum(1 for s, b in zip(scalar, batch) if any(s[f] != b[f] for f in FIELDS))
+
+    scalar_best = min(_timed(lambda: [calculate_prequal(r) for r in requests]) for _ in range(args.repeat))
+    batch_best = min(_timed(lambda: calculate_prequal_batch(requests)) for _ in range(args.repeat))
+
+    print(f"requests:   {args.size}")
+    print(f"scalar:     {scalar_best * 1000:.1f} ms ({args.size / scalar_best:,.0f} req/s)")
+    print(f"batch:      {batch_best * 1000:.1f} ms ({args.size / batch_best:,.0f} req/s)")
+    print(f"speedup:    {scalar_best / batch_best:.1f}x")
+    print(f"mismatches: {mismatches}")
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
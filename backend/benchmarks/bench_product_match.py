@@ -0,0 +1,66 @@
+"""Filtering and ranking latency of the product match index on a large catalog.
+
+Run from the backend directory:
+    python -m benchmarks.bench_product_match --products 50000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import summarize
+from product_matching import ProductIndex
+
+
+def make_catalog(size: int, seed: int = 11):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"product-{i}",
+            "lender_name": f"Lender {i % 900}",
+            "loan_type": rng.choice(["fixed", "variable", "hybrid"]),
+            "rate": round(rng.uniform(4.5, 8.0), 3),
+            "apr": 0.0,
+            "term": rng.choice([360, 180]),
+            "fees": rng.randint(500, 6000),
+            "min_credit_score": rng.randint(580, 780),
+            "min_down_payment": rng.choice([0.03, 0.05, 0.10, 0.15, 0.20, 0.25]),
+            "max_loan_amount": rng.choice([350000, 500000, 750000, 1000000, 1500000, 3000000]),
+            "features": []
+        }
+        for i in range(size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.products)
+    start = time.perf_counter()
+    index = ProductIndex(catalog)
+    print(f"index build for {args.products} products: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    rng = random.Random(3)
+    borrowers = [(rng.randint(600, 820), rng.uniform(150000, 1500000), rng.uniform(10000, 400000)) for _ in range(args.queries)]
+
+    filter_latencies, match_latencies, eligible = [], [], 0
+    for score, loan, down in borrowers:
+        start = time.perf_counter()
+        positions = index.eligible(score, loan, down / (loan + down))
+        filter_latencies.append(time.perf_counter() - start)
+        eligible += positions.size
+
+        start = time.perf_counter()
+        index.match(score, loan, down, limit=20)
+        match_latencies.append(time.perf_counter() - start)
+
+    for label, latencies in (("filter only", filter_latencies), ("filter + rank top 20", match_latencies)):
+        result = summarize(latencies, sum(latencies))
+        print(f"{label:>21}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms")
+    print(f"average eligible products per borrower: {eligible / args.queries:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
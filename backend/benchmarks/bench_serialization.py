@@ -0,0 +1,123 @@
+"""Serialization cost of list endpoint bodies and /api/prequal/calculate.
+
+The legacy path is the one handlers used before the shared codec:
+- model_dump() plus isoformat() for each Mongo write;
+- FastAPI's serialize_response, which validates against the response_model or
+  runs jsonable_encoder when there is none;
+- the stdlib JSONResponse encoder.
+The current path is to_document() for the write and a FastJSONResponse
+rendered straight from it. The benchmark also times the two endpoints end to
+end through the app.
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization --page-size 100 --iterations 1000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import JSONResponse
+
+from benchmarks.common import api_client, load_server, summarize, timed_request
+from serialization import FastJSONResponse, to_document
+
+
+def legacy_prequal_document(result) -> dict:
+    doc = result.model_dump()
+    doc['created_at'] = doc['created_at'].isoformat()
+    return doc
+
+
+async def time_async(fn, iterations: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start, digits=4)
+
+
+async def run(args):
+    server = load_server()
+    user = server.User(email="bench@example.com")
+    result = server.PreQualResult(
+        user_id=user.id, loan_amount=320000, down_payment=60000, credit_score=720, dti=18.5, status="approved",
+        max_loan_amount=410000, estimated_rate=6.0, monthly_payment=1918.56, conditions=["Employment verification required"],
+        explanation="Based on your financial profile: " + "x" * 200
+    )
+    page = [
+        to_document(server.Application(
+            user_id=user.id, loan_amount=300000 + i, loan_type="fixed", property_address={"street": f"{i} Main St", "city": "Austin"},
+            property_value=380000, down_payment=80000, purpose="purchase"
+        ))
+        for i in range(args.page_size)
+    ]
+    prequal_field = create_response_field(name="response", type_=server.PreQualResult)
+
+    async def legacy_prequal():
+        legacy_prequal_document(result)
+        content = await serialize_response(field=prequal_field, response_content=result)
+        JSONResponse(content)
+
+    async def current_prequal():
+        FastJSONResponse(to_document(result))
+
+    async def legacy_list():
+        content = await serialize_response(response_content=page)
+        JSONResponse(content)
+
+    async def current_list():
+        FastJSONResponse(page)
+
+    print(f"serialization only, {args.iterations} iterations, list page of {args.page_size}")
+    for label, legacy, current in (
+        ("prequal/calculate", legacy_prequal, current_prequal),
+        ("list page", legacy_list, current_list),
+    ):
+        before = await time_async(legacy, args.iterations)
+        after = await time_async(current, args.iterations)
+        print(
+            f"{label:>18}: legacy p50={before['p50_ms']}ms p99={before['p99_ms']}ms -> "
+            f"codec p50={after['p50_ms']}ms p99={after['p99_ms']}ms ({before['mean_ms'] / after['mean_ms']:.1f}x)"
+        )
+
+    await server.app.router.startup()
+    try:
+        async with api_client(server) as client:
+            signup = await client.post("/api/auth/signup", json={"email": "serialization@example.com", "password": "Password123!"})
+            headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+            body = {"loan_amount": 320000, "down_payment": 60000, "annual_income": 95000, "monthly_debts": 900, "employment_status": "employed"}
+            for i in range(args.page_size):
+                await client.post("/api/applications", json={
+                    "loan_amount": 300000 + i, "loan_type": "fixed", "property_address": {"street": f"{i} Main St"},
+                    "property_value": 380000, "down_payment": 80000
+                }, headers=headers)
+
+            print(f"\nend to end through the app, {args.requests} requests")
+            for label, method, path, kwargs in (
+                ("POST /prequal/calculate", "POST", "/api/prequal/calculate", {"json": body}),
+                (f"GET /applications?limit={args.page_size}", "GET", f"/api/applications?limit={args.page_size}", {}),
+            ):
+                latencies = []
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    await timed_request(client, method, path, latencies, headers=headers, **kwargs)
+                stats = summarize(latencies, time.perf_counter() - start)
+                print(f"{label:>30}: rps={stats['rps']} p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms")
+    finally:
+        await server.app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Throughput and cache hit rates as uvicorn workers are added.
+
+Each round starts serve.py with N worker processes. It then drives a mixed
+workload over real HTTP:
+- GET /api/auth/me, which exercises the user cache;
+- GET /api/products, which exercises the product catalog snapshot;
+- guest chat FAQ questions, which exercise the guest chat cache.
+Every worker count runs once with CACHE_BACKEND=local and once with redis.
+The redis rounds use the stub Redis unless --redis-url is given. Comparing
+the two shows what sharing buys as workers are added.
+
+Worker processes cannot share mongomock, so MONGO_URL must point at a real
+MongoDB. The stub LLM answers chat. Run from the backend directory:
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --output benchmarks/results/workers.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.common import summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+FAQ_QUESTIONS = [
+    "What is PMI?", "How much down payment do I need?", "What credit score do I need?",
+    "What is an ARM loan?", "How do points work?", "What is escrow?", "What are closing costs?",
+    "Should I choose a 15 or 30 year loan?", "What is DTI?", "How long does pre-approval last?",
+    "What documents do I need?", "Can I refinance later?", "What is an appraisal?",
+    "What is a rate lock?", "What is APR?", "How is my rate determined?"
+]
+
+# Share of requests per operation
+WORKLOAD = (("auth_me", 0.5), ("products", 0.3), ("guest_chat", 0.2))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def mongo_reachable(url: str) -> bool:
+    from pymongo import MongoClient
+    client = MongoClient(url, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+        return True
+    except Exception:
+        return False
+    finally:
+        client.close()
+
+
+def drop_database(url: str, name: str):
+    from pymongo import MongoClient
+    client = MongoClient(url)
+    client.drop_database(name)
+    client.close()
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def worker_stats(client: httpx.AsyncClient, workers: int) -> Dict[int, Dict[str, Any]]:
+    """Poll /stats/cache until every worker has answered (each reports its pid)"""
+    by_pid: Dict[int, Dict[str, Any]] = {}
+    for _ in range(workers * 50):
+        # A new connection each time; a kept-alive one would keep reaching the same worker
+        stats = (await client.get("/stats/cache", headers={"Connection": "close"})).json()
+        by_pid[stats["cache_backend"]["pid"]] = stats
+        if len(by_pid) == workers:
+            break
+    return by_pid
+
+
+def aggregate_caches(by_pid: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    result = {}
+    for name in ("users", "guest_chat"):
+        hits = sum(stats["caches"][name]["hits"] for stats in by_pid.values())
+        misses = sum(stats["caches"][name]["misses"] for stats in by_pid.values())
+        shared_hits = sum(stats["caches"][name]["shared_hits"] for stats in by_pid.values())
+        lookups = hits + misses
+        result[name] = {
+            "lookups": lookups,
+            "local_hits": hits,
+            "shared_hits": shared_hits,
+            "effective_hit_rate": round((hits + shared_hits) / lookups, 4) if lookups else 0.0
+        }
+    products = [stats["products"] for stats in by_pid.values()]
+    result["products"] = {
+        "refreshes": sum(p["refreshes"] for p in products),
+        "shared_loads": sum(p["shared_loads"] for p in products),
+        "mongo_loads": sum(p["refreshes"] - p["shared_loads"] for p in products),
+        "distinct_etags": len({p["etag"] for p in products})
+    }
+    result["workers_reporting"] = len(by_pid)
+    return result
+
+
+async def drive(client: httpx.AsyncClient, tokens: List[str], args) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {name: [] for name, _ in WORKLOAD}
+    errors = 0
+    names = [name for name, _ in WORKLOAD]
+    weights = [weight for _, weight in WORKLOAD]
+    remaining = [args.requests]
+
+    async def virtual_client(seed: int):
+        nonlocal errors
+        rng = random.Random(seed)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            op = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            if op == "auth_me":
+                response = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {rng.choice(tokens)}"})
+            elif op == "products":
+                response = await client.get("/api/products")
+            else:
+                response = await client.post("/api/chat/guest", json={"message": rng.choice(FAQ_QUESTIONS)})
+            latencies[op].append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_client(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        **summarize(all_latencies, elapsed),
+        "errors": errors,
+        "by_operation": {op: summarize(values, elapsed) for op, values in latencies.items()}
+    }
+
+
+async def run_round(workers: int, cache_backend: str, redis_url: str, llm_url: str, args) -> Dict[str, Any]:
+    db_name = f"bench_workers_{workers}_{cache_backend}"
+    drop_database(args.mongo_url, db_name)
+    port = free_port()
+    env = {
+        **os.environ,
+        "MONGO_URL": args.mongo_url,
+        "DB_NAME": db_name,
+        "CACHE_BACKEND": cache_backend,
+        "CACHE_REDIS_URL": redis_url,
+        "CACHE_KEY_PREFIX": f"{db_name}-{uuid.uuid4().hex[:8]}",
+        "LLM_BASE_URL": llm_url,
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "benchmark-secret"),
+        "GUEST_CACHE_SCOPE": "all",
+        # Every guest turn comes from this one address
+        "RATE_LIMIT_ENABLED": "false"
+    }
+    command = ["serve.py", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    if args.mongo_connections:
+        command += ["--mongo-connections", str(args.mongo_connections)]
+    server = spawn(command, env)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_ready(client)
+            tokens = []
+            for _ in range(args.users):
+                signup = await client.post("/api/auth/signup", json={"email": f"{uuid.uuid4().hex}@example.com", "password": "Password123!"})
+                tokens.append(signup.json()["access_token"])
+            load = await drive(client, tokens, args)
+            caches = aggregate_caches(await worker_stats(client, workers))
+    finally:
+        stop(server)
+        drop_database(args.mongo_url, db_name)
+    return {"workers": workers, "cache_backend": cache_backend, "load": load, "caches": caches}
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    env = dict(os.environ)
+    llm_port = free_port()
+    processes = [spawn(["-m", "benchmarks.stub_llm", "--port", str(llm_port), "--latency-ms", str(args.llm_latency_ms)], env)]
+    redis_url = args.redis_url
+    if redis_url is None and "redis" in args.cache_backends:
+        redis_port = free_port()
+        processes.append(spawn(["-m", "benchmarks.stub_redis", "--port", str(redis_port)], env))
+        redis_url = f"redis://127.0.0.1:{redis_port}/0"
+    # Give the stubs a moment to bind
+    await asyncio.sleep(1.0)
+    results = []
+    try:
+        for workers in args.workers:
+            for cache_backend in args.cache_backends:
+                result = await run_round(workers, cache_backend, redis_url or "", f"http://127.0.0.1:{llm_port}", args)
+                results.append(result)
+                load, caches = result["load"], result["caches"]
+                print(
+                    f"workers={workers} cache={cache_backend:<5} rps={load['rps']:>8} p50={load['p50_ms']}ms "
+                    f"p99={load['p99_ms']}ms errors={load['errors']} | hit rate users={caches['users']['effective_hit_rate']} "
+                    f"guest_chat={caches['guest_chat']['effective_hit_rate']} | catalog mongo loads={caches['products']['mongo_loads']} "
+                    f"etags={caches['products']['distinct_etags']} | workers reporting={caches['workers_reporting']}",
+                    flush=True
+                )
+    finally:
+        for process in processes:
+            stop(process)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--cache-backends", nargs="+", choices=["local", "redis"], default=["local", "redis"])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--mongo-connections", type=int, help="total MongoDB connections split across workers")
+    parser.add_argument("--redis-url", help="real Redis to use instead of the stub")
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    if not mongo_reachable(args.mongo_url):
+        sys.exit(f"MongoDB is not reachable at {args.mongo_url}; worker processes need a shared database")
+    # The load generator and stubs share this machine with the workers
+    print(f"{os.cpu_count()} CPU cores; workers beyond that only add contention", flush=True)
+    results = asyncio.run(run(args))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps({"rounds": results}, indent=2))
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Shared setup for benchmarks that drive the API in-process."""
+import os
+import statistics
+import time
+from typing import Dict, List
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret')
+
+
+def load_server(use_mongomock: bool = True):
+    """Import server, swapping in mongomock-motor when available so no mongod is needed"""
+    import server
+    if use_mongomock:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            print("mongomock-motor not installed; using MONGO_URL")
+        else:
+            server.db = AsyncMongoMockClient()[os.environ['DB_NAME']]
+    return server
+
+
+def api_client(server):
+    import httpx
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench")
+
+
+def summarize(latencies: List[float], elapsed: float, digits: int = 3) -> Dict[str, float]:
+    """Latency percentiles in milliseconds (rounded to digits places) plus throughput"""
+    if not latencies:
+        return {"count": 0, "rps": 0.0}
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, digits),
+        "p50_ms": round(pct(50), digits),
+        "p95_ms": round(pct(95), digits),
+        "p99_ms": round(pct(99), digits),
+        "max_ms": round(ordered[-1] * 1000, digits)
+    }
+
+
+async def timed_request(client, method: str, url: str, latencies: List[float], **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    latencies.append(time.perf_counter() - start)
+    return response
@@ -0,0 +1,121 @@
+"""Local OpenAI-compatible stub LLM server for latency and fault testing.
+
+Faults are drawn per request:
+- hang_rate never answers;
+- error_rate answers 503 after the usual latency;
+- slow_rate answers after slow_ms instead of latency_ms, a long latency tail.
+prompt_ms_per_1k adds latency per thousand prompt tokens, as prefill does
+upstream. POST /faults with any of these fields changes them while the stub
+runs.
+
+Run standalone from the backend directory:
+    python -m benchmarks.stub_llm --port 8900 --latency-ms 50
+then start the API with LLM_BASE_URL=http://127.0.0.1:8900. Start two stubs
+and use LLM_ANTHROPIC_BASE_URL and LLM_OPENAI_BASE_URL to fault one provider.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+
+FAULT_FIELDS = ("latency_ms", "error_rate", "hang_rate", "slow_rate", "slow_ms", "prompt_ms_per_1k")
+
+
+class StubLlm:
+    def __init__(
+        self, latency_ms: float = 50, error_rate: float = 0.0, hang_rate: float = 0.0,
+        slow_rate: float = 0.0, slow_ms: float = 1000, prompt_ms_per_1k: float = 0.0, seed: int = 7
+    ):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.prompt_ms_per_1k = prompt_ms_per_1k
+        self.requests = 0
+        self._rng = random.Random(seed)
+
+    def _reply_text(self, payload) -> str:
+        last = payload["messages"][-1]["content"] if payload.get("messages") else ""
+        return f"Stub answer about: {last[:80]}"
+
+    async def _inject_faults(self, prompt_tokens: int):
+        roll = self._rng.random()
+        if roll < self.hang_rate:
+            await asyncio.sleep(3600)
+        slow = self.slow_rate > 0 and self._rng.random() < self.slow_rate
+        prefill_ms = prompt_tokens / 1000 * self.prompt_ms_per_1k
+        await asyncio.sleep(((self.slow_ms if slow else self.latency_ms) + prefill_ms) / 1000)
+        if roll < self.hang_rate + self.error_rate:
+            raise web.HTTPServiceUnavailable(text="stub upstream error")
+
+    def faults(self):
+        return {field: getattr(self, field) for field in FAULT_FIELDS}
+
+    async def set_faults(self, request: web.Request) -> web.Response:
+        for field, value in (await request.json()).items():
+            if field not in FAULT_FIELDS:
+                raise web.HTTPBadRequest(text=f"unknown fault {field}")
+            setattr(self, field, float(value))
+        return web.json_response(self.faults())
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        payload = await request.json()
+        prompt_tokens = sum(len(m["content"]) // 4 for m in payload.get("messages", []))
+        await self._inject_faults(prompt_tokens)
+        text = self._reply_text(payload)
+        if not payload.get("stream"):
+            return web.json_response({
+                "id": f"stub-{self.requests}",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4}
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in text.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(0.002)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/faults", self.set_faults)
+        return app
+
+
+async def start_stub(port: int = 0, **kwargs):
+    """Start a stub in the running loop; returns (stub, runner, base_url)"""
+    stub = StubLlm(**kwargs)
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return stub, runner, f"http://127.0.0.1:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=1000)
+    parser.add_argument("--prompt-ms-per-1k", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubLlm(args.latency_ms, args.error_rate, args.hang_rate, args.slow_rate, args.slow_ms, args.prompt_ms_per_1k)
+    web.run_app(stub.app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Minimal Redis stand-in for multi-worker testing without a Redis server.
+
+Speaks enough RESP2/RESP3 for the shared cache backend and the rate limiter:
+HELLO, PING, GET, SET with EX/PX, DEL, PUBLISH, SUBSCRIBE, UNSUBSCRIBE,
+SCRIPT LOAD, EVAL and EVALSHA. There is no Lua interpreter: the only script
+accepted is the rate limiter's token bucket, which is emulated in Python.
+Everything lives in one process's memory. Expired keys are dropped when they
+are read.
+
+Run standalone from the backend directory:
+    python -m benchmarks.stub_redis --port 6390
+then start the API with CACHE_BACKEND=redis CACHE_REDIS_URL=redis://127.0.0.1:6390/0.
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Dict, List, Set, Tuple
+
+from rate_limit import TOKEN_BUCKET_SCRIPT, refill
+
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode()).hexdigest().encode()
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(items: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+def _push(items: List[bytes], protocol: int) -> bytes:
+    """Pub/sub frames are arrays in RESP2 and push messages in RESP3"""
+    return (b">" if protocol == 3 else b"*") + b"%d\r\n" % len(items) + b"".join(items)
+
+
+def _integer(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+OK = b"+OK\r\n"
+NIL = b"$-1\r\n"
+
+
+class StubRedis:
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, float]] = {}
+        # Subscribed connections per channel, with the protocol each negotiated
+        self._channels: Dict[bytes, Dict[asyncio.StreamWriter, int]] = {}
+        self._scripts: Set[bytes] = set()
+        self._buckets: Dict[bytes, Tuple[float, float]] = {}
+        self.commands = 0
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> List[bytes]:
+        header = await reader.readline()
+        if not header:
+            raise ConnectionError("client closed")
+        if not header.startswith(b"*"):
+            return header.strip().split()
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _get(self, key: bytes):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    def _set(self, args: List[bytes]) -> bytes:
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = 0.0
+        for flag, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if flag in options:
+                expires_at = time.monotonic() + float(args[2 + options.index(flag) + 1]) * scale
+        self._data[key] = (value, expires_at)
+        return OK
+
+    def _publish(self, channel: bytes, message: bytes) -> bytes:
+        subscribers = self._channels.get(channel, {})
+        for writer, protocol in list(subscribers.items()):
+            writer.write(_push([_bulk(b"message"), _bulk(channel), _bulk(message)], protocol))
+        return _integer(len(subscribers))
+
+    def _token_bucket(self, keys: List[bytes], args: List[bytes]) -> bytes:
+        rate, burst, cost = (float(arg) for arg in args[:3])
+        now = time.time()
+        tokens, ts = self._buckets.get(keys[0], (burst, now))
+        tokens = refill(tokens, now - ts, rate, burst)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[keys[0]] = (tokens, now)
+        return _array([_integer(int(allowed)), _bulk(repr(tokens).encode())])
+
+    def _run_script(self, sha: bytes, args: List[bytes]) -> bytes:
+        if sha not in self._scripts:
+            return b"-NOSCRIPT No matching script. Please use EVAL.\r\n"
+        if sha != TOKEN_BUCKET_SHA:
+            return b"-ERR stub redis only runs the rate limiter script\r\n"
+        numkeys = int(args[0])
+        return self._token_bucket(args[1:1 + numkeys], args[1 + numkeys:])
+
+    def _execute(self, args: List[bytes], writer: asyncio.StreamWriter, subscriptions: Set[bytes], session: Dict[str, int]) -> bytes:
+        command = args[0].upper()
+        protocol = session["protocol"]
+        if command == b"HELLO":
+            if len(args) > 1:
+                session["protocol"] = int(args[1])
+            fields = [b"server", b"stub-redis", b"version", b"7.2.0", b"proto"]
+            if session["protocol"] == 3:
+                return b"%3\r\n" + b"".join(_bulk(field) for field in fields) + _integer(3)
+            return _array([_bulk(field) for field in fields] + [_integer(2)])
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"GET":
+            value = self._get(args[1])
+            if value is None:
+                return b"_\r\n" if protocol == 3 else NIL
+            return _bulk(value)
+        if command == b"SET":
+            return self._set(args[1:])
+        if command == b"DEL":
+            return _integer(sum(self._data.pop(key, None) is not None for key in args[1:]))
+        if command == b"PUBLISH":
+            return self._publish(args[1], args[2])
+        if command == b"SUBSCRIBE":
+            replies = []
+            for channel in args[1:]:
+                subscriptions.add(channel)
+                self._channels.setdefault(channel, {})[writer] = protocol
+                replies.append(_push([_bulk(b"subscribe"), _bulk(channel), _integer(len(subscriptions))], protocol))
+            return b"".join(replies)
+        if command == b"UNSUBSCRIBE":
+            channels = args[1:] or list(subscriptions)
+            replies = []
+            for channel in channels:
+                subscriptions.discard(channel)
+                self._channels.get(channel, {}).pop(writer, None)
+                replies.append(_push([_bulk(b"unsubscribe"), _bulk(channel), _integer(len(subscriptions))], protocol))
+            return b"".join(replies) or _push([_bulk(b"unsubscribe"), NIL, _integer(0)], protocol)
+        if command == b"SCRIPT" and args[1].upper() == b"LOAD":
+            sha = hashlib.sha1(args[2]).hexdigest().encode()
+            self._scripts.add(sha)
+            return _bulk(sha)
+        if command == b"EVAL":
+            sha = hashlib.sha1(args[1]).hexdigest().encode()
+            self._scripts.add(sha)
+            return self._run_script(sha, args[2:])
+        if command == b"EVALSHA":
+            return self._run_script(args[1].lower(), args[2:])
+        if command in (b"CLIENT", b"SELECT"):
+            # Connection setup the client sends on connect (CLIENT SETINFO) or for a non-zero db
+            return OK
+        return b"-ERR unknown command '%s'\r\n" % command
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriptions: Set[bytes] = set()
+        session = {"protocol": 2}
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if not args:
+                    continue
+                self.commands += 1
+                writer.write(self._execute(args, writer, subscriptions, session))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Client went away, or the server is shutting down
+            pass
+        finally:
+            for channel in subscriptions:
+                self._channels.get(channel, {}).pop(writer, None)
+            writer.close()
+
+
+async def start_stub_redis(port: int = 0):
+    """Start a stub in the running loop; returns (stub, server, url)"""
+    stub = StubRedis()
+    server = await asyncio.start_server(stub.handle, "127.0.0.1", port)
+    bound_port = server.sockets[0].getsockname()[1]
+    return stub, server, f"redis://127.0.0.1:{bound_port}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def serve():
+        _, server, url = await start_stub_redis(args.port)
+        print(f"stub redis listening on {url}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
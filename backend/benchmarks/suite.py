@@ -0,0 +1,307 @@
+"""Benchmark suite: hot-path micro-benchmarks plus in-process load scenarios.
+
+Micro-benchmarks time calculate_prequal, intent detection, JWT encode/decode
+and response model serialization call by call. Load scenarios drive the API
+through httpx's ASGI transport with concurrent clients: signup/login,
+pre-qualification, chat against the local stub LLM, and the paginated list
+endpoints. They run on mongomock when it is installed, otherwise on MONGO_URL.
+
+Every case reports RPS and p50/p95/p99 latency. Allocations come from a
+separate, shorter tracemalloc pass, so tracing does not skew the timings.
+Results are written as JSON. Pass a previous file to --compare to print
+per-case deltas.
+
+Run from the backend directory:
+    python -m benchmarks.suite --output benchmarks/results/latest.json
+    python -m benchmarks.suite --quick --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.common import api_client, load_server, summarize, timed_request
+from benchmarks.stub_llm import start_stub
+
+MESSAGES = [
+    "What rate would I get on a 30 year fixed?",
+    "How do I start my pre-qualification?",
+    "Can you explain what PMI is?",
+    "I want to refinance my home",
+    "What documents do I need to upload?",
+    "hello there",
+]
+
+
+def measure_allocations(run: Callable[[], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_kb": round((peak - before) / 1024, 1), "alloc_retained_kb": round((current - before) / 1024, 1)}
+
+
+async def measure_allocations_async(run: Callable[[], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        await run()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_kb": round((peak - before) / 1024, 1), "alloc_retained_kb": round((current - before) / 1024, 1)}
+
+
+# ============= MICRO-BENCHMARKS =============
+
+def micro_cases(server) -> Dict[str, Callable[[int], Any]]:
+    """name -> fn(i) performing one operation"""
+    from intent_classifier import classify_intent
+
+    prequal_requests = [
+        server.PreQualRequest(
+            loan_amount=150000 + 5000 * i, down_payment=10000 + 2500 * (i % 20), annual_income=60000 + 1000 * i,
+            monthly_debts=300 + 25 * (i % 30), credit_score=600 + (i * 7) % 200,
+            employment_status="employed" if i % 5 else "retired"
+        )
+        for i in range(64)
+    ]
+    user = server.User(email="bench@example.com")
+    claims = server.user_token_claims(user)
+    token = server.create_access_token(data=claims)
+    result = server.PreQualResult(
+        user_id=user.id, loan_amount=320000, down_payment=60000, credit_score=720, dti=18.5, status="approved",
+        max_loan_amount=410000, estimated_rate=6.0, monthly_payment=1918.56,
+        conditions=["Employment verification required"], explanation="x" * 300
+    )
+    applications = [
+        server.Application(
+            user_id=user.id, loan_amount=300000 + i, loan_type="fixed", property_address={"street": f"{i} Main St", "city": "Austin"},
+            property_value=380000, down_payment=80000 - i, purpose="purchase"
+        )
+        for i in range(20)
+    ]
+
+    return {
+        "calculate_prequal": lambda i: server.calculate_prequal(prequal_requests[i % len(prequal_requests)]),
+        "classify_intent": lambda i: classify_intent(MESSAGES[i % len(MESSAGES)]),
+        "jwt_encode": lambda i: server.create_access_token(data=claims),
+        "jwt_decode": lambda i: server.jwt.decode(token, server.JWT_SECRET_KEY, algorithms=[server.JWT_ALGORITHM]),
+        "serialize_prequal_result": lambda i: result.model_dump_json(),
+        "serialize_application_list": lambda i: json.dumps([a.model_dump(mode="json") for a in applications]),
+    }
+
+
+def run_micro(server, iterations: int, alloc_iterations: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, op in micro_cases(server).items():
+        for i in range(min(iterations // 10, 1000)):
+            op(i)  # warm caches and lazy imports
+        latencies = []
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        for i in range(iterations):
+            call_start = perf_counter()
+            op(i)
+            latencies.append(perf_counter() - call_start)
+        # Microsecond-scale operations need sub-microsecond resolution to compare runs
+        result = summarize(latencies, perf_counter() - start, digits=5)
+
+        def alloc_pass():
+            for i in range(alloc_iterations):
+                op(i)
+        allocations = measure_allocations(alloc_pass)
+        result.update(allocations)
+        result["alloc_peak_bytes_per_op"] = round(allocations["alloc_peak_kb"] * 1024 / alloc_iterations, 1)
+        results[f"micro.{name}"] = result
+    return results
+
+
+# ============= LOAD SCENARIOS =============
+
+async def drive(client, concurrency: int, total: int, make_request) -> Dict[str, Any]:
+    """Run total requests over `concurrency` workers; make_request(client, i, latencies) -> response"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            response = await make_request(client, i, latencies)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - start)
+    result["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+async def seed_user(client, label: str) -> Dict[str, str]:
+    email = f"{label}-{uuid.uuid4().hex[:10]}@example.com"
+    response = await client.post("/api/auth/signup", json={"email": email, "password": "Password123!"})
+    response.raise_for_status()
+    return {"email": email, "headers": {"Authorization": f"Bearer {response.json()['access_token']}"}}
+
+
+async def load_scenarios(server, client, args) -> Dict[str, Callable[[int], Any]]:
+    """name -> coroutine fn(total) returning a drive() result"""
+    owner = await seed_user(client, "owner")
+    headers = owner["headers"]
+    prequal_body = {"loan_amount": 320000, "down_payment": 60000, "annual_income": 95000, "monthly_debts": 900, "employment_status": "employed"}
+    for i in range(args.list_seed):
+        await client.post("/api/prequal/calculate", json={**prequal_body, "loan_amount": 200000 + 1000 * i}, headers=headers)
+        await client.post("/api/applications", json={
+            "loan_amount": 300000 + i, "loan_type": "fixed", "property_address": {"street": f"{i} Main St"},
+            "property_value": 380000, "down_payment": 80000
+        }, headers=headers)
+
+    async def signup_login(total):
+        async def request(client, i, latencies):
+            email = f"load-{uuid.uuid4().hex}@example.com"
+            await timed_request(client, "POST", "/api/auth/signup", latencies, json={"email": email, "password": "Password123!"})
+            return await timed_request(client, "POST", "/api/auth/login", latencies, json={"email": email, "password": "Password123!"})
+        return await drive(client, args.concurrency, total, request)
+
+    async def prequal(total):
+        async def request(client, i, latencies):
+            body = {**prequal_body, "loan_amount": 150000 + (i % 500) * 1000}
+            return await timed_request(client, "POST", "/api/prequal/calculate", latencies, json=body, headers=headers)
+        return await drive(client, args.concurrency, total, request)
+
+    async def chat(total):
+        async def request(client, i, latencies):
+            body = {"message": MESSAGES[i % len(MESSAGES)], "session_id": f"bench-{i % 50}"}
+            return await timed_request(client, "POST", "/api/chat/message", latencies, json=body, headers=headers)
+        return await drive(client, args.concurrency, total, request)
+
+    async def list_endpoints(total):
+        paths = ["/api/applications?limit=20", "/api/prequal/history?limit=20", "/api/documents?limit=20", "/api/products"]
+
+        async def request(client, i, latencies):
+            return await timed_request(client, "GET", paths[i % len(paths)], latencies, headers=headers)
+        return await drive(client, args.concurrency, total, request)
+
+    return {
+        # bcrypt dominates this one by design, so it gets fewer requests
+        "signup_login": (signup_login, max(args.requests // 10, 10)),
+        "prequal": (prequal, args.requests),
+        "chat_stub_llm": (chat, args.requests),
+        "list_endpoints": (list_endpoints, args.requests),
+    }
+
+
+async def run_load(server, args) -> Dict[str, Dict[str, Any]]:
+    from llm_pool import LlmClientPool
+
+    stub, runner, base_url = await start_stub(latency_ms=args.llm_latency_ms)
+    server.llm_pool = LlmClientPool(api_key="stub", base_url=base_url, default_concurrency=args.concurrency)
+    # One benchmark user sends every chat turn; measure the chat path, not the per-user rate limit
+    server.RATE_LIMIT_ENABLED = False
+    await server.app.router.startup()
+    results = {}
+    try:
+        async with api_client(server) as client:
+            scenarios = await load_scenarios(server, client, args)
+            for name, (scenario, total) in scenarios.items():
+                await scenario(min(total, 20))  # warm-up
+                result = await scenario(total)
+                result.update(await measure_allocations_async(lambda: scenario(max(total // 10, 5))))
+                results[f"load.{name}"] = result
+    finally:
+        await server.app.router.shutdown()
+        await runner.cleanup()
+    return results
+
+
+# ============= REPORTING =============
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit or None,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "args": vars(args)
+    }
+
+
+COMPARED_FIELDS = (("rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("alloc_peak_kb", False))
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\ncompared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')}); + is better")
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            print(f"{name:>34}: new")
+            continue
+        deltas = []
+        for field, higher_is_better in COMPARED_FIELDS:
+            old, new = previous.get(field), result.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            deltas.append(f"{field} {change if higher_is_better else -change:+.1f}%")
+        print(f"{name:>34}: {', '.join(deltas)}")
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    for name, result in results.items():
+        print(
+            f"{name:>34}: rps={result['rps']:<10} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+            f"p99={result['p99_ms']}ms alloc_peak={result.get('alloc_peak_kb')}KB"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=["micro", "load"], help="run one half of the suite")
+    parser.add_argument("--quick", action="store_true", help="smaller iteration counts for a fast sanity run")
+    parser.add_argument("--iterations", type=int, default=20000, help="calls per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--list-seed", type=int, default=60, help="records seeded for the list endpoints")
+    parser.add_argument("--llm-latency-ms", type=float, default=20)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="previous results JSON to diff against")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.iterations = min(args.iterations, 2000)
+        args.requests = min(args.requests, 200)
+        args.list_seed = min(args.list_seed, 20)
+
+    server = load_server()
+    results: Dict[str, Dict[str, Any]] = {}
+    if args.only in (None, "micro"):
+        results.update(run_micro(server, args.iterations, max(args.iterations // 20, 50)))
+    if args.only in (None, "load"):
+        results.update(asyncio.run(run_load(server, args)))
+
+    report = {"meta": run_metadata(args), "results": results}
+    print_results(results)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2, default=str))
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
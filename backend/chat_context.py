@@ -0,0 +1,189 @@
+"""Bounded chat context: a rolling window of recent turns plus a running summary of older ones.
+
+Pooled chat clients keep a session's conversation as OpenAI-style messages:
+the system prompt, then an optional summary message, then the turns.
+ContextManager keeps both the stored list and each request bounded:
+- prompt() picks what goes upstream: the system prompt with the summary folded
+  into it, as many of the newest turns as fit in max_tokens, and the new
+  message. It also returns the prompt's token count, which is reported per turn.
+- Once a session holds more than window_turns turns, compact() folds the
+  oldest into the summary, keeping the newest half of the window verbatim.
+  The summary is updated from the previous summary plus the folded turns, not
+  from the whole transcript. The pool runs compaction in the background after
+  a turn, so it never delays a reply.
+Token counts come from tiktoken when token_counter="tiktoken" and its
+encoding loads. Otherwise they are estimated at about four characters per
+token. Either way they are for budgeting; providers bill by their own
+tokenizers.
+"""
+import functools
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_COUNTERS = ("estimate", "tiktoken")
+TIKTOKEN_ENCODING = "cl100k_base"
+# Role and separators each message adds to the prompt
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Summary of the conversation so far:\n"
+
+# (previous summary, turns to fold in, max tokens) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]], int], Awaitable[str]]
+
+
+def load_tokenizer(kind: str):
+    """A tiktoken encoding, or None to estimate from length"""
+    if kind not in TOKEN_COUNTERS:
+        raise ValueError(f"CHAT_TOKEN_COUNTER must be one of {TOKEN_COUNTERS}, got {kind!r}")
+    if kind == "estimate":
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    except Exception as e:
+        # Not installed, or the encoding file could not be downloaded
+        logger.warning(f"tiktoken unavailable, estimating token counts from length: {str(e)}")
+        return None
+
+
+def split_messages(messages: List[Dict[str, str]]) -> Tuple[Dict[str, str], Optional[Dict[str, str]], List[Dict[str, str]]]:
+    """(system prompt, summary message or None, turns)"""
+    system, rest = messages[0], messages[1:]
+    if rest and rest[0]["role"] == "system" and rest[0]["content"].startswith(SUMMARY_PREFIX):
+        return system, rest[0], rest[1:]
+    return system, None, rest
+
+
+def summary_text(summary: Optional[Dict[str, str]]) -> str:
+    return summary["content"][len(SUMMARY_PREFIX):] if summary else ""
+
+
+def render_transcript(turns: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in turns)
+
+
+def render_system_prompt(prompt: List[Dict[str, str]]) -> str:
+    """Flatten prompt() output minus the new message into one system message, for clients that take no history"""
+    head, turns = prompt[0]["content"], prompt[1:]
+    if not turns:
+        return head
+    return f"{head}\n\nConversation so far:\n{render_transcript(turns)}"
+
+
+def _first_sentence(text: str, max_chars: int = 200) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "..."
+
+
+class ContextManager:
+    def __init__(
+        self,
+        max_tokens: int = 4000,
+        window_turns: int = 8,
+        summary_max_tokens: int = 400,
+        summarizer: Optional[Summarizer] = None,
+        token_counter: str = "estimate"
+    ):
+        if window_turns < 2:
+            raise ValueError("window_turns must be at least 2")
+        self.max_tokens = max_tokens
+        self.window_turns = window_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer or self.extractive_summary
+        self._tokenizer = load_tokenizer(token_counter)
+        self.token_counter = "tiktoken" if self._tokenizer is not None else "estimate"
+        # The same turns are counted on every request of a session
+        self.count_tokens = functools.lru_cache(maxsize=8192)(self._count_tokens)
+        # Message lists with a compaction in flight, by id
+        self._compacting: Set[int] = set()
+        self.prompts = 0
+        self.trimmed_prompts = 0
+        self.compactions = 0
+        self.compactions_abandoned = 0
+        self.summary_errors = 0
+
+    def _count_tokens(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text))
+        return (len(text) + 3) // 4
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def prompt(self, messages: List[Dict[str, str]], turn: Dict[str, str]) -> Tuple[List[Dict[str, str]], int]:
+        """Messages to send for turn within max_tokens, and their token count.
+
+        The newest turns that fit are kept whole. The system prompt, summary and new
+        message always go, even when they alone exceed the budget.
+        """
+        system, summary, turns = split_messages(messages)
+        head = system
+        if summary is not None:
+            head = {"role": "system", "content": f"{system['content']}\n\n{summary['content']}"}
+        used = self.message_tokens(head) + self.message_tokens(turn)
+        start = len(turns)
+        while start > 0 and used + self.message_tokens(turns[start - 1]) <= self.max_tokens:
+            start -= 1
+            used += self.message_tokens(turns[start])
+        # Start the window on a user message, not on a reply to something cut off
+        while start < len(turns) and turns[start]["role"] != "user":
+            used -= self.message_tokens(turns[start])
+            start += 1
+        self.prompts += 1
+        if start > 0:
+            self.trimmed_prompts += 1
+        return [head, *turns[start:], turn], used
+
+    def needs_compaction(self, messages: List[Dict[str, str]]) -> bool:
+        return id(messages) not in self._compacting and len(split_messages(messages)[2]) > 2 * self.window_turns
+
+    async def compact(self, messages: List[Dict[str, str]]) -> bool:
+        """Fold the oldest turns into the summary, in place; False when there was nothing to do or the list changed meanwhile"""
+        if not self.needs_compaction(messages):
+            return False
+        self._compacting.add(id(messages))
+        try:
+            _, summary, turns = split_messages(messages)
+            # Fold whole turns, keeping the newest half of the window
+            fold = turns[:len(turns) - 2 * (self.window_turns // 2)]
+            previous = summary_text(summary)
+            try:
+                text = await self.summarizer(previous, fold, self.summary_max_tokens)
+                if self.count_tokens(text) > self.summary_max_tokens:
+                    raise ValueError(f"summary of {self.count_tokens(text)} tokens is over the {self.summary_max_tokens} token budget")
+            except Exception as e:
+                self.summary_errors += 1
+                logger.warning(f"Chat summary failed, keeping first sentences instead: {str(e)}")
+                text = await self.extractive_summary(previous, fold, self.summary_max_tokens)
+            # Turns are appended while the summary is written; a failover sync may replace them outright
+            _, _, current = split_messages(messages)
+            if len(current) < len(fold) or any(a is not b for a, b in zip(current, fold)):
+                self.compactions_abandoned += 1
+                return False
+            messages[1:] = [{"role": "system", "content": SUMMARY_PREFIX + text.strip()}, *current[len(fold):]]
+            self.compactions += 1
+            return True
+        finally:
+            self._compacting.discard(id(messages))
+
+    async def extractive_summary(self, previous: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+        """Previous summary plus the first sentence of each folded message, newest kept when over budget"""
+        lines = [line for line in previous.splitlines() if line]
+        lines += [f"{'User' if turn['role'] == 'user' else 'Assistant'}: {_first_sentence(turn['content'])}" for turn in turns]
+        while len(lines) > 1 and self.count_tokens("\n".join(lines)) > max_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens,
+            "window_turns": self.window_turns,
+            "token_counter": self.token_counter,
+            "prompts": self.prompts,
+            "trimmed_prompts": self.trimmed_prompts,
+            "compactions": self.compactions,
+            "compactions_abandoned": self.compactions_abandoned,
+            "summary_errors": self.summary_errors
+        }
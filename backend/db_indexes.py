@@ -0,0 +1,154 @@
+"""MongoDB index bootstrap and query-plan audit.
+
+ensure_indexes creates every index the API's queries rely on and is safe to
+run on each startup. audit_query_plans runs explain() for each route's query
+shape and flags any that would fall back to a collection scan.
+
+Run the audit by hand from the backend directory:
+    python -m db_indexes --audit
+"""
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# collection -> [(keys, options)]
+INDEX_SPECS: Dict[str, List[Tuple[List[Tuple[str, int]], Dict[str, Any]]]] = {
+    "users": [
+        ([("id", ASCENDING)], {"unique": True, "name": "id_unique"}),
+        ([("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    ],
+    "user_profiles": [
+        ([("user_id", ASCENDING)], {"unique": True, "name": "user_id_unique"}),
+    ],
+    "documents": [
+        ([("user_id", ASCENDING), ("uploaded_at", DESCENDING), ("id", DESCENDING)], {"name": "user_uploaded_id"}),
+        ([("id", ASCENDING)], {"unique": True, "name": "id_unique"}),
+        # Only unfinished OCR jobs, which startup requeues; $in in a partial filter needs MongoDB 6.0+
+        ([("ocr_status", ASCENDING)], {
+            "name": "ocr_status_open",
+            "partialFilterExpression": {"ocr_status": {"$in": ["pending", "processing"]}}
+        }),
+    ],
+    "chat_sessions": [
+        ([("session_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True, "name": "session_user_unique"}),
+    ],
+    "chat_messages": [
+        ([("session_id", ASCENDING), ("user_id", ASCENDING), ("seq", DESCENDING)], {"unique": True, "name": "session_user_seq_unique"}),
+    ],
+    "prequal_results": [
+        ([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], {"name": "user_created_id"}),
+    ],
+    "applications": [
+        ([("user_id", ASCENDING), ("updated_at", DESCENDING), ("id", DESCENDING)], {"name": "user_updated_id"}),
+        ([("id", ASCENDING), ("user_id", ASCENDING)], {"unique": True, "name": "id_user_unique"}),
+    ],
+    "mortgage_products": [
+        ([("id", ASCENDING)], {"unique": True, "name": "id_unique"}),
+    ],
+}
+
+# Query shapes issued by server.py routes: (route, collection, filter, sort)
+QUERY_SHAPES: List[Tuple[str, str, Dict[str, Any], List[Tuple[str, int]]]] = [
+    ("POST /auth/signup, /auth/login", "users", {"email": "audit@example.com"}, []),
+    ("get_current_user", "users", {"id": "audit"}, []),
+    ("GET/PUT /profile, POST /prequal/calculate", "user_profiles", {"user_id": "audit"}, []),
+    ("GET /documents", "documents", {"user_id": "audit"}, [("uploaded_at", DESCENDING), ("id", DESCENDING)]),
+    ("start_ocr_workers", "documents", {"ocr_status": {"$in": ["pending", "processing"]}, "storage_key": {"$ne": None}}, []),
+    ("POST /chat/message", "chat_sessions", {"session_id": "audit", "user_id": "audit"}, []),
+    ("save_chat_turn", "chat_sessions", {"session_id": "audit", "user_id": "audit"}, []),
+    ("GET /chat/history", "chat_messages", {"session_id": "audit", "user_id": "audit", "seq": {"$lt": 100}}, [("seq", DESCENDING)]),
+    ("GET /prequal/history", "prequal_results", {"user_id": "audit"}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("GET /applications", "applications", {"user_id": "audit"}, [("updated_at", DESCENDING), ("id", DESCENDING)]),
+    ("GET /applications/{id}", "applications", {"id": "audit", "user_id": "audit"}, []),
+    ("PUT /applications/{id}/submit", "applications", {"id": "audit"}, []),
+]
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create all declared indexes; existing identical indexes are a no-op"""
+    created: Dict[str, List[str]] = {}
+    for collection, specs in INDEX_SPECS.items():
+        for keys, options in specs:
+            try:
+                name = await db[collection].create_index(keys, **options)
+                created.setdefault(collection, []).append(name)
+            except OperationFailure as e:
+                # Typically duplicate data blocking a unique index; keep serving and surface it
+                logger.error(f"Index {collection}.{options.get('name')} not created: {str(e)}")
+    return created
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(child_key), dict):
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def audit_query_plans(db) -> List[Dict[str, Any]]:
+    """explain() every route query shape and report which index, if any, it uses"""
+    report = []
+    for route, collection, query_filter, sort in QUERY_SHAPES:
+        command = {"find": collection, "filter": query_filter}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning)
+        report.append({
+            "route": route,
+            "collection": collection,
+            "stages": stages,
+            "collection_scan": "COLLSCAN" in stages,
+            "in_memory_sort": "SORT" in stages
+        })
+    return report
+
+
+def log_audit(report: List[Dict[str, Any]]) -> int:
+    problems = 0
+    for entry in report:
+        if entry["collection_scan"] or entry["in_memory_sort"]:
+            problems += 1
+            logger.warning(f"Query plan for {entry['route']} on {entry['collection']}: {' <- '.join(entry['stages'])}")
+        else:
+            logger.info(f"Query plan OK for {entry['route']} on {entry['collection']}")
+    return problems
+
+
+async def _main(audit: bool):
+    import os
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        created = await ensure_indexes(db)
+        for collection, names in created.items():
+            print(f"{collection}: {', '.join(names)}")
+        if audit:
+            problems = log_audit(await audit_query_plans(db))
+            print(f"query shapes with collection scans or in-memory sorts: {problems}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Create MongoDB indexes and optionally audit query plans")
+    parser.add_argument("--audit", action="store_true", help="run explain() on every route query shape")
+    asyncio.run(_main(parser.parse_args().audit))
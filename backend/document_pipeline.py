@@ -0,0 +1,210 @@
+"""Document upload storage and background OCR processing.
+
+Uploads are copied to object storage in fixed-size chunks so a file is never
+held in memory whole. OCR runs on a pool of background workers that move each
+document's ocr_status through pending -> processing -> completed/failed.
+With a claim function, a worker only runs a job it has claimed, so several
+server processes can queue the same pending document and only one OCRs it.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    name = _UNSAFE_FILENAME.sub("_", Path(filename or "upload").name).strip("._")
+    return name or "upload"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+# ============= STORAGE =============
+
+class ObjectStorage(ABC):
+    """Storage backend interface; keys are relative paths like user_id/doc_id/file.pdf"""
+
+    @abstractmethod
+    async def save_stream(self, key: str, source, chunk_size: int, max_bytes: int) -> Tuple[int, str]:
+        """Copy an async-readable source to key; returns (size_bytes, sha256 hex)"""
+
+    @abstractmethod
+    def local_path(self, key: str) -> Path:
+        """Filesystem path OCR engines can read from"""
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        """URL clients fetch the stored file from"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove key; a missing key is not an error"""
+
+
+class LocalObjectStorage(ObjectStorage):
+    def __init__(self, root: str, url_prefix: str = "/storage"):
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    async def save_stream(self, key: str, source, chunk_size: int, max_bytes: int) -> Tuple[int, str]:
+        path = self.local_path(key)
+        partial = path.with_name(path.name + ".part")
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        handle = await asyncio.to_thread(open, partial, "wb")
+        try:
+            while True:
+                chunk = await source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(handle.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(partial.unlink, missing_ok=True)
+            raise
+        await asyncio.to_thread(handle.close)
+        # Only complete files become visible under the final key
+        await asyncio.to_thread(os.replace, partial, path)
+        return size, digest.hexdigest()
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.local_path(key).unlink, missing_ok=True)
+
+
+# ============= OCR =============
+
+class MockOcrEngine:
+    """Stand-in OCR that returns fixed fields (real OCR is not integrated yet)"""
+
+    def __init__(self, delay_seconds: float = 0.0):
+        self.delay_seconds = delay_seconds
+
+    async def extract(self, path: Path, doc_type: str, filename: str) -> Tuple[Dict[str, Any], float]:
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        ocr_data = {
+            "filename": filename,
+            "extracted_text": "[Mock OCR] Document processed successfully",
+            "fields": {
+                "name": "John Doe",
+                "date": "2025-01-15",
+                "amount": "$5,000"
+            }
+        }
+        return ocr_data, 0.95
+
+
+StatusUpdater = Callable[[str, Dict[str, Any]], Awaitable[None]]
+# Atomically marks a document processing for this worker; False when it is no longer pending
+JobClaimer = Callable[[str], Awaitable[bool]]
+
+
+class OcrWorkerPool:
+    """Fixed set of asyncio workers draining a bounded OCR job queue"""
+
+    def __init__(
+        self,
+        engine,
+        storage: ObjectStorage,
+        update_status: StatusUpdater,
+        workers: int = 2,
+        max_queue: int = 1000,
+        claim: Optional[JobClaimer] = None
+    ):
+        self.engine = engine
+        self.storage = storage
+        self.update_status = update_status
+        self.claim = claim
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    def enqueue(self, document_id: str, storage_key: str, doc_type: str, filename: str) -> bool:
+        """Queue a document for OCR; False when the queue is full and it stays pending"""
+        try:
+            self._queue.put_nowait((document_id, storage_key, doc_type, filename))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"OCR queue full, document {document_id} left pending")
+            return False
+
+    async def _worker(self, index: int):
+        while True:
+            document_id, storage_key, doc_type, filename = await self._queue.get()
+            try:
+                if self.claim is None:
+                    await self.update_status(document_id, {"ocr_status": "processing"})
+                elif not await self.claim(document_id):
+                    # Another worker has it, or it is already done
+                    self.skipped += 1
+                    continue
+                ocr_data, confidence = await self.engine.extract(self.storage.local_path(storage_key), doc_type, filename)
+                await self.update_status(document_id, {
+                    "ocr_status": "completed",
+                    "ocr_data": ocr_data,
+                    "confidence_score": confidence
+                })
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"OCR failed for document {document_id}: {str(e)}")
+                try:
+                    await self.update_status(document_id, {"ocr_status": "failed", "ocr_error": str(e)})
+                except Exception as update_error:
+                    logger.error(f"Could not mark document {document_id} failed: {str(update_error)}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout: float):
+        """Wait for queued jobs to finish, up to timeout seconds"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"OCR queue not drained at shutdown; {self._queue.qsize()} jobs stay pending")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        if self._tasks:
+            await self.drain(drain_timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped
+        }
@@ -0,0 +1,97 @@
+"""Keyword intent classifier for chat messages.
+
+Each keyword is a substring test on the lowercased message, as in the
+original chained scans, but every intent is checked in one flat pass so the
+result carries all matched intents with confidence scores. Substring tests
+are single C-level searches, which keeps the pass cheaper than the old
+per-intent generator scans even though it does not stop at the first match.
+A keyword that is the start of a longer one ("doc" in "document") counts only
+where the longer keyword does not follow. The highest-priority matching
+intent wins.
+"""
+import functools
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# In priority order; earlier intents win when several match
+INTENT_KEYWORDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('getQuote', ('quote', 'rate', 'payment', 'calculate')),
+    ('preQual', ('qualify', 'eligible', 'pre-qual', 'prequalify')),
+    ('startApplication', ('apply', 'application', 'start')),
+    ('uploadDoc', ('upload', 'document', 'doc')),
+    ('explainTerm', ('explain', 'what is', 'what are', 'help me understand')),
+    ('requestHuman', ('talk', 'human', 'person', 'agent')),
+)
+
+
+class IntentMatch(NamedTuple):
+    intent: Optional[str]
+    confidence: Optional[float]
+    ranked: List[Tuple[str, float]]
+
+
+class IntentClassifier:
+    def __init__(self, intent_keywords=INTENT_KEYWORDS):
+        self._priority: Dict[str, int] = {}
+        keyword_intent: Dict[str, str] = {}
+        for priority, (intent, keywords) in enumerate(intent_keywords):
+            self._priority[intent] = priority
+            for keyword in keywords:
+                keyword_intent.setdefault(keyword, intent)
+        # (keyword, intent) in priority order, so the first hit is the winning intent
+        self._keywords: Tuple[Tuple[str, str], ...] = tuple(keyword_intent.items())
+        # Keyword -> the longer keywords it starts
+        self._extensions: Dict[str, Tuple[str, ...]] = {}
+        for keyword in keyword_intent:
+            longer = tuple(word for word in keyword_intent if word != keyword and word.startswith(keyword))
+            if longer:
+                self._extensions[keyword] = longer
+        # Few distinct hit patterns occur in practice, so scoring is memoized per pattern
+        self._score = functools.lru_cache(maxsize=4096)(self._score_hits)
+
+    def _stands_alone(self, keyword: str, text: str) -> bool:
+        """Whether keyword occurs somewhere not as the start of a longer keyword"""
+        longer = self._extensions[keyword]
+        start = text.find(keyword)
+        while start != -1:
+            if not any(text.startswith(word, start) for word in longer):
+                return True
+            start = text.find(keyword, start + 1)
+        return False
+
+    def classify(self, message: str) -> IntentMatch:
+        """Return the winning intent, its confidence and every matched intent ranked by confidence.
+
+        Confidence is the intent's share of distinct keyword hits, discounted when
+        it rests on a single keyword: one hit scores 0.7, three or more score 1.0.
+        The winner is the highest-priority match, as with the original scans, so on
+        a tie in confidence it is also first in ranked.
+        """
+        text = message.lower()
+        found = tuple([
+            intent for keyword, intent in self._keywords
+            if keyword in text and (keyword not in self._extensions or self._stands_alone(keyword, text))
+        ])
+        if not found:
+            return IntentMatch(None, None, [])
+        intent, confidence, ranked = self._score(found)
+        return IntentMatch(intent, confidence, list(ranked))
+
+    def _score_hits(self, found: Tuple[str, ...]) -> Tuple[str, float, Tuple[Tuple[str, float], ...]]:
+        """(winner, its confidence, ranked) for the intents of the matched keywords, in priority order"""
+        hits: Dict[str, int] = {}
+        for intent in found:
+            hits[intent] = hits.get(intent, 0) + 1
+        total = len(found)
+        scores = {
+            intent: round(count / total * min(1.0, 0.7 + 0.15 * (count - 1)), 3)
+            for intent, count in hits.items()
+        }
+        ranked = tuple(sorted(scores.items(), key=lambda item: (-item[1], self._priority[item[0]])))
+        return found[0], scores[found[0]], ranked
+
+
+default_classifier = IntentClassifier()
+
+
+def classify_intent(message: str) -> IntentMatch:
+    return default_classifier.classify(message)
@@ -0,0 +1,349 @@
+"""Resilient LLM dispatch: timeouts, circuit breakers, failover and hedging.
+
+A chat turn prefers one model (Claude unless the caller asks for GPT) and
+can fall back to the other:
+- Every upstream call has a per-provider timeout.
+- Each provider has a circuit breaker. After `failure_threshold` failures in
+  a row it opens, and turns go straight to the other provider. After
+  `reset_seconds` one probe call is let through. If the probe succeeds the
+  breaker closes and traffic moves back to the preferred model.
+- With hedging on, a signed-in send that has not answered within the
+  preferred provider's recent p95 latency also asks the other provider. The
+  first answer wins and the slower call is cancelled. Guest turns are not
+  hedged, since a hedge spends a second upstream call.
+Streams fail over only before the first token. After that the client has
+already seen part of one model's answer. PoolSaturated (load shedding) is not
+a provider failure and is raised to the caller unchanged.
+
+Every attempt is recorded in metrics.LLM_SECONDS under its provider and
+outcome: ok, error, timeout, shed or cancelled. Successful calls also record
+their prompt size in metrics.LLM_PROMPT_TOKENS.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+import metrics
+from llm_pool import PRIMARY_MODEL, PRIORITY_USER, SECONDARY_MODEL, LlmClientPool, ModelSpec
+from worker_pool import PoolSaturated
+
+logger = logging.getLogger(__name__)
+
+BREAKER_CLOSED = "closed"
+BREAKER_HALF_OPEN = "half_open"
+BREAKER_OPEN = "open"
+BREAKER_STATES = (BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN)
+
+
+class LlmUnavailable(Exception):
+    """Every candidate provider failed or had its circuit open"""
+
+
+def describe(error: BaseException) -> str:
+    # Timeouts carry no message
+    return str(error) or type(error).__name__
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; half-open lets a single probe through at a time"""
+        if self.state == BREAKER_OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = BREAKER_HALF_OPEN
+        if self.state == BREAKER_HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        if self.state != BREAKER_OPEN:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == BREAKER_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != BREAKER_OPEN:
+                self.times_opened += 1
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+
+    def record_abandoned(self):
+        """The call ended without a verdict (cancelled or shed); free the probe for the next caller"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "retry_after_seconds": round(self.retry_after(), 3)
+        }
+
+
+class LatencyWindow:
+    """Recent successful send times for one provider, used to pick the hedge delay"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """None until min_samples calls have been seen"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LlmDispatcher:
+    def __init__(
+        self,
+        get_pool: Callable[[], LlmClientPool],
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 30.0,
+        failover: bool = True,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_default_delay: float = 2.0,
+        hedge_min_delay: float = 0.05
+    ):
+        # Resolved on each use so the pool can be swapped (e.g. in benchmarks)
+        self.get_pool = get_pool
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.failover = failover
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency: Dict[str, LatencyWindow] = {}
+        # (provider, event) -> count; events are failover, circuit_open, hedge and hedge_won
+        self.events: Counter = Counter()
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self.breakers:
+            self.breakers[provider] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+        return self.breakers[provider]
+
+    def _latency(self, provider: str) -> LatencyWindow:
+        if provider not in self.latency:
+            self.latency[provider] = LatencyWindow()
+        return self.latency[provider]
+
+    def timeout_for(self, provider: str) -> float:
+        return self.timeouts.get(provider, self.default_timeout)
+
+    def hedge_delay(self, provider: str) -> float:
+        observed = self._latency(provider).quantile(self.hedge_quantile)
+        if observed is None:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, observed)
+
+    def retry_after(self) -> float:
+        """Seconds until some provider may be tried again; 1 when none is waiting on its breaker"""
+        waits = [breaker.retry_after() for breaker in self.breakers.values() if breaker.state == BREAKER_OPEN]
+        return min(waits) if waits else 1.0
+
+    def _candidates(self, preferred: ModelSpec) -> List[ModelSpec]:
+        if not self.failover:
+            return [preferred]
+        return [preferred, SECONDARY_MODEL if preferred is PRIMARY_MODEL else PRIMARY_MODEL]
+
+    def _observe(self, spec: ModelSpec, mode: str, outcome: str, start: float):
+        metrics.observe_llm(spec.provider, spec.model, mode, outcome, time.perf_counter() - start)
+
+    def _observe_prompt(self, spec: ModelSpec, user_id: Optional[str], session_id: str):
+        tokens = self.get_pool().last_prompt_tokens(spec, user_id, session_id)
+        if tokens is not None:
+            metrics.LLM_PROMPT_TOKENS.observe(tokens, provider=spec.provider, model=spec.model)
+
+    def _admit(self, spec: ModelSpec, preferred: ModelSpec, user_id: Optional[str], session_id: str, event: str) -> bool:
+        """Check spec's breaker; when spec stands in for preferred, hand it the conversation so far"""
+        if not self.breaker(spec.provider).allow():
+            self.events[(spec.provider, "circuit_open")] += 1
+            return False
+        if spec is not preferred:
+            self.events[(spec.provider, event)] += 1
+            self.get_pool().sync_session(preferred, spec, user_id, session_id)
+        return True
+
+    async def _send_once(self, spec: ModelSpec, user_id: Optional[str], session_id: str, text: str, priority: int) -> str:
+        """One upstream send, already admitted by spec's breaker; records the outcome"""
+        breaker = self.breaker(spec.provider)
+        start = time.perf_counter()
+        try:
+            reply = await self.get_pool().send(spec, user_id, session_id, text, priority, timeout=self.timeout_for(spec.provider))
+        except PoolSaturated:
+            breaker.record_abandoned()
+            self._observe(spec, "send", "shed", start)
+            raise
+        except asyncio.CancelledError:
+            breaker.record_abandoned()
+            self._observe(spec, "send", "cancelled", start)
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            self._observe(spec, "send", "timeout" if isinstance(e, asyncio.TimeoutError) else "error", start)
+            raise
+        breaker.record_success()
+        self._latency(spec.provider).add(time.perf_counter() - start)
+        self._observe(spec, "send", "ok", start)
+        self._observe_prompt(spec, user_id, session_id)
+        return reply
+
+    async def _hedged_send(
+        self, preferred: ModelSpec, user_id: Optional[str], session_id: str, text: str, priority: int, tried: Set[str]
+    ) -> Tuple[str, ModelSpec]:
+        backup = self._candidates(preferred)[-1]
+        tasks = {asyncio.ensure_future(self._send_once(preferred, user_id, session_id, text, priority)): preferred}
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=self.hedge_delay(preferred.provider))
+            if done or backup is preferred or backup.provider in tried or not self._admit(backup, preferred, user_id, session_id, "hedge"):
+                return await next(iter(tasks)), preferred
+            tried.add(backup.provider)
+            tasks[asyncio.ensure_future(self._send_once(backup, user_id, session_id, text, priority))] = backup
+            pending = set(tasks)
+            errors: Dict[str, BaseException] = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    spec = tasks[task]
+                    if task.exception() is None:
+                        if spec is backup:
+                            self.events[(backup.provider, "hedge_won")] += 1
+                        return task.result(), spec
+                    errors[spec.provider] = task.exception()
+            # Both failed; the preferred provider's error is the one the caller reports
+            raise errors[preferred.provider]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def send(
+        self, preferred: ModelSpec, user_id: Optional[str], session_id: str, text: str, priority: int = PRIORITY_USER
+    ) -> Tuple[str, ModelSpec]:
+        """Answer from preferred or, failing that, the other model; returns (reply, model that answered).
+
+        Raises PoolSaturated when the call is shed and LlmUnavailable when no provider answered.
+        """
+        tried: Set[str] = set()
+        errors = []
+        for spec in self._candidates(preferred):
+            if spec.provider in tried or not self._admit(spec, preferred, user_id, session_id, "failover"):
+                continue
+            tried.add(spec.provider)
+            try:
+                if spec is preferred and self.hedge and self.failover and priority == PRIORITY_USER:
+                    reply, answered_by = await self._hedged_send(spec, user_id, session_id, text, priority, tried)
+                else:
+                    reply, answered_by = await self._send_once(spec, user_id, session_id, text, priority), spec
+            except PoolSaturated:
+                raise
+            except Exception as e:
+                logger.warning(f"LLM send to {spec.provider} failed: {describe(e)}")
+                errors.append(f"{spec.provider}: {describe(e)}")
+                continue
+            if answered_by is not preferred:
+                # Keep the preferred session whole for when traffic returns to it
+                self.get_pool().record_turn(preferred, user_id, session_id, text, reply)
+            return reply, answered_by
+        raise LlmUnavailable("; ".join(errors) or "every provider's circuit is open")
+
+    async def stream(
+        self, preferred: ModelSpec, user_id: Optional[str], session_id: str, text: str, priority: int = PRIORITY_USER
+    ) -> AsyncIterator[Tuple[ModelSpec, str]]:
+        """Yield (model answering, delta) pairs; fails over only until the first delta has been yielded.
+
+        Raises PoolSaturated when the call is shed, LlmUnavailable when no provider produced a first
+        token, and the upstream error when a stream breaks part way.
+        """
+        errors = []
+        for spec in self._candidates(preferred):
+            if not self._admit(spec, preferred, user_id, session_id, "failover"):
+                continue
+            breaker = self.breaker(spec.provider)
+            parts = []
+            start = time.perf_counter()
+            chunks = self.get_pool().stream(spec, user_id, session_id, text, priority, chunk_timeout=self.timeout_for(spec.provider))
+            try:
+                async for delta in chunks:
+                    if not parts:
+                        metrics.LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, provider=spec.provider, model=spec.model)
+                    parts.append(delta)
+                    yield spec, delta
+            except PoolSaturated:
+                breaker.record_abandoned()
+                self._observe(spec, "stream", "shed", start)
+                raise
+            except (asyncio.CancelledError, GeneratorExit):
+                # The client went away
+                breaker.record_abandoned()
+                self._observe(spec, "stream", "cancelled", start)
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                self._observe(spec, "stream", "timeout" if isinstance(e, asyncio.TimeoutError) else "error", start)
+                if parts:
+                    raise
+                logger.warning(f"LLM stream from {spec.provider} failed before the first token: {describe(e)}")
+                errors.append(f"{spec.provider}: {describe(e)}")
+                continue
+            finally:
+                # Release the slot now rather than whenever the generator is collected
+                await chunks.aclose()
+            breaker.record_success()
+            self._observe(spec, "stream", "ok", start)
+            self._observe_prompt(spec, user_id, session_id)
+            if spec is not preferred:
+                self.get_pool().record_turn(preferred, user_id, session_id, text, "".join(parts))
+            return
+        raise LlmUnavailable("; ".join(errors) or "every provider's circuit is open")
+
+    def stats(self) -> Dict[str, Any]:
+        providers = sorted(set(self.breakers) | {provider for provider, _ in self.events})
+        return {
+            "failover": self.failover,
+            "hedge": self.hedge,
+            "providers": {
+                provider: {
+                    **self.breaker(provider).stats(),
+                    "timeout_seconds": self.timeout_for(provider),
+                    "hedge_delay_seconds": round(self.hedge_delay(provider), 4),
+                    "events": {event: count for (name, event), count in self.events.items() if name == provider}
+                }
+                for provider in providers
+            }
+        }
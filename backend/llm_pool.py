@@ -0,0 +1,460 @@
+"""Long-lived LLM chat clients shared across requests.
+
+Chat objects are kept per (provider, model, user, session) so a conversation
+reuses its client and connection instead of being rebuilt on every message.
+Sessions belong to the user who sent them (GUEST_USER for anonymous chat), so
+a session id sent by someone else never reaches another user's history. Each
+upstream provider gets its own pool of concurrency slots:
+- When the pool is saturated, free slots go to signed-in users (PRIORITY_USER)
+  before guests (PRIORITY_GUEST).
+- Guests can be capped to a share of the slots.
+- A bounded guest queue sheds excess guest calls with PoolSaturated.
+Every chat keeps its session's history as OpenAI-style messages. With a
+ContextManager, each prompt is held to a token budget, and older turns are
+folded into a running summary in the background after a turn. Setting a base
+URL swaps the
+Emergent client for a plain OpenAI-compatible HTTP client, which is how the
+pool is pointed at a local stub server for latency testing. Per-provider
+base URLs give each provider its own upstream, for example one
+fault-injecting stub per provider.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import httpx
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+from chat_context import ContextManager, render_system_prompt
+from worker_pool import PoolSaturated
+
+CLAUDE_SYSTEM_PROMPT = """You are an expert mortgage advisor AI assistant. Your role is to help users understand mortgages, 
+                calculate pre-qualifications, explain loan types, and guide them through the application process. 
+                
+                Be clear, empathetic, and transparent. When making recommendations, always explain your reasoning.
+                If you detect stress or confusion, adjust your tone to be more supportive.
+                
+                Available intents: getQuote, preQual, startApplication, uploadDoc, explainTerm, requestHuman.
+                
+                Always provide practical, actionable advice and be ready to explain complex financial concepts in simple terms."""
+
+GPT_SYSTEM_PROMPT = """You are a friendly mortgage assistant helping users with their home loan journey. 
+                Be conversational, warm, and helpful. Guide users through the mortgage process with clarity and empathy."""
+
+
+class ModelSpec:
+    def __init__(self, provider: str, model: str, label: str, system_message: str):
+        self.provider = provider
+        self.model = model
+        self.label = label
+        self.system_message = system_message
+
+
+# Claude Sonnet for reasoning and explainability, GPT-5 for the conversational interface
+PRIMARY_MODEL = ModelSpec("anthropic", "claude-3-7-sonnet-20250219", "claude-sonnet-4", CLAUDE_SYSTEM_PROMPT)
+SECONDARY_MODEL = ModelSpec("openai", "gpt-5", "gpt-5", GPT_SYSTEM_PROMPT)
+
+# Owner of anonymous sessions; signed-in users are keyed by their id, a UUID, so never collide with it
+GUEST_USER = "guest"
+
+
+def model_for(use_primary: bool) -> ModelSpec:
+    return PRIMARY_MODEL if use_primary else SECONDARY_MODEL
+
+
+# Lower is served first
+PRIORITY_USER = 0
+PRIORITY_GUEST = 1
+
+
+class PrioritySlots:
+    """Counting semaphore that hands free slots to the most urgent waiter, FIFO within a priority.
+
+    class_caps limits how many slots one priority may hold at once, and
+    max_waiting bounds its queue: callers past it get PoolSaturated instead of waiting.
+    """
+
+    def __init__(self, capacity: int, class_caps: Optional[Dict[int, int]] = None, max_waiting: Optional[Dict[int, int]] = None):
+        self.capacity = capacity
+        self.class_caps = class_caps or {}
+        self.max_waiting = max_waiting or {}
+        self.in_use = 0
+        self._held: Dict[int, int] = {}
+        self._waiting: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self.rejected = 0
+
+    def _can_grant(self, priority: int) -> bool:
+        cap = self.class_caps.get(priority)
+        return self.in_use < self.capacity and (cap is None or self._held.get(priority, 0) < cap)
+
+    def _grant(self, priority: int):
+        self.in_use += 1
+        self._held[priority] = self._held.get(priority, 0) + 1
+
+    async def acquire(self, priority: int):
+        # Releases grant to waiters eagerly, so anyone still queued could not take this slot
+        if self._can_grant(priority):
+            self._grant(priority)
+            return
+        limit = self.max_waiting.get(priority)
+        if limit is not None and self.waiting(priority) >= limit:
+            self.rejected += 1
+            raise PoolSaturated(f"{self.waiting(priority)} calls already waiting at priority {priority}")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._order), future))
+        self._waiting[priority] = self._waiting.get(priority, 0) + 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled; pass the slot on
+                self.release(priority)
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._waiting[priority] -= 1
+
+    def waiting(self, priority: int) -> int:
+        return self._waiting.get(priority, 0)
+
+    def would_shed(self, priority: int) -> bool:
+        limit = self.max_waiting.get(priority)
+        return limit is not None and not self._can_grant(priority) and self.waiting(priority) >= limit
+
+    def release(self, priority: int):
+        self.in_use -= 1
+        self._held[priority] -= 1
+        self._wake()
+
+    def _wake(self):
+        skipped = []
+        while self._heap and self.in_use < self.capacity:
+            priority, order, future = heapq.heappop(self._heap)
+            if future.done():
+                continue
+            if not self._can_grant(priority):
+                # Class is at its cap; let a lower priority use the slot meanwhile
+                skipped.append((priority, order, future))
+                continue
+            self._grant(priority)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "held": dict(self._held),
+            "waiting": {priority: count for priority, count in self._waiting.items() if count},
+            "rejected": self.rejected
+        }
+
+
+class ManagedChat:
+    """One session's history as OpenAI-style messages, with prompts built by an optional ContextManager.
+
+    A turn joins the history only once answered, so a failed, timed-out or cancelled call leaves no trace.
+    """
+
+    def __init__(self, system_message: str, context: Optional[ContextManager] = None):
+        self.context = context
+        self.messages: List[Dict[str, str]] = [{"role": "system", "content": system_message}]
+        self.last_prompt_tokens: Optional[int] = None
+
+    def _prompt(self, turn: Dict[str, str]) -> List[Dict[str, str]]:
+        if self.context is None:
+            return [*self.messages, turn]
+        prompt, self.last_prompt_tokens = self.context.prompt(self.messages, turn)
+        return prompt
+
+
+class HttpChat(ManagedChat):
+    """Minimal OpenAI-compatible chat client"""
+
+    def __init__(self, http: httpx.AsyncClient, model: str, system_message: str, context: Optional[ContextManager] = None):
+        super().__init__(system_message, context)
+        self._http = http
+        self.model = model
+
+    async def send_message(self, user_message: UserMessage) -> str:
+        turn = {"role": "user", "content": user_message.text}
+        response = await self._http.post("/v1/chat/completions", json={"model": self.model, "messages": self._prompt(turn)})
+        response.raise_for_status()
+        body = response.json()
+        content = body["choices"][0]["message"]["content"]
+        # Prefer the upstream's own count when it reports one
+        usage = body.get("usage") or {}
+        if "prompt_tokens" in usage:
+            self.last_prompt_tokens = usage["prompt_tokens"]
+        self.messages.extend([turn, {"role": "assistant", "content": content}])
+        return content
+
+    async def stream_message(self, user_message: UserMessage) -> AsyncIterator[str]:
+        """Yield completion deltas as the server sends them"""
+        turn = {"role": "user", "content": user_message.text}
+        payload = {"model": self.model, "messages": self._prompt(turn), "stream": True}
+        parts = []
+        async with self._http.stream("POST", "/v1/chat/completions", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        self.messages.extend([turn, {"role": "assistant", "content": "".join(parts)}])
+
+
+class EmergentChat(ManagedChat):
+    """Emergent LlmChat driven from the history kept here.
+
+    LlmChat keeps its own copy of the conversation and cannot edit it. While each prompt is
+    that copy plus the new message, the client is reused. Once the prompt differs (turns
+    trimmed, a summary folded in, a failover sync), a fresh LlmChat starts with the prompt
+    flattened into its system message.
+
+    LlmChat has no streaming API, so there is no stream_message here: streamed replies from
+    this client arrive as a single chunk once the whole answer is in (counted as unstreamed).
+    Only HttpChat, the OpenAI-compatible path, streams token by token.
+    """
+
+    def __init__(self, api_key: Optional[str], session_id: str, spec: "ModelSpec", context: Optional[ContextManager] = None):
+        super().__init__(spec.system_message, context)
+        self._api_key = api_key
+        self._session_id = session_id
+        self._spec = spec
+        self._client = None
+        self._client_history: List[Dict[str, str]] = []
+        self.generation = 0
+
+    async def send_message(self, user_message: UserMessage) -> str:
+        turn = {"role": "user", "content": user_message.text}
+        history = self._prompt(turn)[:-1]
+        if self._client is None or history != self._client_history:
+            self.generation += 1
+            self._client = LlmChat(
+                api_key=self._api_key,
+                # A new id per generation so no history stored upstream under the old one carries over
+                session_id=f"{self._session_id}:{self.generation}",
+                system_message=render_system_prompt(history)
+            ).with_model(self._spec.provider, self._spec.model)
+            self._client_history = history
+        try:
+            content = await self._client.send_message(user_message)
+        except BaseException:
+            # The client may have kept the unanswered message; start over next time
+            self._client = None
+            raise
+        reply = {"role": "assistant", "content": content}
+        self._client_history = [*history, turn, reply]
+        self.messages.extend([turn, reply])
+        return content
+
+
+class LlmClientPool:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        max_sessions: int = 1000,
+        provider_concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = 16,
+        base_url: Optional[str] = None,
+        keepalive_connections: int = 32,
+        provider_base_urls: Optional[Dict[str, str]] = None,
+        guest_max_share: float = 1.0,
+        guest_max_queue: Optional[int] = None,
+        context: Optional[ContextManager] = None
+    ):
+        self.api_key = api_key
+        self.max_sessions = max_sessions
+        self.base_url = base_url
+        self.provider_base_urls = {provider: url for provider, url in (provider_base_urls or {}).items() if url}
+        self._provider_concurrency = provider_concurrency or {}
+        self._default_concurrency = default_concurrency
+        self._keepalive_connections = keepalive_connections
+        self.guest_max_share = guest_max_share
+        self.guest_max_queue = guest_max_queue
+        self.context = context
+        self._compactions: Set[asyncio.Task] = set()
+        self._chats: "OrderedDict[Tuple[str, str, str, str], Any]" = OrderedDict()
+        self._limits: Dict[str, PrioritySlots] = {}
+        self._http: Dict[str, httpx.AsyncClient] = {}
+        self.created = 0
+        self.reused = 0
+        self.unstreamed = 0
+
+    def _base_url(self, provider: str) -> Optional[str]:
+        return self.provider_base_urls.get(provider, self.base_url)
+
+    def _http_client(self, base_url: str) -> httpx.AsyncClient:
+        if base_url not in self._http:
+            self._http[base_url] = httpx.AsyncClient(
+                base_url=base_url,
+                timeout=httpx.Timeout(60.0),
+                limits=httpx.Limits(
+                    max_connections=self._keepalive_connections,
+                    max_keepalive_connections=self._keepalive_connections
+                ),
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+            )
+        return self._http[base_url]
+
+    def _key(self, spec: ModelSpec, user_id: Optional[str], session_id: str) -> Tuple[str, str, str, str]:
+        return (spec.provider, spec.model, user_id or GUEST_USER, session_id)
+
+    def _build_chat(self, spec: ModelSpec, owner: str, session_id: str):
+        base_url = self._base_url(spec.provider)
+        if base_url:
+            return HttpChat(self._http_client(base_url), spec.model, spec.system_message, self.context)
+        # Upstream may keep history by session id too, so scope it to the owner there as well
+        return EmergentChat(self.api_key, f"{owner}:{session_id}", spec, self.context)
+
+    def get_chat(self, spec: ModelSpec, user_id: Optional[str], session_id: str):
+        key = self._key(spec, user_id, session_id)
+        chat = self._chats.get(key)
+        if chat is not None:
+            self._chats.move_to_end(key)
+            self.reused += 1
+            return chat
+        chat = self._build_chat(spec, key[2], session_id)
+        self._chats[key] = chat
+        self.created += 1
+        while len(self._chats) > self.max_sessions:
+            self._chats.popitem(last=False)
+        return chat
+
+    def has_session(self, spec: ModelSpec, user_id: Optional[str], session_id: str) -> bool:
+        return self._key(spec, user_id, session_id) in self._chats
+
+    def drop_session(self, user_id: Optional[str], session_id: str):
+        """Forget every provider's chat for a session, e.g. a one-off internal call"""
+        owner = user_id or GUEST_USER
+        for key in [key for key in self._chats if key[2:] == (owner, session_id)]:
+            del self._chats[key]
+
+    def last_prompt_tokens(self, spec: ModelSpec, user_id: Optional[str], session_id: str) -> Optional[int]:
+        """Prompt tokens of the session's latest call to spec, when known"""
+        chat = self._chats.get(self._key(spec, user_id, session_id))
+        return getattr(chat, "last_prompt_tokens", None)
+
+    def record_turn(self, spec: ModelSpec, user_id: Optional[str], session_id: str, text: str, reply: str):
+        """Add a turn answered elsewhere (e.g. from cache) to the session's history"""
+        chat = self.get_chat(spec, user_id, session_id)
+        if isinstance(chat, ManagedChat):
+            chat.messages.append({"role": "user", "content": text})
+            chat.messages.append({"role": "assistant", "content": reply})
+
+    def sync_session(self, source: ModelSpec, target: ModelSpec, user_id: Optional[str], session_id: str):
+        """Give target's session the conversation so far from source's, e.g. before failing over to it"""
+        if not self.has_session(source, user_id, session_id):
+            return
+        source_chat = self.get_chat(source, user_id, session_id)
+        target_chat = self.get_chat(target, user_id, session_id)
+        if isinstance(source_chat, ManagedChat) and isinstance(target_chat, ManagedChat):
+            # Keep target's own system prompt
+            target_chat.messages[1:] = source_chat.messages[1:]
+
+    def _after_turn(self, chat):
+        """Summarize older turns in the background once the session outgrows its window"""
+        if self.context is None or not isinstance(chat, ManagedChat) or not self.context.needs_compaction(chat.messages):
+            return
+        task = asyncio.ensure_future(self.context.compact(chat.messages))
+        self._compactions.add(task)
+        task.add_done_callback(self._compactions.discard)
+
+    def _limit(self, provider: str) -> PrioritySlots:
+        if provider not in self._limits:
+            capacity = self._provider_concurrency.get(provider, self._default_concurrency)
+            # Guests always get at least one slot so guest chat cannot starve entirely
+            guest_cap = max(1, int(capacity * self.guest_max_share))
+            max_waiting = {PRIORITY_GUEST: self.guest_max_queue} if self.guest_max_queue is not None else None
+            self._limits[provider] = PrioritySlots(capacity, {PRIORITY_GUEST: guest_cap}, max_waiting)
+        return self._limits[provider]
+
+    def queue_full(self, provider: str, priority: int) -> bool:
+        """True when a call at this priority would be shed rather than queued"""
+        return self._limit(provider).would_shed(priority)
+
+    @asynccontextmanager
+    async def slot(self, provider: str, priority: int = PRIORITY_USER):
+        """Hold one of the provider's concurrency slots; raises PoolSaturated when the priority's queue is full"""
+        slots = self._limit(provider)
+        await slots.acquire(priority)
+        try:
+            yield
+        finally:
+            slots.release(priority)
+
+    # Timeouts start once a slot is held, so time spent queueing behind other calls does not count against the upstream
+
+    async def send(
+        self, spec: ModelSpec, user_id: Optional[str], session_id: str, text: str, priority: int = PRIORITY_USER, timeout: Optional[float] = None
+    ) -> str:
+        """Raises asyncio.TimeoutError when the reply takes longer than timeout seconds"""
+        async with self.slot(spec.provider, priority):
+            chat = self.get_chat(spec, user_id, session_id)
+            reply = await asyncio.wait_for(chat.send_message(UserMessage(text=text)), timeout)
+        self._after_turn(chat)
+        return reply
+
+    async def stream(
+        self, spec: ModelSpec, user_id: Optional[str], session_id: str, text: str, priority: int = PRIORITY_USER,
+        chunk_timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Yield response text incrementally; clients without streaming yield one chunk.
+
+        Raises asyncio.TimeoutError when any chunk, the first included, takes longer than chunk_timeout seconds.
+        """
+        async with self.slot(spec.provider, priority):
+            chat = self.get_chat(spec, user_id, session_id)
+            if not hasattr(chat, "stream_message"):
+                # Whole reply as one chunk, so time to first token is the full response time
+                self.unstreamed += 1
+                yield await asyncio.wait_for(chat.send_message(UserMessage(text=text)), chunk_timeout)
+                self._after_turn(chat)
+                return
+            chunks = chat.stream_message(UserMessage(text=text))
+            try:
+                while True:
+                    try:
+                        delta = await asyncio.wait_for(chunks.__anext__(), chunk_timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield delta
+            finally:
+                await chunks.aclose()
+        self._after_turn(chat)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._chats),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "reused": self.reused,
+            "unstreamed": self.unstreamed,
+            "in_flight": {provider: slots.in_use for provider, slots in self._limits.items()},
+            "slots": {provider: slots.stats() for provider, slots in self._limits.items()},
+            "mode": "http" if self.base_url or self.provider_base_urls else "emergent",
+            "context": self.context.stats() if self.context is not None else None
+        }
+
+    async def aclose(self):
+        for task in list(self._compactions):
+            task.cancel()
+        await asyncio.gather(*self._compactions, return_exceptions=True)
+        self._chats.clear()
+        for http in self._http.values():
+            await http.aclose()
+        self._http.clear()
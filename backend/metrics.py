@@ -0,0 +1,229 @@
+"""Request timing, named spans and a Prometheus text-format exposition.
+
+Histograms live in process memory. Every request is timed by
+RequestTimingMiddleware. Code paths wrap their hot sections in span() or
+@timed, and Mongo commands are timed through pymongo's command monitoring
+(MongoCommandMetrics). render() produces the text served at /metrics.
+Collector callbacks report values that already live elsewhere, like queue
+depths and cache hit counts, at scrape time.
+"""
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+# Seconds; spans range from microsecond cache hits to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then +Inf, sum
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, le)} {cumulative:g}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, le)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {cumulative:g}")
+        return lines
+
+
+class Collector:
+    """Gauge or counter read from a callback at scrape time; collect() yields (labels, value)"""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, label_names: Sequence[str], collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = tuple(label_names)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in self.collect():
+            key = tuple(str(labels.get(name, "")) for name in self.label_names)
+            lines.append(f"{self.name}{_label_text(self.label_names, key)} {float(value):g}")
+        return lines
+
+
+_registry: List[Any] = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ("method", "route", "status")
+))
+SPAN_SECONDS = register(Histogram(
+    "span_duration_seconds", "Time spent in named hot-path sections",
+    ("span", "cache")
+))
+LLM_SECONDS = register(Histogram(
+    "llm_request_duration_seconds", "Upstream LLM call time, to the last token for streams",
+    ("provider", "model", "mode", "outcome")
+))
+LLM_FIRST_TOKEN_SECONDS = register(Histogram(
+    "llm_time_to_first_token_seconds", "Upstream LLM time to the first streamed token",
+    ("provider", "model")
+))
+# Prompt sizes run from a bare system prompt to a full context window
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+LLM_PROMPT_TOKENS = register(Histogram(
+    "llm_prompt_tokens", "Prompt tokens per upstream LLM call, as counted or estimated for the context budget",
+    ("provider", "model"), buckets=TOKEN_BUCKETS
+))
+MONGO_SECONDS = register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round trip as reported by the driver",
+    ("collection", "command", "outcome")
+))
+
+
+@contextmanager
+def span(name: str, cache: str = ""):
+    """Time a block into span_duration_seconds; set labels["cache"] inside to record a hit or miss"""
+    labels = {"cache": cache}
+    start = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - start, span=name, cache=labels["cache"])
+
+
+def timed(name: str):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware timing each HTTP request, labelled by route template rather than raw path"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", None) or "unmatched",
+                status=str(status_code[0])
+            )
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo listener timing every command; pass to the client via event_listeners"""
+
+    # Driver housekeeping rather than application queries
+    IGNORED_COMMANDS = frozenset({"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"})
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else "", event.command_name
+            )
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            entry = self._pending.pop((event.connection_id, event.request_id), None)
+        if entry is not None:
+            MONGO_SECONDS.observe(event.duration_micros / 1e6, collection=entry[0], command=entry[1], outcome=outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+def observe_llm(provider: str, model: str, mode: str, outcome: str, seconds: float):
+    LLM_SECONDS.observe(seconds, provider=provider, model=model, mode=mode, outcome=outcome)
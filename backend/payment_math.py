@@ -0,0 +1,80 @@
+"""Shared mortgage payment math.
+
+Every payment and affordability calculation goes through the annuity factor
+for a (rate, term) pair. Rates come from a small grid of tiers, so factors are
+precomputed for that grid and memoized in a bounded cache for anything else.
+"""
+import os
+from functools import lru_cache
+from typing import Iterable
+
+import numpy as np
+
+ANNUITY_CACHE_SIZE = int(os.environ.get('ANNUITY_CACHE_SIZE', 1024))
+
+# Term lengths in months offered by the catalog
+STANDARD_TERMS = (360, 180)
+
+# Pre-qualification base rates by credit score tier, and LTV bumps
+BASE_RATE_TIERS = (5.75, 6.0, 6.25, 6.5)
+LTV_RATE_BUMPS = (0.0, 0.25, 0.5)
+
+
+def _rate_key(annual_rate: float) -> float:
+    # Normalize float noise so 6.0 + 0.25 and 6.25 share a cache slot
+    return round(float(annual_rate), 6)
+
+
+@lru_cache(maxsize=ANNUITY_CACHE_SIZE)
+def _annuity_factor(annual_rate: float, term: int) -> float:
+    monthly_rate = annual_rate / 100 / 12
+    if monthly_rate > 0:
+        growth = (1 + monthly_rate) ** term
+        return monthly_rate * growth / (growth - 1)
+    return 1 / term
+
+
+def annuity_factor(annual_rate: float, term: int = 360) -> float:
+    """Monthly payment per unit of principal for an annual rate (in percent) and term (in months)"""
+    return _annuity_factor(_rate_key(annual_rate), int(term))
+
+
+def monthly_payment(principal: float, annual_rate: float, term: int = 360) -> float:
+    """Level monthly payment for a fully amortizing loan"""
+    return principal * annuity_factor(annual_rate, term)
+
+
+def max_principal(payment: float, annual_rate: float, term: int = 360) -> float:
+    """Largest principal a monthly payment can service"""
+    return payment / annuity_factor(annual_rate, term)
+
+
+def annuity_factors(annual_rates: np.ndarray, terms=360) -> np.ndarray:
+    """Vectorized annuity_factor; terms is one term or an array matching annual_rates.
+
+    Each distinct (rate, term) pair is looked up once.
+    """
+    rates = np.round(np.asarray(annual_rates, dtype=np.float64), 6)
+    term_array = np.broadcast_to(np.asarray(terms, dtype=np.int64), rates.shape)
+    pairs = np.stack([rates.ravel(), term_array.ravel().astype(np.float64)], axis=1)
+    unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    table = np.array([annuity_factor(rate, int(term)) for rate, term in unique_pairs.tolist()], dtype=np.float64)
+    return table[inverse.ravel()].reshape(rates.shape)
+
+
+def warm_cache(rates: Iterable[float] = (), terms: Iterable[int] = STANDARD_TERMS) -> int:
+    """Precompute factors for the pre-qualification rate grid plus any extra rates"""
+    grid = {base + bump for base in BASE_RATE_TIERS for bump in LTV_RATE_BUMPS}
+    grid.update(rates)
+    terms = tuple(terms)
+    for rate in grid:
+        for term in terms:
+            annuity_factor(rate, term)
+    return len(grid) * len(terms)
+
+
+def cache_info():
+    return _annuity_factor.cache_info()
+
+
+warm_cache()
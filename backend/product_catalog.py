@@ -0,0 +1,207 @@
+"""Mortgage product catalog backed by the mortgage_products collection.
+
+The catalog is served from an in-memory snapshot that holds the products,
+their pre-serialized JSON body and its ETag. The snapshot is rebuilt after
+PRODUCT_CATALOG_TTL_SECONDS, or right away when a change stream reports a write
+(change streams need a replica set; without one the TTL alone applies).
+With a shared cache backend, the serialized catalog is stored there too.
+Worker processes then load it from one place and serve the same body and ETag.
+A change-stream invalidation in any worker reaches all of them.
+"""
+import asyncio
+import hashlib
+import itertools
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from serialization import dumps, loads, to_document
+from shared_cache import LocalCacheBackend
+
+logger = logging.getLogger(__name__)
+
+# Shared cache namespace and key for the serialized catalog
+SNAPSHOT_NAMESPACE = "products"
+SNAPSHOT_KEY = "snapshot"
+DUPLICATE_KEY = 11000
+
+_PRODUCT_NAMESPACE = uuid.UUID("6f1c7b1e-4b0a-4c47-9a53-0d2f3c0c5e11")
+
+
+def stable_product_id(lender_name: str, loan_type: str, term: int) -> str:
+    return str(uuid.uuid5(_PRODUCT_NAMESPACE, f"{lender_name}|{loan_type}|{term}"))
+
+
+# Launch catalog, inserted when the collection is empty
+SEED_PRODUCTS: List[Dict[str, Any]] = [
+    {
+        "lender_name": "Prime Lending",
+        "loan_type": "fixed",
+        "rate": 5.75,
+        "apr": 5.95,
+        "term": 360,
+        "fees": 2500,
+        "min_credit_score": 700,
+        "min_down_payment": 0.20,
+        "max_loan_amount": 1000000,
+        "features": ["No prepayment penalty", "Rate lock for 60 days", "Free appraisal"]
+    },
+    {
+        "lender_name": "Community Bank",
+        "loan_type": "fixed",
+        "rate": 6.00,
+        "apr": 6.15,
+        "term": 360,
+        "fees": 1800,
+        "min_credit_score": 680,
+        "min_down_payment": 0.15,
+        "max_loan_amount": 750000,
+        "features": ["Low closing costs", "First-time buyer programs", "Flexible documentation"]
+    },
+    {
+        "lender_name": "Digital Mortgage Co",
+        "loan_type": "variable",
+        "rate": 5.25,
+        "apr": 5.60,
+        "term": 360,
+        "fees": 2000,
+        "min_credit_score": 720,
+        "min_down_payment": 0.20,
+        "max_loan_amount": 1500000,
+        "features": ["Fully digital process", "Fast approval", "Mobile app included"]
+    },
+    {
+        "lender_name": "First Home Finance",
+        "loan_type": "fixed",
+        "rate": 6.25,
+        "apr": 6.40,
+        "term": 180,
+        "fees": 1500,
+        "min_credit_score": 660,
+        "min_down_payment": 0.10,
+        "max_loan_amount": 500000,
+        "features": ["15-year term", "Lower total interest", "Faster equity building"]
+    }
+]
+
+
+class CatalogSnapshot:
+    def __init__(self, products: List[Dict[str, Any]], version: int):
+        self.products = products
+        self.body = dumps(products)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+
+class ProductCatalog:
+    def __init__(self, get_collection: Callable[[], Any], model, ttl_seconds: float = 300, backend=None):
+        # Resolved on each use so the database handle can be swapped (e.g. in benchmarks)
+        self._get_collection = get_collection
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # Never reset, so a snapshot loaded after invalidate() still gets a new version
+        self._versions = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+        self.backend = backend or LocalCacheBackend()
+        self.backend.subscribe(SNAPSHOT_NAMESPACE, lambda key: self.invalidate())
+        self.refreshes = 0
+        self.shared_loads = 0
+
+    @property
+    def collection(self):
+        return self._get_collection()
+
+    async def seed(self):
+        """Insert the launch catalog when the collection is empty.
+
+        Every worker process seeds at startup. Upserts keyed on the product id
+        (unique in db_indexes) make concurrent seeds insert each product once.
+        """
+        if await self.collection.count_documents({}, limit=1):
+            return
+        ops = []
+        for product in SEED_PRODUCTS:
+            item = self.model(id=stable_product_id(product["lender_name"], product["loan_type"], product["term"]), **product)
+            ops.append(UpdateOne({"id": item.id}, {"$setOnInsert": to_document(item)}, upsert=True))
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Racing upserts of a new id: the loser hits the unique index after the winner inserted it
+            errors = e.details.get("writeErrors", [])
+            if e.details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in errors):
+                raise
+
+    async def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl_seconds:
+            return snapshot
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.loaded_at >= self.ttl_seconds:
+                snapshot = await self._load()
+            return snapshot
+
+    async def _load(self) -> CatalogSnapshot:
+        version = next(self._versions)
+        raw = await self.backend.get(SNAPSHOT_NAMESPACE, SNAPSHOT_KEY) if self.backend.shared else None
+        if raw is not None:
+            self._snapshot = CatalogSnapshot(loads(raw), version)
+            self.shared_loads += 1
+        else:
+            docs = await self.collection.find({}, {"_id": 0}).sort("_id", 1).to_list(None)
+            products = [to_document(self.model(**doc)) for doc in docs]
+            self._snapshot = CatalogSnapshot(products, version)
+            if self.backend.shared:
+                await self.backend.set(SNAPSHOT_NAMESPACE, SNAPSHOT_KEY, self._snapshot.body, self.ttl_seconds)
+        self.refreshes += 1
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def start_watching(self):
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        try:
+            async with self.collection.watch() as stream:
+                async for _ in stream:
+                    self.invalidate()
+                    if self.backend.shared:
+                        await self.backend.delete(SNAPSHOT_NAMESPACE, SNAPSHOT_KEY)
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.info(f"Product change stream unavailable, relying on TTL refresh: {str(e)}")
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self._snapshot.products) if self._snapshot else None,
+            "version": self._snapshot.version if self._snapshot else None,
+            "etag": self._snapshot.etag if self._snapshot else None,
+            "refreshes": self.refreshes,
+            "shared_loads": self.shared_loads,
+            "watching": self._watch_task is not None and not self._watch_task.done()
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
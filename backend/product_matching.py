@@ -0,0 +1,75 @@
+"""In-memory eligibility index for matching products to a borrower.
+
+Products are held as NumPy columns sorted by min_credit_score, so the
+credit filter is a binary search for a prefix, and the loan amount and down
+payment checks are vectorized masks over that prefix. Eligible products are
+ranked by monthly payment or total cost.
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+
+import payment_math
+
+RANK_KEYS = ("monthly_payment", "total_cost")
+
+
+class ProductIndex:
+    def __init__(self, products: List[Dict[str, Any]], version: int = 0):
+        self.version = version
+        order = sorted(range(len(products)), key=lambda i: products[i]["min_credit_score"])
+        self.products = [products[i] for i in order]
+        self.min_credit = np.array([p["min_credit_score"] for p in self.products], dtype=np.int64)
+        self.max_loan = np.array([p["max_loan_amount"] for p in self.products], dtype=np.float64)
+        self.min_down = np.array([p["min_down_payment"] for p in self.products], dtype=np.float64)
+        self.rate = np.array([p["rate"] for p in self.products], dtype=np.float64)
+        self.term = np.array([p["term"] for p in self.products], dtype=np.int64)
+        self.fees = np.array([p["fees"] for p in self.products], dtype=np.float64)
+        # Payment per dollar borrowed depends only on the product, so it is computed once here
+        self.factor = payment_math.annuity_factors(self.rate, self.term)
+
+    def eligible(self, credit_score: int, loan_amount: float, down_payment_fraction: float) -> np.ndarray:
+        """Positions of products the borrower qualifies for"""
+        # Products needing at most this score form a prefix of the sorted array
+        end = int(np.searchsorted(self.min_credit, credit_score, side="right"))
+        mask = (self.max_loan[:end] >= loan_amount) & (self.min_down[:end] <= down_payment_fraction + 1e-9)
+        return np.flatnonzero(mask)
+
+    def match(
+        self,
+        credit_score: int,
+        loan_amount: float,
+        down_payment: float,
+        rank_by: str = "monthly_payment",
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        property_value = loan_amount + down_payment
+        down_fraction = down_payment / property_value if property_value > 0 else 0.0
+        positions = self.eligible(credit_score, loan_amount, down_fraction)
+        if positions.size == 0:
+            return {"eligible_count": 0, "products": []}
+
+        terms = self.term[positions]
+        monthly_payment = loan_amount * self.factor[positions]
+        total_cost = monthly_payment * terms + self.fees[positions]
+        primary, secondary = (monthly_payment, total_cost) if rank_by == "monthly_payment" else (total_cost, monthly_payment)
+        # Partition down to the top candidates before fully sorting them
+        if positions.size > limit:
+            candidates = np.argpartition(primary, limit - 1)[:limit]
+            cutoff = primary[candidates].max()
+            candidates = np.flatnonzero(primary <= cutoff)  # keep ties at the cutoff for the secondary key
+        else:
+            candidates = np.arange(positions.size)
+        # lexsort sorts by the last key first
+        order = candidates[np.lexsort((secondary[candidates], primary[candidates]))][:limit]
+
+        matches = []
+        for i in order.tolist():
+            product = self.products[int(positions[i])]
+            matches.append({
+                **product,
+                "monthly_payment": round(float(monthly_payment[i]), 2),
+                "total_cost": round(float(total_cost[i]), 2),
+                "total_interest": round(float(monthly_payment[i] * terms[i] - loan_amount), 2)
+            })
+        return {"eligible_count": int(positions.size), "products": matches}
@@ -0,0 +1,147 @@
+"""Token-bucket rate limiting keyed by user id or client IP.
+
+Each key gets a bucket holding up to `burst` tokens that refills at `rate`
+tokens per second. A request spends one token and is refused when the bucket
+is empty, with a retry-after of the time until a token is back. Buckets live
+in a pluggable store:
+- LocalBucketStore keeps them in process memory, so each worker enforces the
+  budget on its own.
+- RedisBucketStore applies the same update atomically in Redis with a Lua
+  script, so all workers share one budget per key.
+Store errors fail open (the request is allowed) and are counted.
+"""
+import logging
+import math
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_STORES = ("local", "redis")
+
+# KEYS[1] = bucket; ARGV = rate per second, burst, cost. Returns {allowed, tokens left as a string}
+# (Lua numbers are truncated to integers on return). Uses the server clock so workers on
+# different hosts agree on refill time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+def refill(tokens: float, elapsed: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, elapsed) * rate)
+
+
+class LocalBucketStore:
+    """Buckets in process memory; an idle bucket expires once it would have refilled anyway"""
+    name = "local"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, TTLCache] = {}
+
+    def _table(self, limiter: str, rate: float, burst: float) -> TTLCache:
+        table = self._buckets.get(limiter)
+        if table is None:
+            table = self._buckets[limiter] = TTLCache(maxsize=self.max_keys, ttl=burst / rate)
+        return table
+
+    async def take(self, limiter: str, key: str, rate: float, burst: float, cost: float) -> Tuple[bool, float]:
+        table = self._table(limiter, rate, burst)
+        now = time.monotonic()
+        tokens, ts = table.get(key, (burst, now))
+        tokens = refill(tokens, now - ts, rate, burst)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        table[key] = (tokens, now)
+        return allowed, tokens
+
+    async def close(self):
+        pass
+
+
+class RedisBucketStore:
+    """Buckets in Redis under "<prefix>:ratelimit:<limiter>:<key>", shared by every worker"""
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str):
+        import redis.asyncio as aioredis
+
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, limiter: str, key: str, rate: float, burst: float, cost: float) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[f"{self.prefix}:ratelimit:{limiter}:{key}"], args=[rate, burst, cost])
+        return bool(int(allowed)), float(tokens)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def make_store(kind: str, redis_url: str, prefix: str):
+    if kind not in RATE_LIMIT_STORES:
+        raise ValueError(f"RATE_LIMIT_STORE must be one of {RATE_LIMIT_STORES}, got {kind!r}")
+    if kind == "redis":
+        return RedisBucketStore(redis_url, prefix)
+    return LocalBucketStore()
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, per_minute: float, burst: int, store):
+        if per_minute <= 0 or burst < 1:
+            raise ValueError(f"{name} limiter needs a positive rate and a burst of at least 1")
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.store = store
+        self.allowed = 0
+        self.limited = 0
+        self.store_errors = 0
+
+    async def check(self, key: str, cost: float = 1) -> Optional[float]:
+        """Spend cost tokens from key's bucket; returns None when allowed, else seconds until retry"""
+        try:
+            allowed, tokens = await self.store.take(self.name, key, self.rate, self.burst, cost)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"Rate limit store error for {self.name}, allowing request: {str(e)}")
+            return None
+        if allowed:
+            self.allowed += 1
+            return None
+        self.limited += 1
+        return max(0.0, (cost - tokens) / self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "store": self.store.name,
+            "per_minute": round(self.rate * 60, 3),
+            "burst": self.burst,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "store_errors": self.store_errors
+        }
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    """Retry-After takes whole seconds; round up so a prompt retry is not refused again"""
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
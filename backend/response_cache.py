@@ -0,0 +1,125 @@
+"""Guest chat response cache.
+
+Answers are keyed by model plus a normalized form of the question, so
+"What is PMI?" and "what is pmi" share an entry. When a similarity threshold
+is set, a character-trigram index also matches near-duplicate wording.
+With a shared cache backend, exact entries are shared across worker processes.
+The trigram index stays per worker and learns the entries this worker has seen.
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Set, Tuple
+
+from caching import register_cache
+from shared_cache import LocalCacheBackend, SharedCache
+
+_NON_WORD = re.compile(r"[^a-z0-9%$]+")
+
+
+def normalize_question(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ResponseCache:
+    def __init__(self, name: str, maxsize: int, ttl: float, similarity_threshold: float = 0.0, backend=None):
+        self._exact = SharedCache(register_cache(name, maxsize, ttl), backend or LocalCacheBackend())
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # Inverted trigram index over cached keys, only built when similarity matching is on
+        self._postings: Dict[str, Set[Tuple[str, str]]] = {}
+        self._grams: Dict[Tuple[str, str], Set[str]] = {}
+        self.similar_hits = 0
+
+    async def lookup(self, model: str, question: str) -> Optional[Any]:
+        normalized = normalize_question(question)
+        key = (model, normalized)
+        value = await self._exact.get(key)
+        if self.similarity_threshold <= 0:
+            return value
+        if value is not None:
+            if key not in self._grams:
+                # Stored by another worker; index it so near-duplicates match here too
+                self._index(key)
+            return value
+
+        key = self._nearest(model, normalized)
+        if key is None:
+            return None
+        value = self._exact.peek(key)
+        if value is None:
+            # Expired or evicted from the exact cache since it was indexed
+            self._unindex(key)
+            return None
+        with self._lock:
+            self.similar_hits += 1
+        return value
+
+    async def store(self, model: str, question: str, value: Any) -> None:
+        key = (model, normalize_question(question))
+        await self._exact.set(key, value)
+        if self.similarity_threshold > 0:
+            self._index(key)
+
+    def _index(self, key: Tuple[str, str]) -> None:
+        grams = _trigrams(key[1])
+        with self._lock:
+            self._grams[key] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+            # Keep the index bounded by the exact cache capacity
+            if len(self._grams) > self.maxsize:
+                oldest = next(iter(self._grams))
+                self._unindex_locked(oldest)
+
+    def _unindex(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            self._unindex_locked(key)
+
+    def _unindex_locked(self, key: Tuple[str, str]) -> None:
+        for gram in self._grams.pop(key, ()):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _nearest(self, model: str, normalized: str) -> Optional[Tuple[str, str]]:
+        grams = _trigrams(normalized)
+        if not grams:
+            return None
+        with self._lock:
+            overlap = Counter()
+            for gram in grams:
+                for key in self._postings.get(gram, ()):
+                    if key[0] == model:
+                        overlap[key] += 1
+            best_key, best_score = None, 0.0
+            for key, shared in overlap.items():
+                score = shared / math.sqrt(len(grams) * len(self._grams[key]))
+                if score > best_score:
+                    best_key, best_score = key, score
+        return best_key if best_score >= self.similarity_threshold else None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._exact.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["similar_hits"] = self.similar_hits
+        stats["similarity_threshold"] = self.similarity_threshold
+        stats["indexed"] = len(self._grams)
+        # Near-duplicate and shared hits first miss the local exact cache, so count them toward the effective rate
+        stats["effective_hit_rate"] = round((stats["hits"] + stats["shared_hits"] + self.similar_hits) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        self._exact.clear()
+        with self._lock:
+            self._postings.clear()
+            self._grams.clear()
@@ -0,0 +1,68 @@
+"""One JSON codec for Mongo documents and HTTP responses.
+
+Datetimes become ISO 8601 strings exactly as datetime.isoformat() writes them
+(the format already stored in Mongo, which keyset cursors compare as
+strings). UUIDs become strings, pydantic models are dumped, and NumPy scalars
+and arrays become plain numbers and lists. orjson does the work when it is
+installed; the stdlib json module is the fallback.
+"""
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, Optional, Set
+
+import numpy as np
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+    loads = json.loads
+
+
+def to_document(model: BaseModel, exclude: Optional[Set[str]] = None) -> dict:
+    """Mongo-ready dict for a model, with datetimes as ISO strings at any depth"""
+    return loads(dumps(model.model_dump(exclude=exclude)))
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with the shared codec.
+
+    Returning it from a handler also skips FastAPI's response_model validation
+    and jsonable_encoder pass, so use it for data the server built itself.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
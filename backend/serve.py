@@ -0,0 +1,53 @@
+"""Serve the API with one or more uvicorn worker processes.
+
+    python serve.py --workers 4 --port 8001 --mongo-connections 200
+
+Each worker is a separate process with its own event loop, Motor connection
+pool, write-behind buffers and first-tier caches. With more than one worker:
+- Set CACHE_BACKEND=redis so the user, guest chat and product caches are
+  shared and invalidated across workers.
+- --mongo-connections splits a total connection budget into a per-worker
+  MONGO_MAX_POOL_SIZE.
+"""
+import argparse
+import logging
+import os
+from pathlib import Path
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8001)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--mongo-connections", type=int, help="total MongoDB connections across all workers")
+    parser.add_argument("--log-level", default=os.environ.get("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Workers inherit the environment, so per-worker settings are passed this way
+    if args.mongo_connections:
+        os.environ["MONGO_MAX_POOL_SIZE"] = str(max(1, args.mongo_connections // args.workers))
+    if args.workers > 1 and os.environ.get("CACHE_BACKEND", "local") == "local":
+        logger.warning(f"Serving with {args.workers} workers and CACHE_BACKEND=local: each worker caches on its own")
+    logger.info(
+        f"Starting {args.workers} worker(s) on {args.host}:{args.port}, "
+        f"MONGO_MAX_POOL_SIZE={os.environ.get('MONGO_MAX_POOL_SIZE', 100)} per worker"
+    )
+
+    uvicorn.run(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        app_dir=str(Path(__file__).parent),
+        log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,270 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import Annotated, List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 import asyncio
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import base64
+import json
+import numpy as np
+
+import payment_math
+import amortization
+from caching import register_cache, all_cache_stats
+from shared_cache import SharedCache, make_backend
+from worker_pool import BoundedWorkerPool, PoolSaturated
+from llm_pool import LlmClientPool, model_for, PRIORITY_GUEST, PRIORITY_USER
+from llm_dispatch import BREAKER_STATES, LlmDispatcher, LlmUnavailable, describe
+from chat_context import ContextManager, render_transcript
+from response_cache import ResponseCache
+from rate_limit import TokenBucketLimiter, make_store, retry_after_header
+from intent_classifier import classify_intent
+from db_indexes import ensure_indexes, audit_query_plans, log_audit
+from product_catalog import CatalogSnapshot, ProductCatalog, etag_matches
+from product_matching import ProductIndex, RANK_KEYS
+from document_pipeline import LocalObjectStorage, MockOcrEngine, OcrWorkerPool, UploadTooLarge, safe_filename
+from write_behind import WriteBehindBuffer, insert_idempotent
+import metrics
+from serialization import FastJSONResponse, dumps, to_document
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Request, span and Mongo command timings served at /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+# MongoDB connection; pool sizes are per worker process, so N workers open up to N x MONGO_MAX_POOL_SIZE connections
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_CONNECTING = int(os.environ.get('MONGO_MAX_CONNECTING', 2))
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxConnecting=MONGO_MAX_CONNECTING,
+    event_listeners=[metrics.MongoCommandMetrics()] if METRICS_ENABLED else []
+)
 db = client[os.environ['DB_NAME']]
 
+# Cache sharing between worker processes: "local" keeps each worker's caches private,
+# "redis" backs the user, guest chat and product caches with CACHE_REDIS_URL and broadcasts invalidations
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', os.environ['DB_NAME'])
+cache_backend = make_backend(CACHE_BACKEND, CACHE_REDIS_URL, prefix=CACHE_KEY_PREFIX)
+
+# Chat history storage: "embedded" keeps messages in the chat_sessions document, capped at
+# CHAT_EMBEDDED_MESSAGE_CAP (0 = unbounded); "collection" stores one document per message in chat_messages
+CHAT_STORAGE_MODE = os.environ.get('CHAT_STORAGE_MODE', 'embedded')
+CHAT_EMBEDDED_MESSAGE_CAP = int(os.environ.get('CHAT_EMBEDDED_MESSAGE_CAP', 200))
+CHAT_HISTORY_PAGE_SIZE = int(os.environ.get('CHAT_HISTORY_PAGE_SIZE', 50))
+
+# Index bootstrap on startup; DB_QUERY_AUDIT also explains every route query and logs collection scans
+DB_ENSURE_INDEXES = os.environ.get('DB_ENSURE_INDEXES', 'true').lower() == 'true'
+DB_QUERY_AUDIT = os.environ.get('DB_QUERY_AUDIT', 'false').lower() == 'true'
+
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# bcrypt runs off the event loop; PASSWORD_HASH_WORKERS=0 hashes inline
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+password_pool = BoundedWorkerPool("bcrypt", PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRE_MINUTES', 30))
 
+# Document uploads stream to storage in chunks; OCR runs on background workers
+DOCUMENT_STORAGE_DIR = os.environ.get('DOCUMENT_STORAGE_DIR', str(ROOT_DIR / 'storage'))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 25 * 1024 * 1024))
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 2))
+OCR_MAX_QUEUE = int(os.environ.get('OCR_MAX_QUEUE', 1000))
+# A job claimed longer ago than this is taken over, e.g. after its worker was stopped mid-job
+OCR_CLAIM_TIMEOUT_SECONDS = float(os.environ.get('OCR_CLAIM_TIMEOUT_SECONDS', 300))
+document_storage = LocalObjectStorage(DOCUMENT_STORAGE_DIR)
+
+# Product catalog snapshot lifetime and client cache lifetime for GET /products
+PRODUCT_CATALOG_TTL_SECONDS = float(os.environ.get('PRODUCT_CATALOG_TTL_SECONDS', 300))
+PRODUCT_CATALOG_MAX_AGE = int(os.environ.get('PRODUCT_CATALOG_MAX_AGE', 60))
+
+# Write-behind for prequal_results and chat turns: "batched" answers before the write lands, "sync" writes first
+WRITE_BEHIND_DURABILITY = os.environ.get('WRITE_BEHIND_DURABILITY', 'batched')
+WRITE_BEHIND_MAX_BATCH = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', 200))
+WRITE_BEHIND_FLUSH_MS = float(os.environ.get('WRITE_BEHIND_FLUSH_MS', 50))
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', 10000))
+# A failing batch is retried with backoff (up to WRITE_BEHIND_MAX_BACKOFF_MS apart) and dropped after WRITE_BEHIND_RETRY_SECONDS
+WRITE_BEHIND_RETRY_SECONDS = float(os.environ.get('WRITE_BEHIND_RETRY_SECONDS', 120))
+WRITE_BEHIND_MAX_BACKOFF_MS = float(os.environ.get('WRITE_BEHIND_MAX_BACKOFF_MS', 5000))
+
+# Most scenarios one batch pre-qualification request may carry; larger lists are rejected with 422
+PREQUAL_BATCH_MAX = int(os.environ.get('PREQUAL_BATCH_MAX', 5000))
+
+# Largest what-if grid (loan amounts x down payments x credit scores x terms) one request may score
+PREQUAL_GRID_MAX_CELLS = int(os.environ.get('PREQUAL_GRID_MAX_CELLS', 20000))
+
+# Loans per vectorized block when streaming amortization exports
+AMORTIZATION_CHUNK_LOANS = int(os.environ.get('AMORTIZATION_CHUNK_LOANS', 256))
+
+# Authenticated user lookup cache; AUTH_TRUST_TOKEN_CLAIMS skips the DB entirely for tokens carrying user claims
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 10000))
+AUTH_TRUST_TOKEN_CLAIMS = os.environ.get('AUTH_TRUST_TOKEN_CLAIMS', 'false').lower() == 'true'
+# Users are never updated after signup; a write path that changes one must call user_cache.invalidate(user_id)
+user_cache = SharedCache(
+    register_cache("users", USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS),
+    cache_backend,
+    encode=to_document,
+    decode=lambda doc: User(**doc)
+)
+auth_stats = {"claims_trusted": 0, "db_lookups": 0}
+
 # LLM Configuration
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
+# LLM_BASE_URL points the pool at an OpenAI-compatible server (e.g. a local stub) instead of Emergent
+LLM_BASE_URL = os.environ.get('LLM_BASE_URL')
+# Per-provider overrides, e.g. a separate fault-injecting stub for each provider
+LLM_ANTHROPIC_BASE_URL = os.environ.get('LLM_ANTHROPIC_BASE_URL')
+LLM_OPENAI_BASE_URL = os.environ.get('LLM_OPENAI_BASE_URL')
+LLM_MAX_SESSIONS = int(os.environ.get('LLM_MAX_SESSIONS', 1000))
+LLM_ANTHROPIC_CONCURRENCY = int(os.environ.get('LLM_ANTHROPIC_CONCURRENCY', 16))
+LLM_OPENAI_CONCURRENCY = int(os.environ.get('LLM_OPENAI_CONCURRENCY', 16))
+# When a provider's slots are all taken, signed-in users are served before guests; guests may hold at most
+# LLM_GUEST_MAX_SHARE of the slots, and guest calls beyond LLM_GUEST_MAX_QUEUE waiting are shed with a 503
+LLM_GUEST_MAX_SHARE = float(os.environ.get('LLM_GUEST_MAX_SHARE', 0.5))
+LLM_GUEST_MAX_QUEUE = int(os.environ.get('LLM_GUEST_MAX_QUEUE', 32))
+# Chat context sent upstream is held to CHAT_CONTEXT_MAX_TOKENS per request: the system prompt, a running summary,
+# the newest turns that fit and the new message. Once a session holds more than CHAT_CONTEXT_WINDOW_TURNS turns, the
+# oldest are folded into the summary (at most CHAT_SUMMARY_MAX_TOKENS) by the LLM, or by keeping each message's first
+# sentence with CHAT_SUMMARIZER=extractive. CHAT_TOKEN_COUNTER=tiktoken counts tokens instead of estimating from length
+CHAT_CONTEXT_ENABLED = os.environ.get('CHAT_CONTEXT_ENABLED', 'true').lower() == 'true'
+CHAT_CONTEXT_MAX_TOKENS = int(os.environ.get('CHAT_CONTEXT_MAX_TOKENS', 4000))
+CHAT_CONTEXT_WINDOW_TURNS = int(os.environ.get('CHAT_CONTEXT_WINDOW_TURNS', 8))
+CHAT_SUMMARY_MAX_TOKENS = int(os.environ.get('CHAT_SUMMARY_MAX_TOKENS', 400))
+CHAT_SUMMARIZER = os.environ.get('CHAT_SUMMARIZER', 'llm')
+CHAT_TOKEN_COUNTER = os.environ.get('CHAT_TOKEN_COUNTER', 'estimate')
+
+SUMMARY_INSTRUCTIONS = """Update the running summary of a mortgage advice conversation. Keep what the advisor will need later:
+the borrower's numbers (income, debts, credit score, down payment, target price), their goals and concerns, and any
+figures or recommendations already given. Reply with the updated summary only, in at most {words} words."""
+
+# Owner of one-off summary sessions in the pool; never a user id (a UUID) or the guest owner
+CONTEXT_SUMMARY_OWNER = "context-summary"
+
+async def summarize_chat_context(previous: str, turns: List[Dict[str, str]], max_tokens: int) -> str:
+    """Fold turns into a session's running summary with a one-off call to the primary model"""
+    request = (
+        f"{SUMMARY_INSTRUCTIONS.format(words=max_tokens * 3 // 4)}\n\n"
+        f"Current summary:\n{previous or '(none yet)'}\n\nNew turns:\n{render_transcript(turns)}"
+    )
+    spec = model_for(True)
+    session_id = str(uuid.uuid4())
+    # Straight to the pool, not the dispatcher: a summary is not a chat turn, so it must not trip
+    # the breaker or shift the hedge latency. A failure falls back to the extractive summary.
+    # Background work, so it queues behind signed-in chat like guest traffic.
+    try:
+        with metrics.span("chat_summary"):
+            return await llm_pool.send(
+                spec, CONTEXT_SUMMARY_OWNER, session_id, request, PRIORITY_GUEST, timeout=llm_dispatcher.timeout_for(spec.provider)
+            )
+    finally:
+        llm_pool.drop_session(CONTEXT_SUMMARY_OWNER, session_id)
+
+chat_context = None
+if CHAT_CONTEXT_ENABLED:
+    if CHAT_SUMMARIZER not in ("llm", "extractive"):
+        raise ValueError(f"CHAT_SUMMARIZER must be 'llm' or 'extractive', got {CHAT_SUMMARIZER!r}")
+    chat_context = ContextManager(
+        max_tokens=CHAT_CONTEXT_MAX_TOKENS,
+        window_turns=CHAT_CONTEXT_WINDOW_TURNS,
+        summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+        summarizer=summarize_chat_context if CHAT_SUMMARIZER == "llm" else None,
+        token_counter=CHAT_TOKEN_COUNTER
+    )
+llm_pool = LlmClientPool(
+    api_key=EMERGENT_LLM_KEY,
+    max_sessions=LLM_MAX_SESSIONS,
+    provider_concurrency={"anthropic": LLM_ANTHROPIC_CONCURRENCY, "openai": LLM_OPENAI_CONCURRENCY},
+    base_url=LLM_BASE_URL,
+    provider_base_urls={"anthropic": LLM_ANTHROPIC_BASE_URL, "openai": LLM_OPENAI_BASE_URL},
+    guest_max_share=LLM_GUEST_MAX_SHARE,
+    guest_max_queue=LLM_GUEST_MAX_QUEUE,
+    context=chat_context
+)
+# Upstream timeout per provider: the whole reply for a send, or the wait for each chunk of a stream.
+# A failed turn is retried on the other model (LLM_FAILOVER_ENABLED); a provider's circuit opens after
+# LLM_BREAKER_FAILURES failures in a row and lets one probe call through after LLM_BREAKER_RESET_SECONDS.
+# LLM_HEDGE_ENABLED also asks the other model when a signed-in send runs past the preferred provider's
+# recent LLM_HEDGE_QUANTILE latency (LLM_HEDGE_DEFAULT_DELAY_MS until enough calls have been seen)
+LLM_ANTHROPIC_TIMEOUT_SECONDS = float(os.environ.get('LLM_ANTHROPIC_TIMEOUT_SECONDS', 30))
+LLM_OPENAI_TIMEOUT_SECONDS = float(os.environ.get('LLM_OPENAI_TIMEOUT_SECONDS', 30))
+LLM_FAILOVER_ENABLED = os.environ.get('LLM_FAILOVER_ENABLED', 'true').lower() == 'true'
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', 30))
+LLM_HEDGE_ENABLED = os.environ.get('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_QUANTILE = float(os.environ.get('LLM_HEDGE_QUANTILE', 0.95))
+LLM_HEDGE_DEFAULT_DELAY_MS = float(os.environ.get('LLM_HEDGE_DEFAULT_DELAY_MS', 2000))
+llm_dispatcher = LlmDispatcher(
+    lambda: llm_pool,
+    timeouts={"anthropic": LLM_ANTHROPIC_TIMEOUT_SECONDS, "openai": LLM_OPENAI_TIMEOUT_SECONDS},
+    failover=LLM_FAILOVER_ENABLED,
+    failure_threshold=LLM_BREAKER_FAILURES,
+    reset_seconds=LLM_BREAKER_RESET_SECONDS,
+    hedge=LLM_HEDGE_ENABLED,
+    hedge_quantile=LLM_HEDGE_QUANTILE,
+    hedge_default_delay=LLM_HEDGE_DEFAULT_DELAY_MS / 1000
+)
+
+# Token-bucket limits on chat turns that reach the LLM: per client IP for guests, per user id when signed in.
+# RATE_LIMIT_STORE=redis shares buckets across workers via CACHE_REDIS_URL. RATE_LIMIT_PROXY_HOPS is the number
+# of our own proxies appending to X-Forwarded-For in front of the backend (0 = use the socket peer address)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', CACHE_BACKEND)
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))
+rate_limit_store = make_store(RATE_LIMIT_STORE, CACHE_REDIS_URL, prefix=CACHE_KEY_PREFIX)
+guest_chat_limiter = TokenBucketLimiter(
+    "guest_chat",
+    per_minute=float(os.environ.get('RATE_LIMIT_GUEST_PER_MINUTE', 10)),
+    burst=int(os.environ.get('RATE_LIMIT_GUEST_BURST', 5)),
+    store=rate_limit_store
+)
+user_chat_limiter = TokenBucketLimiter(
+    "user_chat",
+    per_minute=float(os.environ.get('RATE_LIMIT_USER_PER_MINUTE', 30)),
+    burst=int(os.environ.get('RATE_LIMIT_USER_BURST', 10)),
+    store=rate_limit_store
+)
 
-app = FastAPI()
+# Guest FAQ answers; GUEST_CACHE_SCOPE=first_turn only caches questions that open a session,
+# since later turns may depend on conversation context. GUEST_CACHE_SIMILARITY > 0 enables near-duplicate matching.
+GUEST_CACHE_ENABLED = os.environ.get('GUEST_CACHE_ENABLED', 'true').lower() == 'true'
+GUEST_CACHE_SCOPE = os.environ.get('GUEST_CACHE_SCOPE', 'first_turn')
+guest_response_cache = ResponseCache(
+    "guest_chat",
+    maxsize=int(os.environ.get('GUEST_CACHE_MAX_SIZE', 2000)),
+    ttl=float(os.environ.get('GUEST_CACHE_TTL_SECONDS', 3600)),
+    similarity_threshold=float(os.environ.get('GUEST_CACHE_SIMILARITY', 0)),
+    backend=cache_backend
+)
+
+# Responses are encoded with the shared orjson codec rather than the stdlib encoder
+app = FastAPI(default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # ============= MODELS =============
@@ -104,13 +334,18 @@ class Document(BaseModel):
     file_url: str
     ocr_status: str = "pending"  # pending, processing, completed, failed
     ocr_data: Optional[Dict[str, Any]] = None
+    ocr_error: Optional[str] = None
     confidence_score: Optional[float] = None
+    storage_key: Optional[str] = None
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
     uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ChatMessage(BaseModel):
     role: str  # user, assistant
     content: str
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    prompt_tokens: Optional[int] = None  # assistant replies: size of the prompt that produced them
 
 class ChatSession(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -118,6 +353,7 @@ class ChatSession(BaseModel):
     user_id: str
     session_id: str
     messages: List[ChatMessage] = []
+    message_count: int = 0  # total messages ever written; message seq numbers run 0..message_count-1
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -132,6 +368,7 @@ class ChatResponse(BaseModel):
     intent: Optional[str] = None
     confidence: Optional[float] = None
     suggestions: Optional[List[str]] = None
+    prompt_tokens: Optional[int] = None  # None when the answer did not come from an LLM call
 
 class PreQualRequest(BaseModel):
     loan_amount: float
@@ -141,6 +378,23 @@ class PreQualRequest(BaseModel):
     credit_score: Optional[int] = None
     employment_status: str
     property_type: str = "primary"
+    term: int = Field(360, ge=1, le=480)  # in months
+
+class PreQualBatchRequest(BaseModel):
+    requests: List[PreQualRequest] = Field(..., max_length=PREQUAL_BATCH_MAX)
+    credit_score: Optional[int] = None  # Overrides every request's credit score when set
+
+class PreQualWhatIfRequest(BaseModel):
+    """Grid axes for a what-if run; every combination is scored"""
+    # No axis can be longer than the whole grid, so oversized ones are refused before any lookup
+    loan_amounts: List[Annotated[float, Field(ge=0)]] = Field(min_length=1, max_length=PREQUAL_GRID_MAX_CELLS)
+    down_payments: List[Annotated[float, Field(ge=0)]] = Field(min_length=1, max_length=PREQUAL_GRID_MAX_CELLS)
+    credit_scores: Optional[List[int]] = Field(None, max_length=PREQUAL_GRID_MAX_CELLS)  # Rate tier axis; defaults to the known credit score
+    terms: List[Annotated[int, Field(ge=1, le=480)]] = Field([360], min_length=1, max_length=PREQUAL_GRID_MAX_CELLS)  # in months
+    annual_income: float
+    monthly_debts: float
+    employment_status: str
+    property_type: str = "primary"
 
 class PreQualResult(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -154,10 +408,20 @@ class PreQualResult(BaseModel):
     max_loan_amount: Optional[float] = None
     estimated_rate: Optional[float] = None
     monthly_payment: Optional[float] = None
+    term: int = 360
     conditions: List[str] = []
     explanation: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class AmortizationLoan(BaseModel):
+    loan_id: Optional[str] = None
+    principal: float = Field(gt=0)
+    annual_rate: float = Field(ge=0)
+    term: int = Field(360, ge=1, le=480)  # in months, as MortgageProduct.term
+
+class AmortizationExportRequest(BaseModel):
+    loans: List[AmortizationLoan]
+
 class MortgageProduct(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -205,6 +469,17 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+async def run_password_task(fn, *args):
+    """Run a bcrypt call on the password pool, shedding load with a 503 when it is full"""
+    try:
+        return await password_pool.run(fn, *args)
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service busy, please retry",
+            headers={"Retry-After": "1"}
+        )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -215,77 +490,179 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
+def user_token_claims(user: User) -> dict:
+    """JWT claims for a user; with AUTH_TRUST_TOKEN_CLAIMS the "usr" claim carries the record so no lookup is needed"""
+    claims = {"sub": user.id}
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        # Email and phone would otherwise sit readable in every token for no benefit
+        claims["usr"] = user.model_dump(mode="json", exclude={"id"})
+    return claims
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    with metrics.span("get_current_user") as span_labels:
+        token = credentials.credentials
+        try:
+            with metrics.span("jwt_decode"):
+                payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        except JWTError:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0})
-    if user_doc is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return User(**user_doc)
-
-async def get_ai_response(message: str, session_id: str, user_id: str, use_primary: bool = True) -> Dict[str, Any]:
-    """Get AI response using Claude (primary) or GPT (secondary)"""
-    try:
-        # Initialize appropriate chat model
-        if use_primary:
-            # Claude Sonnet 4 for reasoning and explainability
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=session_id,
-                system_message="""You are an expert mortgage advisor AI assistant. Your role is to help users understand mortgages, 
-                calculate pre-qualifications, explain loan types, and guide them through the application process. 
-                
-                Be clear, empathetic, and transparent. When making recommendations, always explain your reasoning.
-                If you detect stress or confusion, adjust your tone to be more supportive.
-                
-                Available intents: getQuote, preQual, startApplication, uploadDoc, explainTerm, requestHuman.
-                
-                Always provide practical, actionable advice and be ready to explain complex financial concepts in simple terms."""
-            ).with_model("anthropic", "claude-3-7-sonnet-20250219")
-        else:
-            # OpenAI GPT-5 for conversational interface
-            chat = LlmChat(
-                api_key=EMERGENT_LLM_KEY,
-                session_id=session_id,
-                system_message="""You are a friendly mortgage assistant helping users with their home loan journey. 
-                Be conversational, warm, and helpful. Guide users through the mortgage process with clarity and empathy."""
-            ).with_model("openai", "gpt-5")
         
-        user_message = UserMessage(text=message)
-        response = await chat.send_message(user_message)
+        # Stateless mode: the signature already vouches for the claims
+        if AUTH_TRUST_TOKEN_CLAIMS and payload.get("usr"):
+            auth_stats["claims_trusted"] += 1
+            span_labels["cache"] = "claims"
+            return User(id=user_id, **payload["usr"])
         
-        # Detect intent (simple keyword-based for MVP)
-        intent = None
-        message_lower = message.lower()
-        if any(word in message_lower for word in ['quote', 'rate', 'payment', 'calculate']):
-            intent = 'getQuote'
-        elif any(word in message_lower for word in ['qualify', 'eligible', 'pre-qual', 'prequalify']):
-            intent = 'preQual'
-        elif any(word in message_lower for word in ['apply', 'application', 'start']):
-            intent = 'startApplication'
-        elif any(word in message_lower for word in ['upload', 'document', 'doc']):
-            intent = 'uploadDoc'
-        elif any(word in message_lower for word in ['explain', 'what is', 'what are', 'help me understand']):
-            intent = 'explainTerm'
-        elif any(word in message_lower for word in ['talk', 'human', 'person', 'agent']):
-            intent = 'requestHuman'
+        user = await user_cache.get(user_id)
+        if user is not None:
+            span_labels["cache"] = "hit"
+            return user
         
-        return {
-            "response": response,
-            "intent": intent,
-            "model": "claude-sonnet-4" if use_primary else "gpt-5"
-        }
-    except Exception as e:
+        span_labels["cache"] = "miss"
+        auth_stats["db_lookups"] += 1
+        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        if user_doc is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = User(**user_doc)
+        await user_cache.set(user_id, user)
+        return user
+
+def client_ip(request: Request) -> str:
+    """Caller address for per-IP limits; X-Forwarded-For entries left of our own proxies' are client-supplied"""
+    forwarded = request.headers.get("x-forwarded-for")
+    if RATE_LIMIT_PROXY_HOPS and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= RATE_LIMIT_PROXY_HOPS:
+            return hops[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+async def enforce_rate_limit(limiter: TokenBucketLimiter, key: str):
+    """Spend one token from key's bucket, or refuse the request with a 429 and Retry-After"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    retry_after = await limiter.check(key)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many chat requests, please slow down",
+            headers=retry_after_header(retry_after)
+        )
+
+def llm_busy_error() -> HTTPException:
+    return HTTPException(status_code=503, detail="AI service busy, please retry", headers={"Retry-After": "1"})
+
+def llm_unavailable_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="AI service unavailable, please retry",
+        headers=retry_after_header(llm_dispatcher.retry_after())
+    )
+
+def suggestions_for_intent(intent: Optional[str]) -> List[str]:
+    """Generate suggestions based on intent"""
+    if intent == "getQuote":
+        return ["Calculate pre-qualification", "View mortgage products", "Start application"]
+    elif intent == "preQual":
+        return ["Start pre-qualification", "Upload documents", "Talk to an advisor"]
+    return []
+
+async def get_ai_response(message: str, session_id: str, user_id: Optional[str], use_primary: bool = True, priority: int = PRIORITY_USER) -> Dict[str, Any]:
+    """Get AI response using Claude (primary) or GPT (secondary), failing over to the other when needed; user_id is None for guests"""
+    # Intent depends only on the user's text, so classify before waiting on the model
+    intent_match = classify_intent(message)
+    # Reuse the session's pooled client for the selected model
+    spec = model_for(use_primary)
+    try:
+        with metrics.span("get_ai_response"):
+            response, answered_by = await llm_dispatcher.send(spec, user_id, session_id, message, priority)
+    except PoolSaturated:
+        raise llm_busy_error()
+    except LlmUnavailable as e:
         logging.error(f"AI response error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
+        raise llm_unavailable_error()
+    
+    return {
+        "response": response,
+        "intent": intent_match.intent,
+        "confidence": intent_match.confidence,
+        "model": answered_by.label,
+        "prompt_tokens": llm_pool.last_prompt_tokens(answered_by, user_id, session_id)
+    }
+
+async def guest_cache_lookup(chat_req: ChatRequest, session_id: str):
+    """Return (cacheable, cached_result) for a guest message"""
+    spec = model_for(chat_req.use_primary)
+    cacheable = GUEST_CACHE_ENABLED and (GUEST_CACHE_SCOPE == "all" or not llm_pool.has_session(spec, None, session_id))
+    if not cacheable:
+        return False, None
+    with metrics.span("guest_cache_lookup") as span_labels:
+        cached = await guest_response_cache.lookup(spec.label, chat_req.message)
+        span_labels["cache"] = "miss" if cached is None else "hit"
+    if cached is not None:
+        # Keep the session's context consistent for follow-up questions
+        llm_pool.record_turn(spec, None, session_id, chat_req.message, cached["response"])
+        intent_match = classify_intent(chat_req.message)
+        # No upstream call, so no prompt
+        cached = {**cached, "intent": intent_match.intent, "confidence": intent_match.confidence, "prompt_tokens": None}
+    return True, cached
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+async def stream_ai_response(message: str, session_id: str, user_id: Optional[str], use_primary: bool = True, on_complete=None, priority: int = PRIORITY_USER):
+    """Server-Sent Events for a chat turn: token events, then a trailing done event.
+
+    on_complete(full_response, model, prompt_tokens) runs once after the last token and before
+    the done event, with the label of the model that answered and the size of its prompt; it is
+    skipped if the upstream call fails.
+    """
+    answered_by = model_for(use_primary)
+    intent_match = classify_intent(message)
+    parts = []
+    try:
+        async for answered_by, delta in llm_dispatcher.stream(answered_by, user_id, session_id, message, priority):
+            parts.append(delta)
+            yield sse_event("token", {"text": delta})
+    except Exception as e:
+        logging.error(f"AI stream error: {str(e)}")
+        yield sse_event("error", {"detail": f"AI service error: {describe(e)}"})
+        return
+    
+    response = "".join(parts)
+    prompt_tokens = llm_pool.last_prompt_tokens(answered_by, user_id, session_id)
+    if on_complete is not None:
+        await on_complete(response, answered_by.label, prompt_tokens)
+    yield sse_event("done", {
+        "session_id": session_id,
+        "intent": intent_match.intent,
+        "confidence": intent_match.confidence,
+        "suggestions": suggestions_for_intent(intent_match.intent),
+        "model": answered_by.label,
+        "prompt_tokens": prompt_tokens
+    })
+
+async def replay_cached_response(cached: Dict[str, Any], session_id: str):
+    yield sse_event("token", {"text": cached["response"]})
+    yield sse_event("done", {
+        "session_id": session_id,
+        "intent": cached["intent"],
+        "confidence": cached["confidence"],
+        "suggestions": suggestions_for_intent(cached["intent"]),
+        "model": cached["model"],
+        "prompt_tokens": None
+    })
 
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@metrics.timed("calculate_prequal")
 def calculate_prequal(data: PreQualRequest, credit_score: Optional[int] = None) -> Dict[str, Any]:
     """Calculate pre-qualification based on user inputs"""
     # Use provided credit score or estimate from profile
@@ -339,18 +716,14 @@ def calculate_prequal(data: PreQualRequest, credit_score: Optional[int] = None)
     if ltv > 90:
         base_rate += 0.25
     
-    # Calculate monthly payment (using simple formula)
-    monthly_rate = base_rate / 100 / 12
-    num_payments = 360  # 30-year loan
-    if monthly_rate > 0:
-        monthly_payment = data.loan_amount * (monthly_rate * (1 + monthly_rate) ** num_payments) / ((1 + monthly_rate) ** num_payments - 1)
-    else:
-        monthly_payment = data.loan_amount / num_payments
+    # Calculate monthly payment from the cached annuity factor
+    num_payments = data.term
+    monthly_payment = payment_math.monthly_payment(data.loan_amount, base_rate, num_payments)
     
     # Calculate max loan amount based on DTI
     max_monthly_payment = (monthly_income * 0.43) - data.monthly_debts
-    if monthly_rate > 0 and max_monthly_payment > 0:
-        max_loan = max_monthly_payment * ((1 + monthly_rate) ** num_payments - 1) / (monthly_rate * (1 + monthly_rate) ** num_payments)
+    if base_rate > 0 and max_monthly_payment > 0:
+        max_loan = payment_math.max_principal(max_monthly_payment, base_rate, num_payments)
     else:
         max_loan = data.loan_amount
     
@@ -376,6 +749,284 @@ You are {status} for a mortgage of ${data.loan_amount:,.2f}."""
         "explanation": explanation
     }
 
+def prequal_arrays(scores, loan_amount, down_payment, annual_income, monthly_debts, employed, terms=360) -> Dict[str, np.ndarray]:
+    """calculate_prequal's rules over NumPy arrays; inputs broadcast against each other"""
+    scores = np.asarray(scores)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # DTI and LTV, falling back to 100 exactly like the scalar path
+        monthly_income = annual_income / 12
+        dti = np.where(monthly_income > 0, (monthly_debts / monthly_income) * 100, 100.0)
+        property_value = loan_amount + down_payment
+        ltv = np.where(property_value > 0, loan_amount / property_value * 100, 100.0)
+
+        # Rate tiers by credit score plus LTV bumps
+        base_rate = np.select(
+            [scores >= 760, scores >= 700, scores >= 680],
+            [5.75, 6.0, 6.25],
+            default=6.5
+        )
+        base_rate = base_rate + np.where(ltv > 80, 0.25, 0.0) + np.where(ltv > 90, 0.25, 0.0)
+
+        # Annuity factor looked up once per distinct (rate tier, term)
+        base_rate, terms = np.broadcast_arrays(base_rate, np.asarray(terms, dtype=np.int64))
+        factor = payment_math.annuity_factors(base_rate, terms)
+        monthly_payment = loan_amount * factor
+        max_monthly_payment = (monthly_income * 0.43) - monthly_debts
+        max_loan = np.where(
+            (base_rate > 0) & (max_monthly_payment > 0),
+            max_monthly_payment / factor,
+            loan_amount
+        )
+
+    denied = scores < 620
+    low_score = (scores >= 620) & (scores < 680)
+    high_dti = dti > 43
+    high_ltv = ltv > 97
+    unverified = ~np.asarray(employed)
+    conditional = low_score | high_dti | high_ltv | unverified
+    status = np.where(denied, "denied", np.where(conditional, "conditional", "approved"))
+    return {
+        "status": status,
+        "dti": dti,
+        "ltv": ltv,
+        "estimated_rate": base_rate,
+        "monthly_payment": monthly_payment,
+        "max_loan_amount": max_loan,
+        "denied": denied,
+        "low_score": low_score,
+        "high_dti": high_dti,
+        "high_ltv": high_ltv,
+        "unverified": unverified
+    }
+
+@metrics.timed("calculate_prequal_batch")
+def calculate_prequal_batch(requests: List[PreQualRequest], credit_score: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Vectorized calculate_prequal for re-scoring many requests in one pass.
+
+    Applies the same rules as calculate_prequal and returns the same status, DTI, LTV,
+    rate, payment, max loan and conditions per request. The narrative explanation is
+    left out since batch callers only consume the numbers.
+    """
+    if not requests:
+        return []
+
+    arrays = prequal_arrays(
+        np.array([credit_score or r.credit_score or 680 for r in requests], dtype=np.int64),
+        np.array([r.loan_amount for r in requests], dtype=np.float64),
+        np.array([r.down_payment for r in requests], dtype=np.float64),
+        np.array([r.annual_income for r in requests], dtype=np.float64),
+        np.array([r.monthly_debts for r in requests], dtype=np.float64),
+        np.array([r.employment_status in ('employed', 'self-employed') for r in requests]),
+        np.array([r.term for r in requests], dtype=np.int64)
+    )
+    status, dti, ltv, base_rate, monthly_payment, max_loan = (
+        arrays[name] for name in ("status", "dti", "ltv", "estimated_rate", "monthly_payment", "max_loan_amount")
+    )
+    denied, low_score, high_dti, high_ltv, unverified = (
+        arrays[name] for name in ("denied", "low_score", "high_dti", "high_ltv", "unverified")
+    )
+
+    # Unbox once; per-element numpy indexing dominates otherwise
+    columns = zip(
+        status.tolist(), dti.tolist(), ltv.tolist(), base_rate.tolist(), monthly_payment.tolist(), max_loan.tolist(),
+        denied.tolist(), low_score.tolist(), high_dti.tolist(), high_ltv.tolist(), unverified.tolist()
+    )
+    results = []
+    for row_status, row_dti, row_ltv, row_rate, row_payment, row_max_loan, row_denied, row_low_score, row_high_dti, row_high_ltv, row_unverified in columns:
+        conditions = []
+        if row_denied:
+            conditions.append("Credit score below minimum requirement (620)")
+        elif row_low_score:
+            conditions.append("Credit score requires additional documentation")
+        if row_high_dti:
+            conditions.append("Debt-to-income ratio exceeds 43% - may require compensating factors")
+        if row_high_ltv:
+            conditions.append("High loan-to-value ratio - may require PMI or larger down payment")
+        if row_unverified:
+            conditions.append("Employment verification required")
+
+        # Round with Python's round() so results match calculate_prequal exactly
+        results.append({
+            "status": row_status,
+            "dti": round(row_dti, 2),
+            "ltv": round(row_ltv, 2),
+            "estimated_rate": round(row_rate, 3),
+            "monthly_payment": round(row_payment, 2),
+            "max_loan_amount": round(row_max_loan, 2),
+            "conditions": conditions
+        })
+    return results
+
+async def ensure_chat_session(session_id: str, user_id: str):
+    session_doc = await db.chat_sessions.find_one({"session_id": session_id, "user_id": user_id}, {"_id": 1})
+    if not session_doc:
+        session = ChatSession(user_id=user_id, session_id=session_id)
+        await db.chat_sessions.insert_one(to_document(session))
+
+async def persist_chat_turns(turns: List[dict]):
+    """Write buffered turns; safe to replay after a partial write"""
+    if CHAT_STORAGE_MODE == "collection":
+        # Keys and seqs were fixed when each turn was buffered, so a replayed insert only adds what is missing
+        await insert_idempotent(db.chat_messages, [message for turn in turns for message in turn["messages"]])
+        return
+    
+    # One update per turn, each guarded by its own turn id: a retried batch can sit in front of newer
+    # turns for the same session, so a guard on the newest turn alone would push the older one again
+    updates = []
+    for turn in turns:
+        push = {"$each": turn["messages"]}
+        if CHAT_EMBEDDED_MESSAGE_CAP > 0:
+            # Keep only the newest messages so the document stays well under Mongo's 16MB limit
+            push["$slice"] = -CHAT_EMBEDDED_MESSAGE_CAP
+        updates.append(UpdateOne(
+            # An update already applied by an earlier attempt no longer matches
+            {"session_id": turn["session_id"], "user_id": turn["user_id"], "applied_turn_ids": {"$ne": turn["turn_id"]}},
+            {
+                # A replayed batch only overlaps turns written in that same batch, so max_batch ids are enough
+                "$push": {"messages": push, "applied_turn_ids": {"$each": [turn["turn_id"]], "$slice": -chat_turn_writer.max_batch}},
+                "$inc": {"message_count": len(turn["messages"])},
+                "$set": {"updated_at": turn["updated_at"]}
+            }
+        ))
+    # Ordered, so a session's turns are appended in the order they were taken
+    await db.chat_sessions.bulk_write(updates, ordered=True)
+
+async def persist_prequal_results(docs: List[dict]):
+    await insert_idempotent(db.prequal_results, docs)
+
+chat_turn_writer = WriteBehindBuffer(
+    "chat_turns", persist_chat_turns, WRITE_BEHIND_DURABILITY,
+    WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_FLUSH_MS / 1000, WRITE_BEHIND_MAX_QUEUE,
+    WRITE_BEHIND_RETRY_SECONDS, WRITE_BEHIND_MAX_BACKOFF_MS / 1000
+)
+prequal_writer = WriteBehindBuffer(
+    "prequal_results", persist_prequal_results, WRITE_BEHIND_DURABILITY,
+    WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_FLUSH_MS / 1000, WRITE_BEHIND_MAX_QUEUE,
+    WRITE_BEHIND_RETRY_SECONDS, WRITE_BEHIND_MAX_BACKOFF_MS / 1000
+)
+
+async def read_own_writes(writer: WriteBehindBuffer):
+    """Flush buffered writes (and wait out an in-flight batch) before reading the collection back"""
+    try:
+        await writer.flush()
+    except Exception as e:
+        logger.warning(f"Write-behind flush before read failed; results may lag: {str(e)}")
+
+async def reserve_message_seqs(session_id: str, user_id: str, count: int, updated_at: str) -> Optional[int]:
+    """First of count consecutive message seqs for a session, or None when the session does not exist"""
+    session_doc = await db.chat_sessions.find_one_and_update(
+        {"session_id": session_id, "user_id": user_id},
+        {"$inc": {"message_count": count}, "$set": {"updated_at": updated_at}},
+        projection={"_id": 0, "message_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return session_doc["message_count"] - count if session_doc is not None else None
+
+async def save_chat_turn(session_id: str, user_id: str, user_msg: ChatMessage, assistant_msg: ChatMessage):
+    # Only replies carry a prompt size
+    messages = [to_document(user_msg, exclude={"prompt_tokens"}), to_document(assistant_msg)]
+    updated_at = datetime.now(timezone.utc).isoformat()
+    if CHAT_STORAGE_MODE == "collection":
+        # Keys and seqs are fixed before the turn is buffered, so a retried insert recognizes what already
+        # landed and never reserves seqs twice; the reservation is one small update on the request path
+        first_seq = await reserve_message_seqs(session_id, user_id, len(messages), updated_at)
+        if first_seq is None:
+            return
+        for i, message in enumerate(messages):
+            message_id = str(uuid.uuid4())
+            message.update({"_id": message_id, "id": message_id, "session_id": session_id, "user_id": user_id, "seq": first_seq + i})
+    await chat_turn_writer.submit({
+        "session_id": session_id,
+        "user_id": user_id,
+        "turn_id": str(uuid.uuid4()),
+        "messages": messages,
+        "updated_at": updated_at
+    })
+
+async def get_chat_messages_page(session_doc: dict, before: Optional[int], limit: int) -> Dict[str, Any]:
+    """One page of a session's messages, newest page first, oldest-to-newest within the page.
+
+    Cursors are message seq numbers: pass the returned next_before to fetch older messages.
+    """
+    if CHAT_STORAGE_MODE == "collection":
+        query = {"session_id": session_doc["session_id"], "user_id": session_doc["user_id"]}
+        if before is not None:
+            query["seq"] = {"$lt": before}
+        page = await db.chat_messages.find(query, {"_id": 0, "session_id": 0, "user_id": 0}).sort("seq", -1).to_list(limit + 1)
+        has_more = len(page) > limit
+        messages = list(reversed(page[:limit]))
+    else:
+        stored = session_doc.get("messages_stored", 0)
+        # Legacy documents predate message_count; their array holds every message
+        total = max(session_doc.get("message_count") or 0, stored)
+        offset = total - stored  # seq of the oldest message still in the array
+        end = stored if before is None else max(min(before - offset, stored), 0)
+        start = max(end - limit, 0)
+        messages = []
+        if end > start:
+            doc = await db.chat_sessions.find_one(
+                {"session_id": session_doc["session_id"], "user_id": session_doc["user_id"]},
+                {"_id": 0, "messages": {"$slice": [start, end - start]}}
+            )
+            messages = [{**message, "seq": offset + start + i} for i, message in enumerate(doc.get("messages", []))]
+        has_more = start > 0
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "next_before": messages[0]["seq"] if has_more and messages else None
+    }
+
+def encode_cursor(sort_value: Any, doc_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, doc_id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Both values go into the query, so anything else (e.g. {"$ne": ...}) would act as an operator
+    if not isinstance(sort_value, (str, int, float)) or isinstance(sort_value, bool) or not isinstance(doc_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, doc_id
+
+def parse_fields(fields: Optional[str], model: type, required: List[str]) -> Optional[Dict[str, int]]:
+    """Mongo projection for ?fields=a,b; the cursor's fields are always included"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return {field: 1 for field in [*required, *requested]}
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    sort_field: str,
+    cursor: Optional[str],
+    limit: int,
+    projection: Optional[Dict[str, int]] = None
+) -> FastJSONResponse:
+    """Keyset pagination, newest first, ordered by (sort_field, id) descending.
+
+    The cursor for the next page is returned in the X-Next-Cursor header so the
+    body stays a plain list. Documents come straight from Mongo, so they are
+    encoded as-is without another validation pass.
+    """
+    if cursor:
+        sort_value, doc_id = decode_cursor(cursor)
+        query = {**query, "$or": [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "id": {"$lt": doc_id}}
+        ]}
+    projection = {**(projection or {}), "_id": 0}
+    docs = await collection.find(query, projection).sort([(sort_field, -1), ("id", -1)]).to_list(limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(docs[-1].get(sort_field), docs[-1]["id"])
+    return FastJSONResponse(docs, headers=headers)
+
 # ============= ROUTES =============
 
 @api_router.get("/")
@@ -386,39 +1037,45 @@ async def root():
 @api_router.post("/auth/signup", response_model=Token)
 async def signup(user_data: UserCreate):
     # Check if user exists
-    existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
+    existing = await db.users.find_one({"email": user_data.email}, {"_id": 1})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    hashed_pwd = hash_password(user_data.password)
+    hashed_pwd = await run_password_task(hash_password, user_data.password)
     user = User(email=user_data.email, phone=user_data.phone)
-    user_dict = user.model_dump()
+    user_dict = to_document(user)
     user_dict['password_hash'] = hashed_pwd
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
-    user_dict['updated_at'] = user_dict['updated_at'].isoformat()
-    
-    await db.users.insert_one(user_dict)
     
     # Create empty profile
-    profile = UserProfile(user_id=user.id)
-    profile_dict = profile.model_dump()
-    profile_dict['created_at'] = profile_dict['created_at'].isoformat()
-    profile_dict['updated_at'] = profile_dict['updated_at'].isoformat()
-    await db.user_profiles.insert_one(profile_dict)
+    profile_dict = to_document(UserProfile(user_id=user.id))
+    
+    # The two inserts are independent, so they share one round trip
+    user_insert, profile_insert = await asyncio.gather(
+        db.users.insert_one(user_dict),
+        db.user_profiles.insert_one(profile_dict),
+        return_exceptions=True
+    )
+    if isinstance(user_insert, DuplicateKeyError):
+        # Lost a race with a concurrent signup for the same email
+        await db.user_profiles.delete_one({"user_id": user.id})
+        raise HTTPException(status_code=400, detail="Email already registered")
+    for outcome in (user_insert, profile_insert):
+        if isinstance(outcome, Exception):
+            raise outcome
     
     # Create token
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data=user_token_claims(user))
     return Token(access_token=access_token, token_type="bearer", user=user)
 
 @api_router.post("/auth/login", response_model=Token)
 async def login(credentials: UserLogin):
     user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user_doc or not verify_password(credentials.password, user_doc.get('password_hash', '')):
+    if not user_doc or not await run_password_task(verify_password, credentials.password, user_doc.get('password_hash', '')):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     user = User(**{k: v for k, v in user_doc.items() if k != 'password_hash'})
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data=user_token_claims(user))
     return Token(access_token=access_token, token_type="bearer", user=user)
 
 @api_router.get("/auth/me", response_model=User)
@@ -432,10 +1089,7 @@ async def get_profile(current_user: User = Depends(get_current_user)):
     if not profile_doc:
         # Create empty profile if doesn't exist
         profile = UserProfile(user_id=current_user.id)
-        profile_dict = profile.model_dump()
-        profile_dict['created_at'] = profile_dict['created_at'].isoformat()
-        profile_dict['updated_at'] = profile_dict['updated_at'].isoformat()
-        await db.user_profiles.insert_one(profile_dict)
+        await db.user_profiles.insert_one(to_document(profile))
         return profile
     return profile_doc
 
@@ -444,149 +1098,209 @@ async def update_profile(profile_update: ProfileUpdate, current_user: User = Dep
     update_data = {k: v for k, v in profile_update.model_dump().items() if v is not None}
     update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    # Update KYC status based on completeness
-    profile_doc = await db.user_profiles.find_one({"user_id": current_user.id})
-    if profile_doc:
-        required_fields = ['first_name', 'last_name', 'dob', 'address', 'employment_status', 'annual_income']
-        completed = all(profile_doc.get(field) or update_data.get(field) for field in required_fields)
-        if completed:
-            update_data['kyc_status'] = 'pending'
+    # Update KYC status based on completeness; decided up front when the update alone completes the profile
+    required_fields = ['first_name', 'last_name', 'dob', 'address', 'employment_status', 'annual_income']
+    if all(update_data.get(field) for field in required_fields):
+        update_data['kyc_status'] = 'pending'
     
-    await db.user_profiles.update_one(
+    updated_profile = await db.user_profiles.find_one_and_update(
         {"user_id": current_user.id},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    updated_profile = await db.user_profiles.find_one({"user_id": current_user.id}, {"_id": 0})
+    # Fields saved earlier completed the profile; only this transition costs a second round trip
+    if (
+        updated_profile
+        and updated_profile.get('kyc_status') != 'pending'
+        and all(updated_profile.get(field) for field in required_fields)
+    ):
+        await db.user_profiles.update_one({"user_id": current_user.id}, {"$set": {"kyc_status": "pending"}})
+        updated_profile['kyc_status'] = 'pending'
     return updated_profile
 
 # Document Routes
+async def update_document_status(document_id: str, fields: Dict[str, Any]):
+    await db.documents.update_one({"id": document_id}, {"$set": fields})
+
+# Claim bookkeeping written by claim_document; kept out of the Document model and every documents read
+DOCUMENT_PUBLIC_PROJECTION = {"_id": 0, "ocr_worker": 0, "ocr_claimed_at": 0}
+
+async def claim_document(document_id: str) -> bool:
+    """Mark a document processing for this process; False when another worker has claimed it or it is done"""
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=OCR_CLAIM_TIMEOUT_SECONDS)
+    claimed = await db.documents.find_one_and_update(
+        # ISO strings like the other timestamps, so they compare in time order.
+        # $not also matches jobs left processing before claims recorded a time
+        {"id": document_id, "$or": [
+            {"ocr_status": "pending"},
+            {"ocr_status": "processing", "ocr_claimed_at": {"$not": {"$gte": stale.isoformat()}}}
+        ]},
+        {"$set": {"ocr_status": "processing", "ocr_worker": os.getpid(), "ocr_claimed_at": now.isoformat()}},
+        projection={"_id": 1}
+    )
+    return claimed is not None
+
+ocr_pool = OcrWorkerPool(MockOcrEngine(), document_storage, update_document_status, OCR_WORKERS, OCR_MAX_QUEUE, claim=claim_document)
+
 @api_router.post("/documents/upload")
 async def upload_document(
     file: UploadFile = File(...),
     doc_type: str = "other",
     current_user: User = Depends(get_current_user)
 ):
-    # Mock file storage (in production, upload to S3)
-    file_url = f"/storage/{current_user.id}/{file.filename}"
-    
-    # Mock OCR processing
-    ocr_data = {
-        "filename": file.filename,
-        "extracted_text": "[Mock OCR] Document processed successfully",
-        "fields": {
-            "name": "John Doe",
-            "date": "2025-01-15",
-            "amount": "$5,000"
-        }
-    }
-    
     document = Document(
         user_id=current_user.id,
         type=doc_type,
         filename=file.filename,
-        file_url=file_url,
-        ocr_status="completed",
-        ocr_data=ocr_data,
-        confidence_score=0.95
+        file_url=""
     )
+    document.storage_key = f"{current_user.id}/{document.id}/{safe_filename(file.filename)}"
+    document.file_url = document_storage.url_for(document.storage_key)
+    
+    # Copy in fixed-size chunks rather than reading the whole file into memory
+    try:
+        document.size_bytes, document.sha256 = await document_storage.save_stream(
+            document.storage_key, file, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_BYTES
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        await file.close()
+    
+    await db.documents.insert_one(to_document(document))
     
-    doc_dict = document.model_dump()
-    doc_dict['uploaded_at'] = doc_dict['uploaded_at'].isoformat()
-    await db.documents.insert_one(doc_dict)
+    # OCR happens off the request path; clients poll GET /documents/{id} for ocr_status
+    ocr_pool.enqueue(document.id, document.storage_key, doc_type, file.filename)
     
     return document
 
+@api_router.get("/documents/{document_id}")
+async def get_document(document_id: str, current_user: User = Depends(get_current_user)):
+    document = await db.documents.find_one({"id": document_id, "user_id": current_user.id}, DOCUMENT_PUBLIC_PROJECTION)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
 @api_router.get("/documents")
-async def get_documents(current_user: User = Depends(get_current_user)):
-    documents = await db.documents.find({"user_id": current_user.id}, {"_id": 0}).to_list(100)
-    return documents
+async def get_documents(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    projection = parse_fields(fields, Document, ["id", "uploaded_at"]) or DOCUMENT_PUBLIC_PROJECTION
+    return await paginate(db.documents, {"user_id": current_user.id}, "uploaded_at", cursor, limit, projection)
 
 # Guest Chat Route (no authentication required)
 @api_router.post("/chat/guest", response_model=ChatResponse)
-async def send_guest_chat_message(chat_req: ChatRequest):
+async def send_guest_chat_message(chat_req: ChatRequest, request: Request):
     session_id = chat_req.session_id or str(uuid.uuid4())
     
-    # Get AI response (use guest user context)
-    ai_result = await get_ai_response(chat_req.message, session_id, "guest", chat_req.use_primary)
-    
-    # Generate suggestions based on intent
-    suggestions = []
-    if ai_result["intent"] == "getQuote":
-        suggestions = ["Calculate pre-qualification", "View mortgage products", "Start application"]
-    elif ai_result["intent"] == "preQual":
-        suggestions = ["Start pre-qualification", "Upload documents", "Talk to an advisor"]
+    # Serve repeated FAQ questions from cache, otherwise get AI response in the guest scope
+    cacheable, ai_result = await guest_cache_lookup(chat_req, session_id)
+    if ai_result is None:
+        # Only turns that reach the LLM spend the caller's budget
+        await enforce_rate_limit(guest_chat_limiter, client_ip(request))
+        ai_result = await get_ai_response(chat_req.message, session_id, None, chat_req.use_primary, PRIORITY_GUEST)
+        if cacheable:
+            await guest_response_cache.store(ai_result["model"], chat_req.message, ai_result)
     
     return ChatResponse(
         message=ai_result["response"],
         session_id=session_id,
         intent=ai_result["intent"],
-        suggestions=suggestions
+        confidence=ai_result["confidence"],
+        suggestions=suggestions_for_intent(ai_result["intent"]),
+        prompt_tokens=ai_result["prompt_tokens"]
     )
 
+@api_router.post("/chat/guest/stream")
+async def stream_guest_chat_message(chat_req: ChatRequest, request: Request):
+    session_id = chat_req.session_id or str(uuid.uuid4())
+    cacheable, cached = await guest_cache_lookup(chat_req, session_id)
+    if cached is not None:
+        return sse_response(replay_cached_response(cached, session_id))
+    await enforce_rate_limit(guest_chat_limiter, client_ip(request))
+    # Shed here while a 503 is still possible; once streaming starts, errors become SSE events
+    if llm_pool.queue_full(model_for(chat_req.use_primary).provider, PRIORITY_GUEST):
+        raise llm_busy_error()
+    
+    async def remember(response: str, model: str, prompt_tokens: Optional[int]):
+        if cacheable:
+            # Intent and confidence are re-derived from the question on every cache hit
+            await guest_response_cache.store(model, chat_req.message, {"response": response, "model": model})
+    
+    return sse_response(stream_ai_response(chat_req.message, session_id, None, chat_req.use_primary, on_complete=remember, priority=PRIORITY_GUEST))
+
 # Chat Routes
 @api_router.post("/chat/message", response_model=ChatResponse)
 async def send_chat_message(chat_req: ChatRequest, current_user: User = Depends(get_current_user)):
+    await enforce_rate_limit(user_chat_limiter, current_user.id)
     session_id = chat_req.session_id or str(uuid.uuid4())
     
     # Get or create chat session
-    session_doc = await db.chat_sessions.find_one({"session_id": session_id, "user_id": current_user.id}, {"_id": 0})
-    
-    if not session_doc:
-        session = ChatSession(user_id=current_user.id, session_id=session_id)
-        session_dict = session.model_dump()
-        session_dict['created_at'] = session_dict['created_at'].isoformat()
-        session_dict['updated_at'] = session_dict['updated_at'].isoformat()
-        await db.chat_sessions.insert_one(session_dict)
+    await ensure_chat_session(session_id, current_user.id)
     
     # Get AI response
     ai_result = await get_ai_response(chat_req.message, session_id, current_user.id, chat_req.use_primary)
     
     # Save messages
     user_msg = ChatMessage(role="user", content=chat_req.message)
-    assistant_msg = ChatMessage(role="assistant", content=ai_result["response"])
-    
-    await db.chat_sessions.update_one(
-        {"session_id": session_id},
-        {
-            "$push": {
-                "messages": {
-                    "$each": [
-                        {**user_msg.model_dump(), "timestamp": user_msg.timestamp.isoformat()},
-                        {**assistant_msg.model_dump(), "timestamp": assistant_msg.timestamp.isoformat()}
-                    ]
-                }
-            },
-            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
-        }
-    )
-    
-    # Generate suggestions based on intent
-    suggestions = []
-    if ai_result["intent"] == "getQuote":
-        suggestions = ["Calculate pre-qualification", "View mortgage products", "Start application"]
-    elif ai_result["intent"] == "preQual":
-        suggestions = ["Start pre-qualification", "Upload documents", "Talk to an advisor"]
+    assistant_msg = ChatMessage(role="assistant", content=ai_result["response"], prompt_tokens=ai_result["prompt_tokens"])
+    await save_chat_turn(session_id, current_user.id, user_msg, assistant_msg)
     
     return ChatResponse(
         message=ai_result["response"],
         session_id=session_id,
         intent=ai_result["intent"],
-        suggestions=suggestions
+        confidence=ai_result["confidence"],
+        suggestions=suggestions_for_intent(ai_result["intent"]),
+        prompt_tokens=ai_result["prompt_tokens"]
     )
 
+@api_router.post("/chat/message/stream")
+async def stream_chat_message(chat_req: ChatRequest, current_user: User = Depends(get_current_user)):
+    await enforce_rate_limit(user_chat_limiter, current_user.id)
+    session_id = chat_req.session_id or str(uuid.uuid4())
+    await ensure_chat_session(session_id, current_user.id)
+    user_msg = ChatMessage(role="user", content=chat_req.message)
+    
+    async def persist(response: str, model: str, prompt_tokens: Optional[int]):
+        # Written once at stream end rather than per token
+        await save_chat_turn(session_id, current_user.id, user_msg, ChatMessage(role="assistant", content=response, prompt_tokens=prompt_tokens))
+    
+    return sse_response(stream_ai_response(chat_req.message, session_id, current_user.id, chat_req.use_primary, on_complete=persist))
+
 @api_router.get("/chat/history/{session_id}")
-async def get_chat_history(session_id: str, current_user: User = Depends(get_current_user)):
-    session = await db.chat_sessions.find_one({"session_id": session_id, "user_id": current_user.id}, {"_id": 0})
-    if not session:
+async def get_chat_history(
+    session_id: str,
+    before: Optional[int] = Query(None, ge=0),
+    limit: int = Query(CHAT_HISTORY_PAGE_SIZE, ge=1, le=200),
+    current_user: User = Depends(get_current_user)
+):
+    await read_own_writes(chat_turn_writer)
+    # Session metadata plus the embedded array size, without loading the messages themselves
+    sessions = await db.chat_sessions.aggregate([
+        {"$match": {"session_id": session_id, "user_id": current_user.id}},
+        {"$limit": 1},
+        {"$addFields": {"messages_stored": {"$size": {"$ifNull": ["$messages", []]}}}},
+        {"$project": {"_id": 0, "messages": 0, "applied_turn_ids": 0, "last_turn_id": 0}}
+    ]).to_list(1)
+    if not sessions:
         raise HTTPException(status_code=404, detail="Chat session not found")
-    return session
+    session = sessions[0]
+    page = await get_chat_messages_page(session, before, limit)
+    session.pop("messages_stored", None)
+    return {**session, **page}
 
 # Pre-Qualification Routes
 @api_router.post("/prequal/calculate", response_model=PreQualResult)
 async def calculate_prequalification(prequal_data: PreQualRequest, current_user: User = Depends(get_current_user)):
-    # Get user profile for credit score
-    profile_doc = await db.user_profiles.find_one({"user_id": current_user.id})
+    # Get user profile for credit score; it sets the rate tier, so this read has to precede the calculation
+    profile_doc = await db.user_profiles.find_one({"user_id": current_user.id}, {"_id": 0, "credit_score": 1})
     credit_score = profile_doc.get('credit_score') if profile_doc else None
     
     # Calculate pre-qualification
@@ -603,81 +1317,155 @@ async def calculate_prequalification(prequal_data: PreQualRequest, current_user:
         max_loan_amount=result.get('max_loan_amount'),
         estimated_rate=result.get('estimated_rate'),
         monthly_payment=result.get('monthly_payment'),
+        term=prequal_data.term,
         conditions=result.get('conditions', []),
         explanation=result.get('explanation')
     )
     
-    # Save to database
-    result_dict = prequal_result.model_dump()
-    result_dict['created_at'] = result_dict['created_at'].isoformat()
-    await db.prequal_results.insert_one(result_dict)
-    
-    return prequal_result
+    # Save to database; the response is rendered before the _id is set, which a retried insert uses to skip what already landed
+    result_dict = to_document(prequal_result)
+    response = FastJSONResponse(result_dict)
+    result_dict["_id"] = ObjectId()
+    await prequal_writer.submit(result_dict)
+    return response
+
+@api_router.post("/prequal/batch")
+async def calculate_prequalification_batch(batch: PreQualBatchRequest, current_user: User = Depends(get_current_user)):
+    # Scoring only; batch re-scoring of leads is not persisted to prequal_results
+    results = calculate_prequal_batch(batch.requests, batch.credit_score)
+    return {"results": results, "count": len(results)}
+
+@api_router.post("/prequal/whatif")
+async def calculate_prequalification_grid(grid: PreQualWhatIfRequest, current_user: User = Depends(get_current_user)):
+    """Score every loan amount x down payment x credit score x term combination.
+
+    Nothing is persisted; the chosen scenario is saved by posting it to /prequal/calculate.
+    """
+    profile_doc = await db.user_profiles.find_one({"user_id": current_user.id}, {"_id": 0, "credit_score": 1})
+    known_score = (profile_doc or {}).get('credit_score') or 680
+    credit_scores = grid.credit_scores or [known_score]
+    shape = (len(grid.loan_amounts), len(grid.down_payments), len(credit_scores), len(grid.terms))
+    cells = int(np.prod(shape))
+    if cells > PREQUAL_GRID_MAX_CELLS:
+        raise HTTPException(status_code=400, detail=f"Grid has {cells} scenarios; at most {PREQUAL_GRID_MAX_CELLS} are allowed")
+
+    arrays = prequal_arrays(
+        np.array(credit_scores, dtype=np.int64)[None, None, :, None],
+        np.array(grid.loan_amounts, dtype=np.float64)[:, None, None, None],
+        np.array(grid.down_payments, dtype=np.float64)[None, :, None, None],
+        grid.annual_income,
+        grid.monthly_debts,
+        grid.employment_status in ('employed', 'self-employed'),
+        np.array(grid.terms, dtype=np.int64)[None, None, None, :]
+    )
+    # Every column is expanded to the full grid shape so clients can index them alike
+    return {
+        "axes": {
+            "loan_amount": grid.loan_amounts,
+            "down_payment": grid.down_payments,
+            "credit_score": credit_scores,
+            "term": grid.terms
+        },
+        "dti": round(float(arrays["dti"]), 2),
+        "status": np.broadcast_to(arrays["status"], shape).tolist(),
+        "ltv": np.broadcast_to(np.round(arrays["ltv"], 2), shape).tolist(),
+        "estimated_rate": np.broadcast_to(np.round(arrays["estimated_rate"], 3), shape).tolist(),
+        "monthly_payment": np.broadcast_to(np.round(arrays["monthly_payment"], 2), shape).tolist(),
+        "max_loan_amount": np.broadcast_to(np.round(arrays["max_loan_amount"], 2), shape).tolist(),
+        "count": cells
+    }
 
 @api_router.get("/prequal/history")
-async def get_prequal_history(current_user: User = Depends(get_current_user)):
-    results = await db.prequal_results.find({"user_id": current_user.id}, {"_id": 0}).sort("created_at", -1).to_list(10)
-    return results
+async def get_prequal_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=500),
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    projection = parse_fields(fields, PreQualResult, ["id", "created_at"])
+    await read_own_writes(prequal_writer)
+    return await paginate(db.prequal_results, {"user_id": current_user.id}, "created_at", cursor, limit, projection)
 
 # Product Routes
+product_catalog = ProductCatalog(lambda: db.mortgage_products, MortgageProduct, PRODUCT_CATALOG_TTL_SECONDS, backend=cache_backend)
+
+_product_index: Optional[ProductIndex] = None
+_product_index_snapshot: Optional[CatalogSnapshot] = None
+
+async def get_product_index() -> ProductIndex:
+    """Eligibility index for the current catalog snapshot, rebuilt whenever a new snapshot is loaded"""
+    global _product_index, _product_index_snapshot
+    snapshot = await product_catalog.snapshot()
+    # Identity rather than version, so any reload (TTL, change stream, broadcast invalidation) rebuilds it
+    if _product_index is None or _product_index_snapshot is not snapshot:
+        _product_index = ProductIndex(snapshot.products, snapshot.version)
+        _product_index_snapshot = snapshot
+    return _product_index
+
+@api_router.get("/products/match")
+async def match_products(
+    rank_by: str = Query("monthly_payment", pattern="^(" + "|".join(RANK_KEYS) + ")$"),
+    limit: int = Query(20, ge=1, le=200),
+    current_user: User = Depends(get_current_user)
+):
+    await read_own_writes(prequal_writer)
+    latest = await db.prequal_results.find(
+        {"user_id": current_user.id},
+        {"_id": 0, "id": 1, "loan_amount": 1, "down_payment": 1, "credit_score": 1, "status": 1}
+    ).sort([("created_at", -1), ("id", -1)]).to_list(1)
+    if not latest:
+        raise HTTPException(status_code=404, detail="No pre-qualification found; calculate one first")
+    prequal = latest[0]
+    
+    # Same default score calculate_prequal assumes when none is known
+    credit_score = prequal.get("credit_score") or 680
+    index = await get_product_index()
+    result = index.match(credit_score, prequal["loan_amount"], prequal["down_payment"], rank_by, limit)
+    return {
+        "prequal_id": prequal["id"],
+        "prequal_status": prequal["status"],
+        "credit_score": credit_score,
+        "loan_amount": prequal["loan_amount"],
+        "down_payment": prequal["down_payment"],
+        "rank_by": rank_by,
+        **result
+    }
+
 @api_router.get("/products")
-async def get_products():
-    # Mock products (in production, fetch from database)
-    products = [
-        {
-            "id": str(uuid.uuid4()),
-            "lender_name": "Prime Lending",
-            "loan_type": "fixed",
-            "rate": 5.75,
-            "apr": 5.95,
-            "term": 360,
-            "fees": 2500,
-            "min_credit_score": 700,
-            "min_down_payment": 0.20,
-            "max_loan_amount": 1000000,
-            "features": ["No prepayment penalty", "Rate lock for 60 days", "Free appraisal"]
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "lender_name": "Community Bank",
-            "loan_type": "fixed",
-            "rate": 6.00,
-            "apr": 6.15,
-            "term": 360,
-            "fees": 1800,
-            "min_credit_score": 680,
-            "min_down_payment": 0.15,
-            "max_loan_amount": 750000,
-            "features": ["Low closing costs", "First-time buyer programs", "Flexible documentation"]
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "lender_name": "Digital Mortgage Co",
-            "loan_type": "variable",
-            "rate": 5.25,
-            "apr": 5.60,
-            "term": 360,
-            "fees": 2000,
-            "min_credit_score": 720,
-            "min_down_payment": 0.20,
-            "max_loan_amount": 1500000,
-            "features": ["Fully digital process", "Fast approval", "Mobile app included"]
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "lender_name": "First Home Finance",
-            "loan_type": "fixed",
-            "rate": 6.25,
-            "apr": 6.40,
-            "term": 180,
-            "fees": 1500,
-            "min_credit_score": 660,
-            "min_down_payment": 0.10,
-            "max_loan_amount": 500000,
-            "features": ["15-year term", "Lower total interest", "Faster equity building"]
-        }
-    ]
-    return products
+async def get_products(loan_amount: Optional[float] = None, if_none_match: Optional[str] = Header(None)):
+    snapshot = await product_catalog.snapshot()
+    
+    # Quote each product's monthly payment when the caller supplies a loan amount
+    if loan_amount is not None:
+        products = [dict(product) for product in snapshot.products]
+        for product in products:
+            product["monthly_payment"] = round(
+                payment_math.monthly_payment(loan_amount, product["rate"], product["term"]), 2
+            )
+        return products
+    
+    # Unquoted catalog is served pre-serialized with ETag revalidation
+    headers = {"ETag": snapshot.etag, "Cache-Control": f"public, max-age={PRODUCT_CATALOG_MAX_AGE}"}
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+# Amortization Routes
+@api_router.post("/amortization/export")
+async def export_amortization(
+    export_req: AmortizationExportRequest,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
+    loans = [loan.model_dump() for loan in export_req.loans]
+    # Sync generators run in Starlette's threadpool, keeping schedule math off the event loop
+    if format == "ndjson":
+        return StreamingResponse(amortization.ndjson_stream(loans, AMORTIZATION_CHUNK_LOANS), media_type="application/x-ndjson")
+    return StreamingResponse(
+        amortization.csv_stream(loans, AMORTIZATION_CHUNK_LOANS),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="amortization.csv"'}
+    )
 
 # Application Routes
 @api_router.post("/applications", response_model=Application)
@@ -692,16 +1480,21 @@ async def create_application(app_data: ApplicationCreate, current_user: User = D
         purpose=app_data.purpose
     )
     
-    app_dict = application.model_dump()
-    app_dict['updated_at'] = app_dict['updated_at'].isoformat()
+    app_dict = to_document(application)
+    # Render before the insert adds Mongo's _id to the dict
+    response = FastJSONResponse(app_dict)
     await db.applications.insert_one(app_dict)
-    
-    return application
+    return response
 
 @api_router.get("/applications")
-async def get_applications(current_user: User = Depends(get_current_user)):
-    applications = await db.applications.find({"user_id": current_user.id}, {"_id": 0}).sort("updated_at", -1).to_list(50)
-    return applications
+async def get_applications(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    projection = parse_fields(fields, Application, ["id", "updated_at"])
+    return await paginate(db.applications, {"user_id": current_user.id}, "updated_at", cursor, limit, projection)
 
 @api_router.get("/applications/{application_id}")
 async def get_application(application_id: str, current_user: User = Depends(get_current_user)):
@@ -729,6 +1522,70 @@ async def submit_application(application_id: str, current_user: User = Depends(g
     application = await db.applications.find_one({"id": application_id}, {"_id": 0})
     return application
 
+def collect_queue_depths():
+    yield {"queue": "write_behind_chat_turns"}, chat_turn_writer.queue_depth
+    yield {"queue": "write_behind_prequal_results"}, prequal_writer.queue_depth
+    yield {"queue": "ocr"}, ocr_pool.stats()["queue_depth"]
+    yield {"queue": "bcrypt"}, password_pool.queue_depth
+    for provider, slots in llm_pool.stats()["slots"].items():
+        yield {"queue": f"llm_{provider}"}, sum(slots["waiting"].values())
+
+metrics.register(metrics.Collector("queue_depth", "Items waiting in background queues", "gauge", ("queue",), collect_queue_depths))
+
+def collect_rate_limits():
+    for limiter in (guest_chat_limiter, user_chat_limiter):
+        yield {"limiter": limiter.name, "result": "allowed"}, limiter.allowed
+        yield {"limiter": limiter.name, "result": "limited"}, limiter.limited
+
+metrics.register(metrics.Collector("rate_limit_decisions_total", "Token-bucket decisions by limiter and result", "counter", ("limiter", "result"), collect_rate_limits))
+
+def collect_llm_breakers():
+    for provider, breaker in llm_dispatcher.breakers.items():
+        for state in BREAKER_STATES:
+            yield {"provider": provider, "state": state}, int(breaker.state == state)
+
+metrics.register(metrics.Collector("llm_circuit_state", "1 for each provider's current circuit breaker state", "gauge", ("provider", "state"), collect_llm_breakers))
+
+def collect_llm_dispatch_events():
+    for (provider, event), count in llm_dispatcher.events.items():
+        yield {"provider": provider, "event": event}, count
+
+metrics.register(metrics.Collector("llm_dispatch_events_total", "Failovers, hedges and circuit-open skips by the provider that took or skipped the call", "counter", ("provider", "event"), collect_llm_dispatch_events))
+
+def collect_cache_lookups():
+    for name, stats in {**all_cache_stats(), "users": user_cache.stats(), "guest_chat": guest_response_cache.stats()}.items():
+        yield {"cache": name, "result": "hit"}, stats["hits"]
+        yield {"cache": name, "result": "miss"}, stats["misses"]
+        if "shared_hits" in stats:
+            yield {"cache": name, "result": "shared_hit"}, stats["shared_hits"]
+        if "similar_hits" in stats:
+            yield {"cache": name, "result": "similar_hit"}, stats["similar_hits"]
+
+metrics.register(metrics.Collector("cache_lookups_total", "Cache lookups by result", "counter", ("cache", "result"), collect_cache_lookups))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    # Outside /api, so only reachable on the backend port rather than through the public ingress
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats/cache", include_in_schema=False)
+async def get_cache_stats():
+    # Next to /metrics for the same reason: pool, breaker and limiter internals stay off the public ingress
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "caches": {**all_cache_stats(), "users": user_cache.stats(), "guest_chat": guest_response_cache.stats()},
+        "cache_backend": cache_backend.stats(),
+        "rate_limits": {"guest_chat": guest_chat_limiter.stats(), "user_chat": user_chat_limiter.stats()},
+        "auth": auth_stats,
+        "pools": {"bcrypt": password_pool.stats(), "llm": llm_pool.stats(), "ocr": ocr_pool.stats()},
+        "llm_dispatch": llm_dispatcher.stats(),
+        "write_behind": {"chat_turns": chat_turn_writer.stats(), "prequal_results": prequal_writer.stats()},
+        "products": product_catalog.stats()
+    }
+
 # Include router
 app.include_router(api_router)
 
@@ -738,14 +1595,70 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+if METRICS_ENABLED:
+    # Added last so it is outermost and times CORS handling too
+    app.add_middleware(metrics.RequestTimingMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def bootstrap_indexes():
+    try:
+        if DB_ENSURE_INDEXES:
+            await ensure_indexes(db)
+        if DB_QUERY_AUDIT:
+            log_audit(await audit_query_plans(db))
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_cache_backend():
+    await cache_backend.start()
+
+@app.on_event("startup")
+async def load_product_catalog():
+    try:
+        await product_catalog.seed()
+        await product_catalog.snapshot()
+        product_catalog.start_watching()
+    except Exception as e:
+        logger.error(f"Product catalog preload failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_ocr_workers():
+    ocr_pool.start()
+    # Pick up documents left pending by a previous shutdown or a full queue.
+    # Every worker process queues them; the claim lets only one run each job.
+    try:
+        pending = await db.documents.find(
+            {"ocr_status": {"$in": ["pending", "processing"]}, "storage_key": {"$ne": None}},
+            {"_id": 0, "id": 1, "storage_key": 1, "type": 1, "filename": 1}
+        ).to_list(OCR_MAX_QUEUE)
+        for doc in pending:
+            ocr_pool.enqueue(doc["id"], doc["storage_key"], doc["type"], doc["filename"])
+    except Exception as e:
+        logger.error(f"Could not requeue pending OCR jobs: {str(e)}")
+
+@app.on_event("startup")
+async def start_write_behind():
+    chat_turn_writer.start()
+    prequal_writer.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    # Flush buffered writes while the client is still open
+    await asyncio.gather(chat_turn_writer.stop(), prequal_writer.stop())
+    await ocr_pool.stop()
+    await product_catalog.stop()
+    await cache_backend.stop()
+    await rate_limit_store.close()
+    client.close()
+    password_pool.shutdown()
+    await llm_pool.aclose()
@@ -0,0 +1,244 @@
+"""Cross-process cache tier for multi-worker serving.
+
+Each worker keeps its in-process caches (caching.StatsTTLCache) as the first
+tier. SharedCache puts a store shared by all workers behind one of them:
+- A local miss falls through to the store, and a hit there is copied back locally.
+- Writes go to both tiers.
+- Invalidations delete the shared entry and are published on a channel that
+  every worker subscribes to, so each worker drops its local copy.
+
+CACHE_BACKEND=redis uses Redis, or anything that speaks its protocol. The
+default "local" backend shares nothing, which is the single-process behavior.
+Shared-store errors are logged and treated as misses, so an unreachable Redis
+slows requests down but never fails them.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from caching import StatsTTLCache
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ("local", "redis")
+
+# Called with the entry's key text, or None after a resubscribe when messages may have been missed
+InvalidationHandler = Callable[[Optional[str]], None]
+
+
+def key_text(key: Hashable) -> str:
+    """Stable string form of a cache key; tuple keys (e.g. guest chat) round-trip through JSON"""
+    return key if isinstance(key, str) else dumps(list(key)).decode()
+
+
+def parse_key(text: str) -> Hashable:
+    return tuple(loads(text)) if text.startswith("[") else text
+
+
+class LocalCacheBackend:
+    """No shared tier: every worker process caches on its own"""
+    name = "local"
+    shared = False
+
+    def subscribe(self, namespace: str, handler: InvalidationHandler):
+        pass
+
+    async def start(self):
+        pass
+
+    async def get(self, namespace: str, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: float):
+        pass
+
+    async def delete(self, namespace: str, key: str):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "pid": os.getpid()}
+
+
+class RedisCacheBackend:
+    """Shared tier in Redis: entries under "<prefix>:<namespace>:<key>", invalidations on "<prefix>:invalidate" """
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str, reconnect_delay: float = 1.0):
+        import redis.asyncio as aioredis
+
+        self.url = url
+        self.prefix = prefix
+        self.channel = f"{prefix}:invalidate"
+        self.reconnect_delay = reconnect_delay
+        self._redis = aioredis.from_url(url)
+        self._handlers: Dict[str, InvalidationHandler] = {}
+        self._listen_task: Optional[asyncio.Task] = None
+        self.subscribed = False
+        self.subscriptions = 0
+        self.errors = 0
+        self.invalidations_received = 0
+
+    def subscribe(self, namespace: str, handler: InvalidationHandler):
+        self._handlers[namespace] = handler
+
+    async def start(self):
+        if self._listen_task is None:
+            self._listen_task = asyncio.create_task(self._listen())
+
+    def _error(self, action: str, e: Exception):
+        self.errors += 1
+        logger.warning(f"Shared cache {action} failed: {str(e)}")
+
+    async def get(self, namespace: str, key: str) -> Optional[bytes]:
+        try:
+            return await self._redis.get(f"{self.prefix}:{namespace}:{key}")
+        except Exception as e:
+            self._error("get", e)
+            return None
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: float):
+        try:
+            await self._redis.set(f"{self.prefix}:{namespace}:{key}", value, px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            self._error("set", e)
+
+    async def delete(self, namespace: str, key: str):
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.delete(f"{self.prefix}:{namespace}:{key}")
+                pipe.publish(self.channel, f"{namespace}:{key}")
+                await pipe.execute()
+        except Exception as e:
+            self._error("invalidate", e)
+
+    def _dispatch(self, message: Optional[str]):
+        if message is None:
+            for handler in self._handlers.values():
+                handler(None)
+            return
+        namespace, _, key = message.partition(":")
+        handler = self._handlers.get(namespace)
+        if handler is not None:
+            self.invalidations_received += 1
+            handler(key)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                if self.subscriptions:
+                    # Invalidations published while we were disconnected are lost, so start clean
+                    self._dispatch(None)
+                self.subscriptions += 1
+                self.subscribed = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        data = message["data"]
+                        self._dispatch(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._error("subscription", e)
+            finally:
+                self.subscribed = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def stop(self):
+        if self._listen_task is not None:
+            self._listen_task.cancel()
+            await asyncio.gather(self._listen_task, return_exceptions=True)
+            self._listen_task = None
+        await self._redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "pid": os.getpid(),
+            "subscribed": self.subscribed,
+            "resubscribes": max(0, self.subscriptions - 1),
+            "errors": self.errors,
+            "invalidations_received": self.invalidations_received
+        }
+
+
+def make_backend(kind: str, redis_url: str, prefix: str):
+    if kind not in CACHE_BACKENDS:
+        raise ValueError(f"CACHE_BACKEND must be one of {CACHE_BACKENDS}, got {kind!r}")
+    if kind == "redis":
+        return RedisCacheBackend(redis_url, prefix)
+    return LocalCacheBackend()
+
+
+class SharedCache:
+    """A StatsTTLCache with the backend's shared store behind it; values are JSON-encoded on the way out"""
+
+    def __init__(
+        self,
+        local: StatsTTLCache,
+        backend,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value
+    ):
+        self.local = local
+        self.name = local.name
+        self.backend = backend
+        self.encode = encode
+        self.decode = decode
+        self.shared_hits = 0
+        self.shared_misses = 0
+        backend.subscribe(self.name, self._on_invalidate)
+
+    def _on_invalidate(self, text: Optional[str]):
+        if text is None:
+            self.local.clear()
+        else:
+            self.local.invalidate(parse_key(text))
+
+    async def get(self, key: Hashable) -> Any:
+        value = self.local.get(key)
+        if value is not None or not self.backend.shared:
+            return value
+        raw = await self.backend.get(self.name, key_text(key))
+        if raw is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        value = self.decode(loads(raw))
+        self.local.set(key, value)
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        return self.local.peek(key)
+
+    async def set(self, key: Hashable, value: Any):
+        self.local.set(key, value)
+        if self.backend.shared:
+            await self.backend.set(self.name, key_text(key), dumps(self.encode(value)), self.local.ttl)
+
+    async def invalidate(self, key: Hashable):
+        self.local.invalidate(key)
+        if self.backend.shared:
+            await self.backend.delete(self.name, key_text(key))
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.local.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["shared_hits"] = self.shared_hits
+        stats["shared_misses"] = self.shared_misses
+        # A shared hit first misses locally, so count it toward the rate a request actually sees
+        stats["effective_hit_rate"] = round((stats["hits"] + self.shared_hits) / lookups, 4) if lookups else 0.0
+        return stats
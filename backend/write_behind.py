@@ -0,0 +1,180 @@
+"""Write-behind buffering for append-only records.
+
+Handlers submit records and return without waiting on the database. A
+background task hands pending records to a batch writer (insert_many /
+bulk_write) when max_batch records are waiting or every flush_interval
+seconds, and stop() flushes whatever is left. With durability "sync" each
+record is written before submit() returns, as if there were no buffer.
+
+A failed batch stays at the front of the queue and is retried with
+exponential backoff (flush_interval doubling up to max_backoff). It is dropped
+only once it has kept failing for retry_timeout seconds. A retried batch may
+already be partly written, so batch writers must be idempotent: give records
+their _id (and any sequence numbers) before they are submitted, and treat
+duplicate keys as already written (see insert_idempotent).
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("batched", "sync")
+DUPLICATE_KEY = 11000
+
+BatchWriter = Callable[[List[Any]], Awaitable[None]]
+
+
+async def insert_idempotent(collection, docs: List[dict]):
+    """insert_many where documents already present (duplicate key) count as written, so a replayed batch is safe"""
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if e.details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+
+
+class WriteBehindBuffer:
+    def __init__(
+        self,
+        name: str,
+        write_batch: BatchWriter,
+        durability: str = "batched",
+        max_batch: int = 200,
+        flush_interval: float = 0.05,
+        max_queue: int = 10000,
+        retry_timeout: float = 120.0,
+        max_backoff: float = 5.0
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}, got {durability!r}")
+        self.name = name
+        self.write_batch = write_batch
+        self.durability = durability
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.retry_timeout = retry_timeout
+        self.max_backoff = max_backoff
+        self._pending: List[Any] = []
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Set while the batch at the front keeps failing
+        self._failing_since: Optional[float] = None
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failures = 0
+        self.backpressure = 0
+
+    def start(self):
+        if self.durability == "batched" and self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, record: Any):
+        if self.durability == "sync" or self._task is None:
+            await self.write_batch([record])
+            self.written += 1
+            self.batches += 1
+            return
+        if len(self._pending) >= self.max_queue:
+            # Queue is full: this caller waits for a flush instead of growing memory without bound
+            self.backpressure += 1
+            await self.flush()
+        self._pending.append(record)
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def _retry_delay(self) -> float:
+        """Seconds until the next attempt is due; 0 unless backing off after a failure"""
+        if self._failing_since is None:
+            return 0.0
+        return max(0.0, self._retry_at - time.monotonic())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._retry_delay() or self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping or self._retry_delay() > 0:
+                # A full batch does not cut a backoff short
+                continue
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Write-behind flush for {self.name} failed: {str(e)}")
+
+    async def flush(self):
+        """Write everything pending; also used to read back writes that may still be buffered"""
+        async with self._lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:len(batch)]
+                try:
+                    await self.write_batch(batch)
+                except Exception as e:
+                    now = time.monotonic()
+                    self.failures += 1
+                    if self._failing_since is None:
+                        self._failing_since = now
+                        self._backoff = self.flush_interval
+                    else:
+                        self._backoff = min(self.max_backoff, self._backoff * 2)
+                    if now - self._failing_since < self.retry_timeout:
+                        # Put the batch back in front so record order is kept, and retry after the backoff
+                        self._pending[:0] = batch
+                        self._retry_at = now + self._backoff
+                        raise
+                    self._failing_since = None
+                    self.dropped += len(batch)
+                    logger.error(f"Write-behind {self.name} dropped {len(batch)} records after failing for {self.retry_timeout:.0f}s: {str(e)}")
+                    continue
+                self._failing_since = None
+                self.written += len(batch)
+                self.batches += 1
+
+    async def stop(self):
+        if self._task is not None:
+            # Ask the loop to exit rather than cancelling it: wait_for can swallow a
+            # cancel that races its timeout, which left stop() waiting forever
+            self._stopping = True
+            self._wake.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Final flush on shutdown; retry with backoff until written or dropped
+        while self._pending:
+            await asyncio.sleep(self._retry_delay())
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush for {self.name} failed at shutdown: {str(e)}")
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "durability": self.durability,
+            "queue_depth": self.queue_depth,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "failing_seconds": round(time.monotonic() - self._failing_since, 3) if self._failing_since is not None else 0.0,
+            "backpressure": self.backpressure
+        }
@@ -45,6 +45,39 @@ export const chatAPI = {
     const response = await axios.get(`${API}/chat/history/${sessionId}`);
     return response.data;
   },
+  // Streams a reply over SSE: onToken(text) per chunk, resolves with the trailing done event
+  streamMessage: async (message, { sessionId = null, usePrimary = true, guest = false, onToken } = {}) => {
+    const headers = { 'Content-Type': 'application/json' };
+    const auth = axios.defaults.headers.common['Authorization'];
+    if (auth && !guest) headers['Authorization'] = auth;
+
+    const response = await fetch(`${API}/chat/${guest ? 'guest' : 'message'}/stream`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({ message, session_id: sessionId, use_primary: usePrimary }),
+    });
+    if (!response.ok) throw new Error(`Chat stream failed: ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let done = null;
+    for (;;) {
+      const { value, done: finished } = await reader.read();
+      if (finished) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+        if (event === 'token') onToken?.(data.text);
+        else if (event === 'done') done = data;
+        else if (event === 'error') throw new Error(data.detail);
+      }
+    }
+    return done;
+  },
 };
 
 // Pre-Qualification API
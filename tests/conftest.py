@@ -0,0 +1,41 @@
+"""Backend modules import each other by bare name (`import metrics`), as uvicorn runs them from backend/."""
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret')
+
+
+@pytest.fixture
+def anyio_backend():
+    # The backend is built on asyncio (Motor, asyncio tasks and locks)
+    return "asyncio"
+
+
+class FakeClock:
+    """Stands in for a module's `time`; monotonic() only moves when a test advances `now`"""
+
+    perf_counter = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Installs a FakeClock as `module.time` and returns it: `clock = fake_clock(rate_limit)`"""
+    def install(module) -> FakeClock:
+        clock = FakeClock()
+        monkeypatch.setattr(module, "time", clock)
+        return clock
+    return install
@@ -0,0 +1,53 @@
+import pytest
+
+import server
+from chat_context import SUMMARY_PREFIX, ContextManager
+
+
+def turns(count: int):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}. More detail follows here."}
+        for i in range(count)
+    ]
+
+
+class FailingPool:
+    def __init__(self):
+        self.sends = []
+        self.dropped = []
+
+    async def send(self, spec, user_id, session_id, text, priority, timeout=None):
+        self.sends.append((spec.provider, user_id, priority, timeout))
+        raise ConnectionError("upstream down")
+
+    def drop_session(self, user_id, session_id):
+        self.dropped.append(user_id)
+
+
+@pytest.mark.anyio
+async def test_llm_summary_failures_stay_out_of_breaker_and_latency(monkeypatch):
+    pool = FailingPool()
+    monkeypatch.setattr(server, "llm_pool", pool)
+    context = ContextManager(window_turns=2, summarizer=server.summarize_chat_context)
+    messages = [{"role": "system", "content": "system"}, *turns(6)]
+    for _ in range(server.LLM_BREAKER_FAILURES + 1):
+        await context.compact(messages)
+        messages.extend(turns(6))
+    assert context.summary_errors == server.LLM_BREAKER_FAILURES + 1
+    # Fell back to the extractive summary
+    assert messages[1]["content"].startswith(SUMMARY_PREFIX + "User: Message 0.")
+    assert pool.sends[0] == ("anthropic", server.CONTEXT_SUMMARY_OWNER, server.PRIORITY_GUEST, server.LLM_ANTHROPIC_TIMEOUT_SECONDS)
+    assert pool.dropped == [server.CONTEXT_SUMMARY_OWNER] * len(pool.sends)
+    dispatch = server.llm_dispatcher.stats()["providers"]
+    assert "anthropic" not in dispatch or dispatch["anthropic"]["consecutive_failures"] == 0
+    assert server.llm_dispatcher.hedge_delay("anthropic") == server.llm_dispatcher.hedge_default_delay
+
+
+@pytest.mark.anyio
+async def test_compaction_keeps_the_newest_half_window():
+    context = ContextManager(window_turns=4)
+    messages = [{"role": "system", "content": "system"}, *turns(10)]
+    assert await context.compact(messages)
+    assert messages[1]["content"].startswith(SUMMARY_PREFIX)
+    assert [m["content"] for m in messages[2:]] == [t["content"] for t in turns(10)[6:]]
+    assert not await context.compact(messages)
@@ -0,0 +1,38 @@
+from benchmarks.bench_intent import SAMPLE_MESSAGES, legacy_detect_intent
+from intent_classifier import IntentClassifier, classify_intent
+
+
+def test_winner_matches_legacy_scans():
+    for message in SAMPLE_MESSAGES:
+        assert classify_intent(message).intent == legacy_detect_intent(message), message
+
+
+def test_no_keywords():
+    assert classify_intent("hi") == (None, None, [])
+
+
+def test_ranked_by_confidence():
+    # Two getQuote keywords against three requestHuman ones
+    match = classify_intent("What rate would a human agent in person quote?")
+    assert match.intent == "getQuote"
+    assert [intent for intent, _ in match.ranked] == ["requestHuman", "getQuote"]
+    scores = [score for _, score in match.ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert dict(match.ranked)["getQuote"] == match.confidence
+
+
+def test_ties_rank_by_priority():
+    match = classify_intent("can I apply to talk")
+    assert match.ranked == [("startApplication", 0.35), ("requestHuman", 0.35)]
+
+
+def test_prefix_keyword_counts_only_on_its_own():
+    classifier = IntentClassifier((("uploadDoc", ("doc", "document")),))
+    assert classifier.classify("my documents").confidence == 0.7
+    assert classifier.classify("my documents and a doc").confidence == 0.85
+
+
+def test_ranked_is_not_shared_between_calls():
+    first = classify_intent("what rate")
+    first.ranked.clear()
+    assert classify_intent("what rate").ranked
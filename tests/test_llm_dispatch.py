@@ -0,0 +1,221 @@
+import asyncio
+
+import pytest
+
+import llm_dispatch
+from llm_dispatch import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitBreaker, LatencyWindow, LlmDispatcher, LlmUnavailable
+from llm_pool import PRIMARY_MODEL, SECONDARY_MODEL
+from worker_pool import PoolSaturated
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(llm_dispatch)
+
+
+class FakePool:
+    """Stands in for LlmClientPool; each provider answers, fails or stalls as set in `behaviour`"""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.calls = {"anthropic": 0, "openai": 0}
+        self.synced = []
+        self.recorded = []
+
+    async def _act(self, provider: str):
+        self.calls[provider] += 1
+        action = self.behaviour.get(provider, "ok")
+        if action == "error":
+            raise ConnectionError(f"{provider} down")
+        if action == "shed":
+            raise PoolSaturated("no slots")
+        if isinstance(action, float):
+            await asyncio.sleep(action)
+
+    async def send(self, spec, user_id, session_id, text, priority, timeout=None):
+        await asyncio.wait_for(self._act(spec.provider), timeout)
+        return f"{spec.provider}: {text}"
+
+    async def stream(self, spec, user_id, session_id, text, priority, chunk_timeout=None):
+        await self._act(spec.provider)
+        for word in ("hello", "there"):
+            yield word
+            if self.behaviour.get(f"{spec.provider}_breaks"):
+                raise ConnectionError("stream cut")
+
+    def sync_session(self, source, target, user_id, session_id):
+        self.synced.append((source.provider, target.provider, user_id, session_id))
+
+    def record_turn(self, spec, user_id, session_id, text, reply):
+        self.recorded.append((spec.provider, user_id, session_id, reply))
+
+    def last_prompt_tokens(self, spec, user_id, session_id):
+        return None
+
+
+def dispatcher(pool: FakePool, **kwargs) -> LlmDispatcher:
+    return LlmDispatcher(lambda: pool, **{"failure_threshold": 2, "reset_seconds": 10, **kwargs})
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == BREAKER_CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == pytest.approx(10)
+    assert breaker.times_opened == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+    assert breaker.times_opened == 2
+
+
+def test_abandoned_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_abandoned()
+    assert breaker.allow()
+
+
+def test_breaker_rejects_zero_threshold():
+    with pytest.raises(ValueError):
+        CircuitBreaker(failure_threshold=0)
+
+
+def test_latency_window_quantile():
+    window = LatencyWindow(size=100, min_samples=10)
+    for i in range(9):
+        window.add(i / 100)
+    assert window.quantile(0.95) is None
+    for i in range(9, 100):
+        window.add(i / 100)
+    assert window.quantile(0.95) == pytest.approx(0.95)
+    # Only the newest `size` samples count
+    for _ in range(100):
+        window.add(2.0)
+    assert window.quantile(0.5) == 2.0
+
+
+@pytest.mark.anyio
+async def test_send_fails_over_and_keeps_the_preferred_session_whole(clock):
+    pool = FakePool(anthropic="error")
+    dispatch = dispatcher(pool)
+    reply, answered_by = await dispatch.send(PRIMARY_MODEL, "user-1", "s1", "hi")
+    assert (reply, answered_by) == ("openai: hi", SECONDARY_MODEL)
+    assert pool.synced == [("anthropic", "openai", "user-1", "s1")]
+    assert pool.recorded == [("anthropic", "user-1", "s1", "openai: hi")]
+    assert dispatch.events[("openai", "failover")] == 1
+
+
+@pytest.mark.anyio
+async def test_open_breaker_skips_the_provider_until_a_probe_succeeds(clock):
+    pool = FakePool(anthropic="error")
+    dispatch = dispatcher(pool)
+    for _ in range(4):
+        await dispatch.send(PRIMARY_MODEL, None, "s1", "hi")
+    assert pool.calls["anthropic"] == 2
+    assert dispatch.breaker("anthropic").state == BREAKER_OPEN
+    pool.behaviour = {}
+    clock.now += 10
+    _, answered_by = await dispatch.send(PRIMARY_MODEL, None, "s1", "hi")
+    assert answered_by is PRIMARY_MODEL
+    assert dispatch.breaker("anthropic").state == BREAKER_CLOSED
+
+
+@pytest.mark.anyio
+async def test_shed_is_not_a_provider_failure(clock):
+    pool = FakePool(anthropic="shed")
+    dispatch = dispatcher(pool)
+    with pytest.raises(PoolSaturated):
+        await dispatch.send(PRIMARY_MODEL, None, "s1", "hi")
+    assert dispatch.breaker("anthropic").consecutive_failures == 0
+    assert pool.calls["openai"] == 0
+
+
+@pytest.mark.anyio
+async def test_unavailable_when_every_provider_fails(clock):
+    dispatch = dispatcher(FakePool(anthropic="error", openai="error"))
+    with pytest.raises(LlmUnavailable, match="anthropic: anthropic down; openai: openai down"):
+        await dispatch.send(PRIMARY_MODEL, None, "s1", "hi")
+
+
+@pytest.mark.anyio
+async def test_timeout_counts_as_a_failure(clock):
+    pool = FakePool(anthropic=1.0)
+    dispatch = dispatcher(pool, timeouts={"anthropic": 0.01})
+    _, answered_by = await dispatch.send(PRIMARY_MODEL, None, "s1", "hi")
+    assert answered_by is SECONDARY_MODEL
+    assert dispatch.breaker("anthropic").consecutive_failures == 1
+
+
+@pytest.mark.anyio
+async def test_without_failover_the_error_is_reported(clock):
+    pool = FakePool(anthropic="error")
+    with pytest.raises(LlmUnavailable):
+        await dispatcher(pool, failover=False).send(PRIMARY_MODEL, None, "s1", "hi")
+    assert pool.calls["openai"] == 0
+
+
+@pytest.mark.anyio
+async def test_hedge_answers_from_the_backup_when_the_preferred_is_slow(clock):
+    pool = FakePool(anthropic=1.0)
+    dispatch = dispatcher(pool, hedge=True, hedge_default_delay=0.01)
+    _, answered_by = await dispatch.send(PRIMARY_MODEL, "user-1", "s1", "hi")
+    assert answered_by is SECONDARY_MODEL
+    assert dispatch.events[("openai", "hedge_won")] == 1
+    # The slow call was cancelled, which is not held against the provider
+    assert dispatch.breaker("anthropic").consecutive_failures == 0
+
+
+@pytest.mark.anyio
+async def test_stream_fails_over_before_the_first_token(clock):
+    pool = FakePool(anthropic="error")
+    chunks = [chunk async for chunk in dispatcher(pool).stream(PRIMARY_MODEL, None, "s1", "hi")]
+    assert chunks == [(SECONDARY_MODEL, "hello"), (SECONDARY_MODEL, "there")]
+    assert pool.recorded == [("anthropic", None, "s1", "hellothere")]
+
+
+@pytest.mark.anyio
+async def test_stream_broken_after_the_first_token_is_raised(clock):
+    pool = FakePool(anthropic_breaks=True)
+    dispatch = dispatcher(pool)
+    chunks = []
+    with pytest.raises(ConnectionError):
+        async for chunk in dispatch.stream(PRIMARY_MODEL, None, "s1", "hi"):
+            chunks.append(chunk)
+    assert chunks == [(PRIMARY_MODEL, "hello")]
+    assert pool.calls["openai"] == 0
+    assert dispatch.breaker("anthropic").consecutive_failures == 1
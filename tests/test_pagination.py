@@ -0,0 +1,65 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from server import decode_cursor, encode_cursor, paginate
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("sort_value", ["2025-01-02T03:04:05+00:00", 42, 1.5])
+def test_cursor_round_trip(sort_value):
+    assert decode_cursor(encode_cursor(sort_value, "doc-1")) == (sort_value, "doc-1")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 json",
+    raw_cursor("just a string"),
+    raw_cursor([1, 2, 3]),
+    raw_cursor([{"$ne": None}, "doc-1"]),
+    raw_cursor(["2025-01-01", {"$gt": ""}]),
+    raw_cursor([["2025-01-01"], "doc-1"]),
+    raw_cursor([None, "doc-1"]),
+    raw_cursor([True, "doc-1"]),
+    raw_cursor(["2025-01-01", 7])
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_paginate_walks_every_document_once():
+    collection = AsyncMongoMockClient()["test"]["items"]
+    # Repeated sort values are split by id
+    await collection.insert_many([
+        {"id": f"doc-{i:02d}", "owner": "a", "created_at": f"2025-01-{i // 3 + 1:02d}"} for i in range(10)
+    ] + [{"id": "other", "owner": "b", "created_at": "2025-01-01"}])
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = await paginate(collection, {"owner": "a"}, "created_at", cursor, 3)
+        page = json.loads(response.body)
+        seen += [doc["id"] for doc in page]
+        pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == sorted((f"doc-{i:02d}" for i in range(10)), reverse=True)
+    assert pages == 4
+
+
+@pytest.mark.anyio
+async def test_paginate_projection_keeps_id_and_drops_mongo_id():
+    collection = AsyncMongoMockClient()["test"]["items"]
+    await collection.insert_one({"id": "doc-1", "created_at": "2025-01-01", "status": "open", "secret": "x"})
+    projection = server.parse_fields("status", server.Application, ["id", "created_at"])
+    response = await paginate(collection, {}, "created_at", None, 10, projection)
+    assert json.loads(response.body) == [{"id": "doc-1", "created_at": "2025-01-01", "status": "open"}]
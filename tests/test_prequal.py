@@ -0,0 +1,87 @@
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from server import PREQUAL_GRID_MAX_CELLS, PreQualRequest, PreQualWhatIfRequest, calculate_prequal, calculate_prequal_batch
+
+FIELDS = ["status", "dti", "ltv", "estimated_rate", "monthly_payment", "max_loan_amount", "conditions"]
+
+
+def make_requests(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [
+        PreQualRequest(
+            loan_amount=rng.uniform(50_000, 2_000_000),
+            down_payment=rng.uniform(0, 500_000),
+            annual_income=rng.choice([0, rng.uniform(20_000, 600_000)]),
+            monthly_debts=rng.uniform(0, 8_000),
+            credit_score=rng.choice([None, rng.randint(500, 850)]),
+            employment_status=rng.choice(["employed", "self-employed", "unemployed", "retired"]),
+            term=rng.choice([180, 240, 360])
+        )
+        for _ in range(size)
+    ]
+
+
+def assert_same(scalar, batch):
+    assert len(scalar) == len(batch)
+    for index, (expected, actual) in enumerate(zip(scalar, batch)):
+        for field in FIELDS:
+            assert actual[field] == expected[field], f"request {index}: {field}"
+
+
+def test_batch_matches_scalar_on_random_requests():
+    requests = make_requests(2000)
+    assert_same([calculate_prequal(r) for r in requests], calculate_prequal_batch(requests))
+
+
+@pytest.mark.parametrize("credit_score", [500, 619, 620, 679, 680, 699, 700, 759, 760])
+def test_batch_matches_scalar_with_credit_score_override(credit_score):
+    requests = make_requests(200, seed=credit_score)
+    assert_same(
+        [calculate_prequal(r, credit_score) for r in requests],
+        calculate_prequal_batch(requests, credit_score)
+    )
+
+
+def test_batch_matches_scalar_at_rule_boundaries():
+    requests = [
+        # No income: DTI falls back to 100
+        PreQualRequest(loan_amount=300_000, down_payment=60_000, annual_income=0, monthly_debts=500, credit_score=720, employment_status="employed"),
+        # DTI exactly 43%
+        PreQualRequest(loan_amount=300_000, down_payment=60_000, annual_income=120_000, monthly_debts=4_300, credit_score=720, employment_status="employed"),
+        # LTV exactly 80, 90 and 97%
+        PreQualRequest(loan_amount=80_000, down_payment=20_000, annual_income=90_000, monthly_debts=0, credit_score=760, employment_status="employed"),
+        PreQualRequest(loan_amount=90_000, down_payment=10_000, annual_income=90_000, monthly_debts=0, credit_score=760, employment_status="employed"),
+        PreQualRequest(loan_amount=97_000, down_payment=3_000, annual_income=90_000, monthly_debts=0, credit_score=760, employment_status="retired"),
+        # Debts above the 43% allowance: max loan falls back to the requested amount
+        PreQualRequest(loan_amount=250_000, down_payment=0, annual_income=30_000, monthly_debts=5_000, employment_status="self-employed")
+    ]
+    assert_same([calculate_prequal(r) for r in requests], calculate_prequal_batch(requests))
+
+
+def test_batch_of_nothing():
+    assert calculate_prequal_batch([]) == []
+
+
+@pytest.mark.parametrize("axes", [
+    {"terms": [0]},
+    {"terms": [-360]},
+    {"terms": [481]},
+    {"loan_amounts": [-1.0]},
+    {"down_payments": [-1.0]},
+    {"loan_amounts": [300_000.0] * (PREQUAL_GRID_MAX_CELLS + 1)},
+    {"credit_scores": [700] * (PREQUAL_GRID_MAX_CELLS + 1)}
+])
+def test_whatif_rejects_out_of_range_axes(axes):
+    grid = {
+        "loan_amounts": [300_000.0],
+        "down_payments": [60_000.0],
+        "annual_income": 120_000.0,
+        "monthly_debts": 500.0,
+        "employment_status": "employed",
+        **axes
+    }
+    with pytest.raises(ValidationError):
+        PreQualWhatIfRequest(**grid)
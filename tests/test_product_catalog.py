@@ -0,0 +1,21 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from product_catalog import ProductCatalog
+from server import MortgageProduct
+
+
+@pytest.mark.anyio
+async def test_snapshot_version_keeps_increasing_across_invalidations():
+    collection = AsyncMongoMockClient()["test"]["mortgage_products"]
+    catalog = ProductCatalog(lambda: collection, MortgageProduct)
+    await catalog.seed()
+    first = await catalog.snapshot()
+
+    await collection.delete_one({"id": first.products[0]["id"]})
+    catalog.invalidate()
+    second = await catalog.snapshot()
+
+    assert len(second.products) == len(first.products) - 1
+    assert second.version > first.version
+    assert second.etag != first.etag
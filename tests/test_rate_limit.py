@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+import rate_limit
+from llm_pool import PRIORITY_GUEST, PRIORITY_USER, PrioritySlots
+from rate_limit import LocalBucketStore, TokenBucketLimiter, retry_after_header
+from worker_pool import PoolSaturated
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock(rate_limit)
+
+
+class BrokenStore:
+    name = "broken"
+
+    async def take(self, limiter, key, rate, burst, cost):
+        raise ConnectionError("redis unavailable")
+
+
+@pytest.mark.anyio
+async def test_burst_then_limited_with_retry_after(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=3, store=LocalBucketStore())
+    assert [await limiter.check("ip-1") for _ in range(3)] == [None, None, None]
+    retry = await limiter.check("ip-1")
+    assert retry == pytest.approx(1.0)
+    assert limiter.stats()["allowed"] == 3
+    assert limiter.stats()["limited"] == 1
+
+
+@pytest.mark.anyio
+async def test_bucket_refills_at_rate_up_to_burst(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=2, store=LocalBucketStore())
+    for _ in range(2):
+        await limiter.check("ip-1")
+    clock.now += 1.0
+    assert await limiter.check("ip-1") is None
+    assert await limiter.check("ip-1") is not None
+    # A long idle spell refills to the burst, not beyond
+    clock.now += 60
+    results = [await limiter.check("ip-1") for _ in range(3)]
+    assert results[:2] == [None, None]
+    assert results[2] is not None
+
+
+@pytest.mark.anyio
+async def test_keys_have_separate_buckets(clock):
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=1, store=LocalBucketStore())
+    assert await limiter.check("ip-1") is None
+    assert await limiter.check("ip-1") is not None
+    assert await limiter.check("ip-2") is None
+
+
+@pytest.mark.anyio
+async def test_store_errors_fail_open():
+    limiter = TokenBucketLimiter("test", per_minute=60, burst=1, store=BrokenStore())
+    assert await limiter.check("ip-1") is None
+    assert limiter.store_errors == 1
+
+
+def test_limiter_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        TokenBucketLimiter("test", per_minute=0, burst=1, store=LocalBucketStore())
+    with pytest.raises(ValueError):
+        TokenBucketLimiter("test", per_minute=60, burst=0, store=LocalBucketStore())
+
+
+@pytest.mark.parametrize("seconds, header", [(0.0, "1"), (0.2, "1"), (1.0, "1"), (1.01, "2")])
+def test_retry_after_rounds_up(seconds, header):
+    assert retry_after_header(seconds) == {"Retry-After": header}
+
+
+@pytest.mark.anyio
+async def test_slots_shed_when_no_queue_is_allowed():
+    slots = PrioritySlots(1, max_waiting={PRIORITY_GUEST: 0})
+    await slots.acquire(PRIORITY_USER)
+    assert slots.would_shed(PRIORITY_GUEST)
+    with pytest.raises(PoolSaturated):
+        await slots.acquire(PRIORITY_GUEST)
+    assert slots.rejected == 1
+
+
+@pytest.mark.anyio
+async def test_slots_serve_users_before_guests():
+    slots = PrioritySlots(1)
+    await slots.acquire(PRIORITY_USER)
+    order = []
+
+    async def waiter(priority, label):
+        await slots.acquire(priority)
+        order.append(label)
+        slots.release(priority)
+
+    tasks = [asyncio.create_task(waiter(PRIORITY_GUEST, "guest-1")), asyncio.create_task(waiter(PRIORITY_GUEST, "guest-2"))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(waiter(PRIORITY_USER, "user")))
+    await asyncio.sleep(0)
+    slots.release(PRIORITY_USER)
+    await asyncio.gather(*tasks)
+    assert order == ["user", "guest-1", "guest-2"]
+    assert slots.in_use == 0
+
+
+@pytest.mark.anyio
+async def test_class_cap_leaves_slots_for_other_priorities():
+    slots = PrioritySlots(2, class_caps={PRIORITY_GUEST: 1})
+    await slots.acquire(PRIORITY_GUEST)
+    guest = asyncio.create_task(slots.acquire(PRIORITY_GUEST))
+    await asyncio.sleep(0)
+    assert not guest.done()
+    await asyncio.wait_for(slots.acquire(PRIORITY_USER), 1)
+    slots.release(PRIORITY_GUEST)
+    await asyncio.wait_for(guest, 1)
+    assert slots.stats()["held"] == {PRIORITY_GUEST: 1, PRIORITY_USER: 1}
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    slots = PrioritySlots(1)
+    await slots.acquire(PRIORITY_USER)
+    waiter = asyncio.create_task(slots.acquire(PRIORITY_GUEST))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    slots.release(PRIORITY_USER)
+    assert slots.in_use == 0
+    assert slots.waiting(PRIORITY_GUEST) == 0
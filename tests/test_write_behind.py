@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from write_behind import WriteBehindBuffer, insert_idempotent
+
+
+class FlakyWriter:
+    """Batch writer that fails every call until `down_for` seconds after the first one"""
+
+    def __init__(self, down_for: float):
+        self.down_for = down_for
+        self.first_call = None
+        self.calls = 0
+        self.written = []
+
+    async def __call__(self, batch):
+        self.calls += 1
+        now = time.monotonic()
+        if self.first_call is None:
+            self.first_call = now
+        if now - self.first_call < self.down_for:
+            raise ConnectionError("database unavailable")
+        self.written.extend(batch)
+
+
+async def drain(buffer: WriteBehindBuffer, seconds: float):
+    buffer.start()
+    await asyncio.sleep(seconds)
+    await buffer.stop()
+
+
+@pytest.mark.anyio
+async def test_short_outage_loses_nothing_and_keeps_order():
+    writer = FlakyWriter(down_for=0.2)
+    buffer = WriteBehindBuffer("test", writer, flush_interval=0.01, max_backoff=0.05, retry_timeout=5)
+    buffer.start()
+    for i in range(50):
+        await buffer.submit(i)
+    await drain(buffer, 0.5)
+    assert writer.written == list(range(50))
+    assert buffer.stats()["dropped"] == 0
+    assert buffer.stats()["failures"] > 0
+
+
+@pytest.mark.anyio
+async def test_retries_back_off():
+    writer = FlakyWriter(down_for=0.4)
+    buffer = WriteBehindBuffer("test", writer, flush_interval=0.01, max_backoff=0.16, retry_timeout=5)
+    buffer.start()
+    await buffer.submit("record")
+    await drain(buffer, 0.6)
+    # 0.01, 0.02, 0.04, 0.08, 0.16, 0.16... rather than an attempt every 10ms
+    assert writer.calls <= 8
+    assert writer.written == ["record"]
+
+
+@pytest.mark.anyio
+async def test_batch_dropped_after_retry_timeout():
+    writer = FlakyWriter(down_for=60)
+    buffer = WriteBehindBuffer("test", writer, flush_interval=0.01, max_backoff=0.02, retry_timeout=0.1)
+    buffer.start()
+    await buffer.submit("record")
+    await drain(buffer, 0.3)
+    assert writer.written == []
+    assert buffer.stats()["dropped"] == 1
+    assert buffer.queue_depth == 0
+
+
+@pytest.mark.anyio
+async def test_sync_durability_writes_before_returning():
+    writer = FlakyWriter(down_for=0)
+    buffer = WriteBehindBuffer("test", writer, durability="sync")
+    buffer.start()
+    await buffer.submit("record")
+    assert writer.written == ["record"]
+
+
+@pytest.mark.anyio
+async def test_insert_idempotent_skips_documents_already_written():
+    collection = AsyncMongoMockClient()["test"]["records"]
+    docs = [{"_id": i, "value": i} for i in range(5)]
+    # A partly applied first attempt
+    await collection.insert_many(docs[:3])
+    await insert_idempotent(collection, docs)
+    await insert_idempotent(collection, docs)
+    assert await collection.count_documents({}) == 5
+
+
+class LostReplyCollection:
+    """Applies the first bulk_write, then raises as if the reply never arrived"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.lose_next = True
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, requests, **kwargs):
+        result = await self.collection.bulk_write(requests, **kwargs)
+        if self.lose_next:
+            self.lose_next = False
+            raise ConnectionError("connection reset after write")
+        return result
+
+
+def chat_turn(turn_id: str, question: str, answer: str) -> dict:
+    return {
+        "session_id": "s1",
+        "user_id": "u1",
+        "turn_id": turn_id,
+        "messages": [{"role": "user", "content": question}, {"role": "assistant", "content": answer}],
+        "updated_at": "2025-01-01T00:00:00+00:00"
+    }
+
+
+@pytest.mark.anyio
+async def test_replayed_chat_turn_is_not_pushed_again_beside_a_newer_turn(monkeypatch):
+    import server
+
+    database = AsyncMongoMockClient()["test"]
+    sessions = LostReplyCollection(database["chat_sessions"])
+    monkeypatch.setattr(server, "db", type("Db", (), {"chat_sessions": sessions})())
+    monkeypatch.setattr(server, "CHAT_STORAGE_MODE", "embedded")
+    await database["chat_sessions"].insert_one({"session_id": "s1", "user_id": "u1", "messages": [], "message_count": 0})
+
+    first = chat_turn("t1", "q1", "a1")
+    with pytest.raises(ConnectionError):
+        await server.persist_chat_turns([first])
+    # The retried batch is flushed together with a turn that arrived meanwhile
+    await server.persist_chat_turns([first, chat_turn("t2", "q2", "a2")])
+
+    doc = await database["chat_sessions"].find_one({"session_id": "s1"})
+    assert [message["content"] for message in doc["messages"]] == ["q1", "a1", "q2", "a2"]
+    assert doc["message_count"] == 4